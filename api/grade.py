@@ -1,13 +1,127 @@
+import hmac
+import json
 import os
+import sys
 from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 
-def get_config():
-    return {'xai_key': os.environ['XAI_API_KEY']}
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
 
 class handler(BaseHTTPRequestHandler):
+    # Chunked transfer encoding requires HTTP/1.1
+    protocol_version = 'HTTP/1.1'
+
     def do_POST(self):
-        config = get_config()
-        # ... existing AI logic ...
+        try:
+            data = self._read_json()
+        except ValueError as e:
+            # Covers json.JSONDecodeError and a non-integer Content-Length
+            self._send_json(400, {'error': f'Invalid request body: {e}'})
+            return
+        if not isinstance(data, dict):
+            self._send_json(400, {'error': 'Request body must be a JSON object'})
+            return
+        event_format = self._stream_format()
+        if event_format:
+            self._stream_grading(data, event_format)
+            return
+
+        # grader (and the warm xAI client it holds) stays loaded between invocations
+        from grader import grade_exam_data
+
+        response = grade_exam_data(data)
+        body = response['body'].encode('utf-8')
+        self.send_response(response['statusCode'])
+        for name, value in response['headers'].items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """
+        Expose this instance's grading metrics in the Prometheus text format (?metrics=prometheus)
+        or the xAI circuit breaker state as JSON (?metrics=circuit)
+
+        Both require "Authorization: Bearer <METRICS_TOKEN>"; without METRICS_TOKEN set they
+        are disabled, since this endpoint is public.
+        """
+        query = parse_qs(urlparse(self.path).query)
+        requested = query.get('metrics', [''])[0]
+        token = os.environ.get('METRICS_TOKEN')
+        if requested not in ('circuit', 'prometheus') or not token:
+            self.send_error(404)
+            return
+        supplied = self.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            self.send_response(401)
+            self.send_header('WWW-Authenticate', 'Bearer')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if requested == 'circuit':
+            from circuit_breaker import get_shared_circuit_breaker
+            body = json.dumps(get_shared_circuit_breaker().stats()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            from metrics import metrics
+            body = metrics.to_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4'
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length < 0:
+            raise ValueError('negative Content-Length')
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _stream_format(self):
+        """Pick a streaming format from ?stream=ndjson|sse or the Accept header"""
+        query = parse_qs(urlparse(self.path).query)
+        requested = query.get('stream', [''])[0]
+        if requested in STREAM_CONTENT_TYPES:
+            return requested
+
+        accept = self.headers.get('Accept', '')
+        for event_format, content_type in STREAM_CONTENT_TYPES.items():
+            if content_type in accept:
+                return event_format
+        return None
+
+    def _stream_grading(self, data, event_format):
+        """Grade the exam and write each result as its own chunk"""
+        from grader import stream_grading
+
         self.send_response(200)
+        self.send_header('Content-Type', STREAM_CONTENT_TYPES[event_format])
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Transfer-Encoding', 'chunked')
         self.end_headers()
-        self.wfile.write(b'{"score": 85}')  # Example
+
+        for event in stream_grading(data, event_format):
+            self._write_chunk(event.encode('utf-8'))
+        self._write_chunk(b'')
+
+    def _write_chunk(self, chunk):
+        self.wfile.write(f"{len(chunk):X}\r\n".encode('ascii') + chunk + b"\r\n")
+        self.wfile.flush()
@@ -42,3 +42,188 @@ FOR UPDATE USING (auth.uid() = owner);
 -- Policy: Allow users to delete their own files
 CREATE POLICY "Allow user to delete their own files" ON storage.objects
 FOR DELETE USING (auth.uid() = owner);
+
+-- Optional persistent tier for the Python grading cache (GRADING_CACHE_SUPABASE_TABLE=GradingCache)
+CREATE TABLE IF NOT EXISTS public."GradingCache" (
+  key TEXT PRIMARY KEY,
+  result TEXT NOT NULL,
+  created_at DOUBLE PRECISION NOT NULL
+);
+ALTER TABLE public."GradingCache" ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Cached grades and feedback are read and written by the grading service only
+CREATE POLICY "Grading service manages the grading cache" ON public."GradingCache"
+FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+-- Prior per-question grades for incremental re-grading (GRADING_INCREMENTAL=true).
+-- key is "<user_id>:<question_id>"; fingerprint covers the question, answer and prompt version.
+CREATE TABLE IF NOT EXISTS public."ExamGradingResult" (
+  key TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  question_id TEXT NOT NULL,
+  fingerprint TEXT NOT NULL,
+  result TEXT NOT NULL,
+  updated_at DOUBLE PRECISION NOT NULL
+);
+CREATE INDEX IF NOT EXISTS exam_grading_result_user_id_idx ON public."ExamGradingResult" (user_id);
+ALTER TABLE public."ExamGradingResult" ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Stored grades and feedback are read and written by the grading service only
+-- (SUPABASE_SERVICE_ROLE_KEY), never with the public anon key
+CREATE POLICY "Grading service manages exam grading results" ON public."ExamGradingResult"
+FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+-- Near-duplicate answers found by the similarity index (SIMILARITY_INDEX_ENABLED=true), for reviewers only.
+-- cluster is a JSON list of {userId, similarity} for the other candidates with matching answers.
+CREATE TABLE IF NOT EXISTS public."CopyFlag" (
+  id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  question_id TEXT NOT NULL,
+  max_similarity DOUBLE PRECISION NOT NULL,
+  cluster TEXT NOT NULL,
+  created_at DOUBLE PRECISION NOT NULL
+);
+CREATE INDEX IF NOT EXISTS copy_flag_user_id_idx ON public."CopyFlag" (user_id);
+ALTER TABLE public."CopyFlag" ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Only the grading service writes copy flags. The Python grader connects with
+-- SUPABASE_SERVICE_ROLE_KEY; the anon key is rejected, and failed writes are counted in the
+-- copy_flag_write_failures metric. There is no read policy: candidates sign in too, so
+-- reviewers read flags through the dashboard or the service role.
+CREATE POLICY "Grading service inserts copy flags" ON public."CopyFlag"
+FOR INSERT TO service_role WITH CHECK (true);
+
+-- Per-question points read by the Python question bank; NULL keeps the per-type default.
+ALTER TABLE public.questions_multiple_choice ADD COLUMN IF NOT EXISTS points INTEGER;
+ALTER TABLE public.questions_calculations ADD COLUMN IF NOT EXISTS points INTEGER;
+ALTER TABLE public.questions_behavioral ADD COLUMN IF NOT EXISTS points INTEGER;
+ALTER TABLE public.questions_free_response ADD COLUMN IF NOT EXISTS points INTEGER;
+
+-- One grading result per answer, so a queue job that is retried or reclaimed after its lease
+-- expired cannot store a second one (insert_grading_results skips conflicting rows).
+-- Remove any existing duplicates before applying.
+CREATE UNIQUE INDEX IF NOT EXISTS grading_result_answer_id_key ON public."GradingResult" (answer_id);
+
+-- One report per exam, so re-grading an exam from the backlog replaces its report
+-- (insert_report upserts on exam_key). NULL keys, from exams with no examId or completion
+-- time, never conflict.
+ALTER TABLE public."Report" ADD COLUMN IF NOT EXISTS exam_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS report_exam_key_key ON public."Report" (exam_key);
+
+-- Grading job queue shared by the app and the Python workers (GRADING_QUEUE_BACKEND=supabase).
+-- Every UserAnswer insert enqueues its own job through the trigger below, whichever client
+-- inserts it; workers claim with FOR UPDATE SKIP LOCKED, and all times use the database clock.
+-- Only the service role may touch the queue: RLS has no policies and the functions are
+-- revoked from anon and authenticated.
+CREATE TABLE IF NOT EXISTS public.grading_jobs (
+  id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  answer_id TEXT NOT NULL,
+  idempotency_key TEXT NOT NULL UNIQUE,
+  status TEXT NOT NULL DEFAULT 'queued',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  available_at DOUBLE PRECISION NOT NULL DEFAULT extract(epoch FROM now()),
+  lease_expires_at DOUBLE PRECISION,
+  worker TEXT,
+  last_error TEXT,
+  created_at DOUBLE PRECISION NOT NULL DEFAULT extract(epoch FROM now()),
+  completed_at DOUBLE PRECISION
+);
+CREATE INDEX IF NOT EXISTS grading_jobs_claim_idx ON public.grading_jobs (status, available_at);
+ALTER TABLE public.grading_jobs ENABLE ROW LEVEL SECURITY;
+
+-- Queue a job, or revive a failed one with the same key; true if a job was queued
+CREATE OR REPLACE FUNCTION public.enqueue_grading_job(p_answer_id TEXT, p_idempotency_key TEXT)
+RETURNS BOOLEAN LANGUAGE plpgsql SET search_path = public AS $$
+DECLARE
+  changed INTEGER;
+BEGIN
+  INSERT INTO grading_jobs (answer_id, idempotency_key) VALUES (p_answer_id, p_idempotency_key)
+  ON CONFLICT (idempotency_key) DO UPDATE SET
+    answer_id = excluded.answer_id, status = 'queued', attempts = 0, available_at = extract(epoch FROM now()),
+    lease_expires_at = NULL, worker = NULL, last_error = NULL
+  WHERE grading_jobs.status = 'failed';
+  GET DIAGNOSTICS changed = ROW_COUNT;
+  RETURN changed = 1;
+END $$;
+
+CREATE OR REPLACE FUNCTION public.enqueue_user_answer_grading()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  PERFORM enqueue_grading_job(NEW.id::TEXT, NEW.id::TEXT);
+  RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS user_answer_enqueue_grading ON public."UserAnswer";
+CREATE TRIGGER user_answer_enqueue_grading AFTER INSERT ON public."UserAnswer"
+  FOR EACH ROW EXECUTE FUNCTION public.enqueue_user_answer_grading();
+
+-- Lease up to p_limit available jobs (queued, or running with an expired lease) to p_worker
+CREATE OR REPLACE FUNCTION public.claim_grading_jobs(p_worker TEXT, p_limit INTEGER, p_lease_seconds DOUBLE PRECISION,
+                                                     p_max_attempts INTEGER)
+RETURNS SETOF public.grading_jobs LANGUAGE plpgsql SET search_path = public AS $$
+DECLARE
+  now_epoch DOUBLE PRECISION := extract(epoch FROM now());
+BEGIN
+  -- A worker died holding these jobs on their final attempt
+  UPDATE grading_jobs SET status = 'failed', last_error = 'Lease expired on final attempt', lease_expires_at = NULL
+  WHERE status = 'running' AND lease_expires_at <= now_epoch AND attempts >= p_max_attempts;
+
+  RETURN QUERY
+  UPDATE grading_jobs SET
+    status = 'running', attempts = grading_jobs.attempts + 1, lease_expires_at = now_epoch + p_lease_seconds, worker = p_worker
+  WHERE grading_jobs.id IN (
+    SELECT candidate.id FROM grading_jobs AS candidate
+    WHERE (candidate.status = 'queued' AND candidate.available_at <= now_epoch)
+       OR (candidate.status = 'running' AND candidate.lease_expires_at <= now_epoch)
+    ORDER BY candidate.available_at, candidate.id
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING grading_jobs.*;
+END $$;
+
+-- Move a job p_worker still holds to done, queued (after p_delay_seconds) or failed
+CREATE OR REPLACE FUNCTION public.finish_grading_job(p_id BIGINT, p_worker TEXT, p_status TEXT,
+                                                     p_delay_seconds DOUBLE PRECISION, p_error TEXT)
+RETURNS BOOLEAN LANGUAGE plpgsql SET search_path = public AS $$
+DECLARE
+  changed INTEGER;
+BEGIN
+  UPDATE grading_jobs SET
+    status = p_status,
+    last_error = COALESCE(p_error, last_error),
+    available_at = CASE WHEN p_status = 'queued' THEN extract(epoch FROM now()) + p_delay_seconds ELSE available_at END,
+    completed_at = CASE WHEN p_status = 'done' THEN extract(epoch FROM now()) ELSE completed_at END,
+    lease_expires_at = NULL
+  WHERE id = p_id AND worker = p_worker AND status = 'running';
+  GET DIAGNOSTICS changed = ROW_COUNT;
+  RETURN changed = 1;
+END $$;
+
+-- Extend the leases p_worker still holds; returns how many were renewed
+CREATE OR REPLACE FUNCTION public.renew_grading_jobs(p_ids BIGINT[], p_worker TEXT, p_lease_seconds DOUBLE PRECISION)
+RETURNS INTEGER LANGUAGE plpgsql SET search_path = public AS $$
+DECLARE
+  changed INTEGER;
+BEGIN
+  UPDATE grading_jobs SET lease_expires_at = extract(epoch FROM now()) + p_lease_seconds
+  WHERE id = ANY(p_ids) AND worker = p_worker AND status = 'running';
+  GET DIAGNOSTICS changed = ROW_COUNT;
+  RETURN changed;
+END $$;
+
+CREATE OR REPLACE FUNCTION public.grading_job_counts()
+RETURNS TABLE (status TEXT, count BIGINT) LANGUAGE sql SET search_path = public AS $$
+  SELECT jobs.status, COUNT(*) FROM grading_jobs AS jobs GROUP BY jobs.status
+$$;
+
+REVOKE ALL ON FUNCTION public.enqueue_grading_job(TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.claim_grading_jobs(TEXT, INTEGER, DOUBLE PRECISION, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.finish_grading_job(BIGINT, TEXT, TEXT, DOUBLE PRECISION, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.renew_grading_jobs(BIGINT[], TEXT, DOUBLE PRECISION) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.grading_job_counts() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.enqueue_grading_job(TEXT, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.claim_grading_jobs(TEXT, INTEGER, DOUBLE PRECISION, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION public.finish_grading_job(BIGINT, TEXT, TEXT, DOUBLE PRECISION, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.renew_grading_jobs(BIGINT[], TEXT, DOUBLE PRECISION) TO service_role;
+GRANT EXECUTE ON FUNCTION public.grading_job_counts() TO service_role;
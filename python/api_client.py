@@ -1,73 +1,496 @@
 # python/api_client.py - Modular xAI API client
+import asyncio
+import contextvars
 import json
 import os
-from typing import Dict, Any, Optional
-import requests
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple, Union
+from grading_cache import GradingCache, get_default_cache, make_cache_key
+from rate_limiter import AdaptiveRateLimiter, RetryPolicy, get_shared_rate_limiter, parse_retry_after
+from deadlines import HedgePolicy, call_timeout, get_shared_hedge_policy, remaining
+from circuit_breaker import CircuitBreaker, get_shared_circuit_breaker
+from metrics import metrics
+from prompt_templates import PROMPT_TEMPLATE_VERSION, RenderedPrompt, grade_context, render_batch_item, render_batch_prompt, render_grading_prompt
+from token_budget import compact_answer, estimate_tokens, max_completion_tokens
+from response_parser import ResponseParseError, parse_grading_array, parse_grading_result, validate_grading_result
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_BASE_URL = "https://api.x.ai/v1"
+DEFAULT_MODEL = "grok-beta"
+DEFAULT_TEMPERATURE = 0.1  # Low temperature for consistent grading
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 30
+DEFAULT_BATCH_TOKEN_BUDGET = 3000
+DEFAULT_BATCH_MAX_ITEMS = 10
+
+_session_lock = threading.Lock()
+_client_lock = threading.Lock()
+_shared_session: Optional['requests.Session'] = None
+_default_client: Optional['XAIClient'] = None
+_hedge_executor: Optional[ThreadPoolExecutor] = None
 
 class XAIApiError(Exception):
     """Custom exception for xAI API errors"""
-    pass
+    
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None,
+                 retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
 
-class XAIClient:
-    """Client for interacting with xAI Grok API"""
+class DeadlineExceededError(XAIApiError):
+    """Raised when the grading deadline leaves no time for an xAI call"""
+
+class CircuitOpenError(XAIApiError):
+    """Raised without calling xAI while the circuit breaker is open"""
+
+def get_shared_session(pool_size: Optional[int] = None) -> 'requests.Session':
+    """
+    Get the process-wide pooled HTTP session used for all xAI traffic
+    
+    Connections are kept alive between calls so each question reuses a warm
+    TCP+TLS connection to api.x.ai instead of paying a fresh handshake.
+    
+    Args:
+        pool_size: Maximum pooled connections (env: XAI_POOL_SIZE), only used on first call
+    """
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            # Imported on first use to keep requests off the cold-start import path
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            pool_size = pool_size or int(os.getenv('XAI_POOL_SIZE', DEFAULT_POOL_SIZE))
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Connection'] = 'keep-alive'
+            _shared_session = session
+        return _shared_session
+
+def get_default_client() -> 'XAIClient':
+    """Get a process-wide XAIClient backed by the shared session"""
+    global _default_client
+    with _client_lock:
+        if _default_client is None:
+            _default_client = XAIClient()
+        return _default_client
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """Threads that run raced primary and hedge requests for the sync client"""
+    global _hedge_executor
+    with _session_lock:
+        if _hedge_executor is None:
+            pool_size = int(os.getenv('XAI_POOL_SIZE', DEFAULT_POOL_SIZE))
+            _hedge_executor = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix='xai-hedge')
+        return _hedge_executor
+
+def deadline_error() -> XAIApiError:
+    return DeadlineExceededError("Grading deadline exceeded before the xAI call completed")
+
+class BaseXAIClient:
+    """Prompt building and response parsing shared by the sync and async xAI clients"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[GradingCache] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None, retry_policy: Optional[RetryPolicy] = None,
+                 hedge_policy: Optional[HedgePolicy] = None, circuit_breaker: Optional[CircuitBreaker] = None):
         self.api_key = api_key or os.getenv('XAI_API_KEY')
         if not self.api_key:
             raise XAIApiError("XAI_API_KEY environment variable is required")
         
-        self.base_url = "https://api.x.ai/v1"
+        self.base_url = os.getenv('XAI_BASE_URL', DEFAULT_BASE_URL)
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.cache = cache if cache is not None else get_default_cache()
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.hedge_policy = hedge_policy or get_shared_hedge_policy()
+        self.circuit_breaker = circuit_breaker or get_shared_circuit_breaker()
+        self.json_mode = os.getenv('XAI_JSON_MODE', 'false').lower() in ('1', 'true', 'yes')
+    
+    def _build_payload(self, prompt: Union[str, RenderedPrompt], model: str) -> Dict[str, Any]:
+        """Build the chat completion request body"""
+        max_tokens = None
+        if isinstance(prompt, RenderedPrompt):
+            messages = prompt.messages
+            max_tokens = prompt.max_tokens
+        else:
+            messages = [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens or max_completion_tokens(),
+            "temperature": DEFAULT_TEMPERATURE
+        }
+        if self.json_mode and isinstance(prompt, RenderedPrompt) and prompt.expects == 'object':
+            # Structured output: the API guarantees a single JSON object
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+    
+    def _extract_content(self, data: Dict[str, Any], payload: Optional[Dict[str, Any]] = None) -> str:
+        """Extract the message text from a chat completion response, recording its token usage"""
+        if 'choices' not in data or not data['choices']:
+            raise XAIApiError("No response choices in API response")
+        
+        usage = data.get('usage') or {}
+        if usage:
+            metrics.inc('xai_tokens', usage.get('prompt_tokens', 0), exam_key='promptTokens', kind='prompt')
+            metrics.inc('xai_tokens', usage.get('completion_tokens', 0), exam_key='completionTokens', kind='completion')
+        if payload is not None:
+            # Budgets next to actual usage show how well the local estimates fit
+            estimated = sum(estimate_tokens(message['content']) for message in payload['messages'])
+            metrics.inc('xai_token_budget', estimated, exam_key='promptTokensEstimated', kind='prompt')
+            metrics.inc('xai_token_budget', payload['max_tokens'], exam_key='completionTokensBudgeted', kind='completion')
+        if data['choices'][0].get('finish_reason') == 'length':
+            metrics.inc('xai_truncated_responses', exam_key='truncatedResponses')
+        
+        return data['choices'][0]['message']['content']
+    
+    def _request_tokens(self, payload: Dict[str, Any]) -> int:
+        """Estimated prompt + completion tokens a request counts against the rate limit"""
+        prompt_tokens = sum(estimate_tokens(message['content']) for message in payload['messages'])
+        return prompt_tokens + payload['max_tokens']
+    
+    def _record_request(self, started: float, error: Optional[XAIApiError] = None):
+        """Record one chat completion attempt's latency and outcome"""
+        if error is None:
+            outcome = 'ok'
+        elif error.status_code is not None:
+            outcome = str(error.status_code)
+        else:
+            outcome = 'error'
+        elapsed = time.perf_counter() - started
+        metrics.observe('xai_request_seconds', elapsed, outcome=outcome)
+        metrics.inc('xai_requests', exam_key='apiCalls', outcome=outcome)
+        
+        # 5xx, throttling (429), timeouts and network errors count against the breaker; other
+        # 4xx are the request's own fault and our own deadline says nothing about xAI
+        if error is None:
+            self.circuit_breaker.record_success(elapsed)
+        elif isinstance(error, DeadlineExceededError) or (
+                error.status_code is not None and 400 <= error.status_code < 500 and error.status_code != 429):
+            self.circuit_breaker.record_ignored()
+        else:
+            self.circuit_breaker.record_failure()
+    
+    def _check_circuit(self):
+        """
+        Fail fast while xAI is known to be unhealthy
+        
+        Raises:
+            CircuitOpenError: If the circuit breaker rejects the call
+        """
+        if not self.circuit_breaker.allow_request():
+            metrics.inc('xai_circuit_rejections', exam_key='circuitRejected')
+            raise CircuitOpenError("xAI circuit breaker is open")
+    
+    def _http_error(self, status_code: int, text: str, retry_after_header: Optional[str]) -> XAIApiError:
+        return XAIApiError(
+            f"API request failed with status {status_code}: {text}",
+            status_code=status_code,
+            retry_after=parse_retry_after(retry_after_header),
+            retryable=self.retry_policy.is_retryable(status_code)
+        )
+    
+    def _retry_delay(self, error: XAIApiError, attempt: int, started_at: float) -> Optional[float]:
+        """
+        Decide whether a failed attempt is retried
+        
+        Returns:
+            Seconds to back off before the next attempt, or None to give up
+        """
+        if error.status_code == 429:
+            self.rate_limiter.on_throttle(error.retry_after)
+        if not error.retryable:
+            return None
+        
+        delay = self.retry_policy.backoff(attempt, error.retry_after)
+        if not self.retry_policy.should_retry(attempt, started_at, delay):
+            return None
+        budget = remaining()
+        if budget is not None and delay >= budget:
+            # Another attempt could not finish before the grading deadline
+            return None
+        
+        self.rate_limiter.on_retry()
+        metrics.inc('xai_retries', exam_key='retries')
+        print(f"Retrying xAI API call in {delay:.1f}s after attempt {attempt}: {error}")
+        return delay
+    
+    def _cache_key(self, question: Dict[str, Any], answer: str, user_info: Dict[str, Any],
+                   model: str = DEFAULT_MODEL) -> Optional[str]:
+        """Content-addressed cache key for grading an answer to a question, or None when caching is disabled"""
+        if self.cache is None:
+            return None
+        return make_cache_key(model, DEFAULT_TEMPERATURE, PROMPT_TEMPLATE_VERSION, question, answer, grade_context(user_info))
     
-    def call_grok_api(self, prompt: str, model: str = "grok-beta") -> str:
+    def _grade_from_response(self, response: str, question: Dict[str, Any], answer: str,
+                             cache_key: Optional[str]) -> Dict[str, Any]:
+        """Parse a grading response, caching it only when parsing succeeded"""
+        try:
+            with metrics.span('parse'):
+                result = self._parse_grading_json(response, question)
+        except ValueError as e:
+            # If parsing fails, fall back to grading the candidate's answer, not the model's reply
+            print(f"Failed to parse xAI response: {e}")
+            return self._fallback_grading(question, answer)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, result)
+        return result
+    
+    def _build_grading_prompt(self, question: Dict[str, Any], answer: str, user_info: Dict[str, Any]) -> RenderedPrompt:
+        """Build a grading prompt for xAI from the precompiled templates"""
+        return render_grading_prompt(question, answer, user_info)
+    
+    def _parse_grading_response(self, response: str, question: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        """Parse the grading response from xAI"""
+        try:
+            return self._parse_grading_json(response, question)
+        except ValueError as e:
+            # If parsing fails, fall back to grading the candidate's answer
+            print(f"Failed to parse xAI response: {e}")
+            return self._fallback_grading(question, answer)
+    
+    def _parse_grading_json(self, response: str, question: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parse and validate the grading JSON from xAI
+        
+        The first JSON object in the response is used, so code fences and
+        surrounding prose are tolerated; failures are counted in response_parser.parse_stats.
+        
+        Raises:
+            ResponseParseError: If the response is not a valid grading result
+        """
+        return parse_grading_result(response, question.get('points', 0))
+    
+    def _validate_grading_result(self, result: Any, question: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a decoded grading object and clamp it to the question's points"""
+        return validate_grading_result(result, question.get('points', 0))
+    
+    def _build_batch_prompt(self, items: List[Tuple[Dict[str, Any], str]], user_info: Dict[str, Any]) -> RenderedPrompt:
+        """Build one prompt that grades several (question, answer) pairs for the same candidate"""
+        return render_batch_prompt(items, user_info)
+    
+    def _parse_batch_response(self, response: str, items: List[Tuple[Dict[str, Any], str]]) -> Dict[int, Dict[str, Any]]:
+        """
+        Parse a batch grading response
+        
+        Returns:
+            Valid results keyed by item index; missing or malformed items are omitted
+        """
+        try:
+            entries = parse_grading_array(response)
+        except ResponseParseError as e:
+            print(f"Failed to parse xAI batch response: {e}")
+            return {}
+        
+        results = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get('index'), int):
+                continue
+            index = entry.pop('index')
+            if not 0 <= index < len(items) or index in results:
+                continue
+            try:
+                results[index] = self._validate_grading_result(entry, items[index][0])
+            except ValueError as e:
+                print(f"Malformed batch result for response {index}: {e}")
+        return results
+    
+    def _split_batches(self, items: List[Tuple[Dict[str, Any], str]], user_info: Dict[str, Any],
+                       token_budget: int, max_items: int) -> List[List[int]]:
+        """Group item indices so each batch prompt stays within the token budget"""
+        overhead = estimate_tokens(self._build_batch_prompt([], user_info).text)
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = overhead
+        
+        for index, (question, answer) in enumerate(items):
+            item_tokens = estimate_tokens(render_batch_item(question, answer, index))
+            if current and (current_tokens + item_tokens > token_budget or len(current) >= max_items):
+                batches.append(current)
+                current = []
+                current_tokens = overhead
+            current.append(index)
+            current_tokens += item_tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _fallback_grading(self, question: Dict[str, Any], answer: str, needs_regrade: bool = False) -> Dict[str, Any]:
+        """
+        Fallback grading when xAI is unavailable
+        
+        Args:
+            needs_regrade: Mark the result for the re-grade backlog (only for circuit breaker rejections)
+        """
+        metrics.inc('grading_fallbacks', exam_key='fallbacks', source='client')
+        max_score = question.get('points', 0)
+        
+        if question.get('type') == 'multiple-choice':
+            correct_answer = question.get('correctAnswer', '')
+            score = max_score if answer.strip() == correct_answer else 0
+            feedback = "Correct!" if score == max_score else f"Incorrect. The correct answer was: {correct_answer}"
+        else:
+            # Basic scoring based on answer length and content
+            word_count = len(answer.split())
+            if word_count >= 100:
+                score = int(max_score * 0.9)
+            elif word_count >= 50:
+                score = int(max_score * 0.7)
+            elif word_count >= 20:
+                score = int(max_score * 0.5)
+            else:
+                score = int(max_score * 0.2)
+            
+            feedback = "Basic grading applied due to API unavailability."
+        
+        result = {
+            "score": score,
+            "maxScore": max_score,
+            "feedback": feedback,
+            "strengths": ["Response provided"],
+            "improvements": ["AI grading unavailable - manual review recommended"],
+            "fallback": True
+        }
+        if needs_regrade:
+            result["needsRegrade"] = True
+        return result
+
+
+class XAIClient(BaseXAIClient):
+    """Client for interacting with xAI Grok API"""
+    
+    def __init__(self, api_key: Optional[str] = None, session: Optional['requests.Session'] = None,
+                 cache: Optional[GradingCache] = None, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None, hedge_policy: Optional[HedgePolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        super().__init__(api_key, cache, rate_limiter, retry_policy, hedge_policy, circuit_breaker)
+        self.session = session or get_shared_session()
+    
+    def call_grok_api(self, prompt: Union[str, RenderedPrompt], model: str = DEFAULT_MODEL) -> str:
         """
         Call xAI Grok API with a prompt
         
         Args:
-            prompt: The prompt to send to Grok
+            prompt: The prompt to send to Grok (plain text or rendered chat messages)
             model: The model to use (default: grok-beta)
             
         Returns:
             The response text from Grok
             
         Raises:
-            XAIApiError: If the API call fails
+            XAIApiError: If the API call fails (CircuitOpenError at once while the breaker is open)
+        """
+        payload = self._build_payload(prompt, model)
+        started_at = time.monotonic()
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            self._check_circuit()
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                raise deadline_error()
+            if not self.rate_limiter.acquire(self._request_tokens(payload), timeout=budget):
+                raise deadline_error()
+            request_started = time.perf_counter()
+            try:
+                with metrics.span('api'):
+                    content = self._post_hedged(payload)
+            except XAIApiError as e:
+                self._record_request(request_started, e)
+                delay = self._retry_delay(e, attempt, started_at)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            
+            self._record_request(request_started)
+            self.rate_limiter.on_success()
+            return content
+    
+    def _post_hedged(self, payload: Dict[str, Any]) -> str:
         """
+        Send a request, racing a duplicate if it outlives the hedge delay
+        
+        The duplicate goes out after the recent p95 latency (see deadlines.HedgePolicy)
+        when the rate limiter has capacity; the first success wins and the loser is ignored.
+        """
+        timeout = call_timeout(DEFAULT_TIMEOUT)
+        if timeout <= 0:
+            raise deadline_error()
+        hedge_delay = self.hedge_policy.hedge_delay()
+        started = time.perf_counter()
+        if hedge_delay is None or hedge_delay >= timeout:
+            content = self._post_once(payload, timeout)
+            self.hedge_policy.record(time.perf_counter() - started)
+            return content
+        
+        executor = get_hedge_executor()
+        primary = executor.submit(contextvars.copy_context().run, self._post_once, payload, timeout)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done or not self.hedge_policy.try_hedge() or self.rate_limiter.reserve(self._request_tokens(payload)) > 0:
+            content = primary.result()
+            self.hedge_policy.record(time.perf_counter() - started)
+            return content
+        
+        metrics.inc('xai_hedges', exam_key='hedges')
+        hedge = executor.submit(contextvars.copy_context().run, self._post_once, payload, call_timeout(DEFAULT_TIMEOUT))
+        pending = {primary, hedge}
+        error: Optional[XAIApiError] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except XAIApiError as e:
+                    error = e
+                    continue
+                if future is hedge:
+                    self.hedge_policy.record_win()
+                    metrics.inc('xai_hedge_wins', exam_key='hedgeWins')
+                self.hedge_policy.record(time.perf_counter() - started)
+                return content
+        raise error
+    
+    def _post_once(self, payload: Dict[str, Any], timeout: float = DEFAULT_TIMEOUT) -> str:
+        """Send one chat completion request"""
+        import requests
+        
         try:
-            payload = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": 4000,
-                "temperature": 0.1  # Low temperature for consistent grading
-            }
-            
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
                 headers=self.headers,
                 json=payload,
-                timeout=30
+                timeout=timeout
             )
             
             if response.status_code != 200:
-                raise XAIApiError(f"API request failed with status {response.status_code}: {response.text}")
-            
-            data = response.json()
+                raise self._http_error(response.status_code, response.text, response.headers.get('Retry-After'))
             
-            if 'choices' not in data or not data['choices']:
-                raise XAIApiError("No response choices in API response")
-            
-            return data['choices'][0]['message']['content']
+            return self._extract_content(response.json(), payload)
             
+        except XAIApiError:
+            raise
         except requests.exceptions.RequestException as e:
-            raise XAIApiError(f"Network error calling xAI API: {str(e)}")
+            raise XAIApiError(f"Network error calling xAI API: {str(e)}", retryable=True)
         except json.JSONDecodeError as e:
             raise XAIApiError(f"Invalid JSON response from xAI API: {str(e)}")
         except Exception as e:
@@ -85,132 +508,257 @@ class XAIClient:
         Returns:
             Grading result with score, feedback, strengths, and improvements
         """
-        prompt = self._build_grading_prompt(question, answer, user_info)
+        with metrics.span('prompt'):
+            compacted = compact_answer(answer)
+            prompt = self._build_grading_prompt(question, compacted, user_info)
+            cache_key = self._cache_key(question, compacted, user_info)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         try:
             response = self.call_grok_api(prompt)
-            return self._parse_grading_response(response, question)
-        except XAIApiError:
-            # Fallback to basic grading if API fails
-            return self._fallback_grading(question, answer)
+        except XAIApiError as e:
+            # Fallback to basic grading if API fails; only outage rejections are re-graded later
+            return self._fallback_grading(question, answer, needs_regrade=isinstance(e, CircuitOpenError))
+        
+        return self._grade_from_response(response, question, answer, cache_key)
     
-    def _build_grading_prompt(self, question: Dict[str, Any], answer: str, user_info: Dict[str, Any]) -> str:
-        """Build a grading prompt for xAI"""
+    def grade_exam_batch(self, items: List[Tuple[Dict[str, Any], str]], user_info: Dict[str, Any],
+                         token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,
+                         max_items: int = DEFAULT_BATCH_MAX_ITEMS) -> List[Dict[str, Any]]:
+        """
+        Grade several short responses with as few chat completions as possible
         
-        base_prompt = f"""
-You are an expert technical evaluator grading an exam response. Please evaluate the following:
-
-CANDIDATE INFORMATION:
-- Name: {user_info.get('firstName', 'Unknown')} {user_info.get('lastName', 'Unknown')}
-- Position: {user_info.get('position', 'Unknown')}
-- Experience Level: {user_info.get('experience', 'Unknown')}
-- Education: {user_info.get('education', 'Unknown')}
-
-QUESTION:
-Type: {question.get('type', 'Unknown')}
-Question: {question.get('question', 'No question provided')}
-Points: {question.get('points', 0)}
-Category: {question.get('category', 'General')}
-
-STUDENT ANSWER:
-{answer}
-
-GRADING INSTRUCTIONS:
-"""
+        Args:
+            items: List of (question, answer) pairs from one candidate
+            user_info: User information for context
+            token_budget: Maximum estimated prompt tokens per batch request
+            max_items: Maximum responses per batch request
+            
+        Returns:
+            Grading results in the same order as items. Items missing or malformed
+            in a batch response are re-graded with individual calls.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        cache_keys: List[Optional[str]] = []
+        pending = []
+        items = [(question, compact_answer(answer)) for question, answer in items]
         
-        if question.get('type') == 'multiple-choice':
-            base_prompt += f"""
-- This is a multiple-choice question
-- Correct answer: {question.get('correctAnswer', 'Not specified')}
-- Award {question.get('points', 0)} points for correct answer, 0 for incorrect
-- Provide brief feedback explaining why the answer is correct or incorrect
-"""
-        else:
-            base_prompt += f"""
-- This is a {question.get('type', 'essay')} question worth {question.get('points', 0)} points
-- Grade based on:
-  * Understanding of concepts (40%)
-  * Clarity of explanation (30%)
-  * Technical accuracy (20%)
-  * Completeness (10%)
-- Provide detailed feedback with specific strengths and areas for improvement
-- Consider the candidate's experience level in your evaluation
-"""
-        
-        base_prompt += """
-
-Please respond with a JSON object in this exact format:
-{
-  "score": <number>,
-  "maxScore": <number>,
-  "feedback": "<detailed feedback>",
-  "strengths": ["<strength1>", "<strength2>"],
-  "improvements": ["<improvement1>", "<improvement2>"]
-}
-
-Be thorough and fair in your evaluation."""
+        for index, (question, answer) in enumerate(items):
+            cache_key = self._cache_key(question, answer, user_info)
+            cache_keys.append(cache_key)
+            cached = self.cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+        
+        pending_items = [items[index] for index in pending]
+        for batch in self._split_batches(pending_items, user_info, token_budget, max_items):
+            batch_indices = [pending[position] for position in batch]
+            batch_items = [items[index] for index in batch_indices]
+            
+            parsed: Dict[int, Dict[str, Any]] = {}
+            if len(batch_items) > 1:
+                try:
+                    response = self.call_grok_api(self._build_batch_prompt(batch_items, user_info))
+                    parsed = self._parse_batch_response(response, batch_items)
+                except XAIApiError as e:
+                    print(f"Batch grading failed, grading individually: {e}")
+            
+            for position, index in enumerate(batch_indices):
+                if position in parsed:
+                    results[index] = parsed[position]
+                    if cache_keys[index] is not None:
+                        self.cache.set(cache_keys[index], parsed[position])
+                else:
+                    question, answer = items[index]
+                    results[index] = self.grade_exam_response(question, answer, user_info)
         
-        return base_prompt
+        return results
+
+class AsyncXAIClient(BaseXAIClient):
+    """Asyncio client for xAI Grok API using a pooled httpx connection (HTTP/2 when h2 is installed)"""
     
-    def _parse_grading_response(self, response: str, question: Dict[str, Any]) -> Dict[str, Any]:
-        """Parse the grading response from xAI"""
-        try:
-            # Clean up the response
-            response = response.strip()
-            if response.startswith('```json'):
-                response = response[7:]
-            if response.endswith('```'):
-                response = response[:-3]
+    def __init__(self, api_key: Optional[str] = None, pool_size: Optional[int] = None, http2: Optional[bool] = None,
+                 cache: Optional[GradingCache] = None, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None, hedge_policy: Optional[HedgePolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        super().__init__(api_key, cache, rate_limiter, retry_policy, hedge_policy, circuit_breaker)
+        self.pool_size = pool_size or int(os.getenv('XAI_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.http2 = http2
+        self._client = None
+    
+    def _get_client(self):
+        """Lazily create the pooled httpx client"""
+        if self._client is None:
+            try:
+                import httpx
+            except ImportError:
+                raise XAIApiError("httpx is required for AsyncXAIClient")
             
-            result = json.loads(response)
+            http2 = self.http2
+            if http2 is None:
+                try:
+                    import h2  # noqa: F401
+                    http2 = True
+                except ImportError:
+                    http2 = False
             
-            # Validate required fields
-            required_fields = ['score', 'feedback']
-            for field in required_fields:
-                if field not in result:
-                    raise ValueError(f"Missing required field: {field}")
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                timeout=DEFAULT_TIMEOUT
+            )
+        return self._client
+    
+    async def call_grok_api(self, prompt: Union[str, RenderedPrompt], model: str = DEFAULT_MODEL) -> str:
+        """
+        Call xAI Grok API with a prompt
+        
+        Args:
+            prompt: The prompt to send to Grok (plain text or rendered chat messages)
+            model: The model to use (default: grok-beta)
             
-            # Ensure score is within bounds
-            result['score'] = max(0, min(result['score'], question.get('points', 0)))
-            result['maxScore'] = question.get('points', 0)
+        Returns:
+            The response text from Grok
             
-            # Ensure arrays exist
-            result['strengths'] = result.get('strengths', [])
-            result['improvements'] = result.get('improvements', [])
+        Raises:
+            XAIApiError: If the API call fails (CircuitOpenError at once while the breaker is open)
+        """
+        payload = self._build_payload(prompt, model)
+        started_at = time.monotonic()
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            self._check_circuit()
+            waited_since = time.monotonic()
+            delay = self.rate_limiter.reserve(self._request_tokens(payload))
+            while delay > 0:
+                budget = remaining()
+                if budget is not None and delay >= budget:
+                    raise deadline_error()
+                await asyncio.sleep(min(delay, 1.0))
+                delay = self.rate_limiter.reserve(self._request_tokens(payload), waited_since)
+            request_started = time.perf_counter()
+            try:
+                with metrics.span('api'):
+                    content = await self._post_hedged(payload)
+            except XAIApiError as e:
+                self._record_request(request_started, e)
+                delay = self._retry_delay(e, attempt, started_at)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
             
-            return result
+            self._record_request(request_started)
+            self.rate_limiter.on_success()
+            return content
+    
+    async def _post_hedged(self, payload: Dict[str, Any]) -> str:
+        """Send a request, racing a duplicate if it outlives the hedge delay (see XAIClient._post_hedged)"""
+        timeout = call_timeout(DEFAULT_TIMEOUT)
+        if timeout <= 0:
+            raise deadline_error()
+        hedge_delay = self.hedge_policy.hedge_delay()
+        started = time.perf_counter()
+        if hedge_delay is None or hedge_delay >= timeout:
+            content = await self._post_once(payload, timeout)
+            self.hedge_policy.record(time.perf_counter() - started)
+            return content
+        
+        primary = asyncio.ensure_future(self._post_once(payload, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done or not self.hedge_policy.try_hedge() or self.rate_limiter.reserve(self._request_tokens(payload)) > 0:
+            content = await primary
+            self.hedge_policy.record(time.perf_counter() - started)
+            return content
+        
+        metrics.inc('xai_hedges', exam_key='hedges')
+        hedge = asyncio.ensure_future(self._post_once(payload, call_timeout(DEFAULT_TIMEOUT)))
+        pending = {primary, hedge}
+        error: Optional[XAIApiError] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        content = task.result()
+                    except XAIApiError as e:
+                        error = e
+                        continue
+                    if task is hedge:
+                        self.hedge_policy.record_win()
+                        metrics.inc('xai_hedge_wins', exam_key='hedgeWins')
+                    self.hedge_policy.record(time.perf_counter() - started)
+                    return content
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _post_once(self, payload: Dict[str, Any], timeout: float = DEFAULT_TIMEOUT) -> str:
+        """Send one chat completion request"""
+        client = self._get_client()
+        import httpx
+        
+        try:
+            response = await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=timeout
+            )
             
-        except (json.JSONDecodeError, ValueError) as e:
-            # If parsing fails, use fallback grading
-            print(f"Failed to parse xAI response: {e}")
-            return self._fallback_grading(question, response)
+            if response.status_code != 200:
+                raise self._http_error(response.status_code, response.text, response.headers.get('Retry-After'))
+            
+            return self._extract_content(response.json(), payload)
+            
+        except XAIApiError:
+            raise
+        except httpx.HTTPError as e:
+            raise XAIApiError(f"Network error calling xAI API: {str(e)}", retryable=True)
+        except json.JSONDecodeError as e:
+            raise XAIApiError(f"Invalid JSON response from xAI API: {str(e)}")
+        except Exception as e:
+            raise XAIApiError(f"Unexpected error calling xAI API: {str(e)}")
     
-    def _fallback_grading(self, question: Dict[str, Any], answer: str) -> Dict[str, Any]:
-        """Fallback grading when xAI is unavailable"""
-        max_score = question.get('points', 0)
+    async def grade_exam_response(self, question: Dict[str, Any], answer: str, user_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Grade a single exam response using xAI
         
-        if question.get('type') == 'multiple-choice':
-            correct_answer = question.get('correctAnswer', '')
-            score = max_score if answer.strip() == correct_answer else 0
-            feedback = "Correct!" if score == max_score else f"Incorrect. The correct answer was: {correct_answer}"
-        else:
-            # Basic scoring based on answer length and content
-            word_count = len(answer.split())
-            if word_count >= 100:
-                score = int(max_score * 0.9)
-            elif word_count >= 50:
-                score = int(max_score * 0.7)
-            elif word_count >= 20:
-                score = int(max_score * 0.5)
-            else:
-                score = int(max_score * 0.2)
+        Args:
+            question: Question data including type, points, correct answer, etc.
+            answer: Student's answer
+            user_info: User information for context
             
-            feedback = "Basic grading applied due to API unavailability."
+        Returns:
+            Grading result with score, feedback, strengths, and improvements
+        """
+        with metrics.span('prompt'):
+            compacted = compact_answer(answer)
+            prompt = self._build_grading_prompt(question, compacted, user_info)
+            cache_key = self._cache_key(question, compacted, user_info)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        return {
-            "score": score,
-            "maxScore": max_score,
-            "feedback": feedback,
-            "strengths": ["Response provided"],
-            "improvements": ["AI grading unavailable - manual review recommended"]
-        }
+        try:
+            response = await self.call_grok_api(prompt)
+        except XAIApiError as e:
+            # Fallback to basic grading if API fails; only outage rejections are re-graded later
+            return self._fallback_grading(question, answer, needs_regrade=isinstance(e, CircuitOpenError))
+        
+        return self._grade_from_response(response, question, answer, cache_key)
+    
+    async def aclose(self):
+        """Close the pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,252 @@
+# python/benchmark.py - Grading pipeline benchmark against a local mock xAI server
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Any, Optional
+
+from mock_xai_server import MockXAIServer, RESPONSE_SHAPES
+
+QUESTION_MIXES = ('essay', 'mixed')
+# Dependencies that must stay off the import path of the serverless entry points
+HEAVY_MODULES = ('requests', 'supabase', 'httpx', 'numpy')
+
+# Runs in a fresh interpreter: times `import grader`, then one cold and several warm requests
+COLD_START_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import grader
+import_seconds = time.perf_counter() - started
+heavy = [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+from db_client import set_supabase_client
+from fake_supabase import FakeSupabaseClient
+from benchmark import BenchmarkRequest, build_exam
+set_supabase_client(FakeSupabaseClient())
+timings = []
+for index in range(int(sys.argv[3])):
+    started = time.perf_counter()
+    grader.handler(BenchmarkRequest(build_exam(int(sys.argv[2]), index)))
+    timings.append(time.perf_counter() - started)
+print(json.dumps({'importSeconds': import_seconds, 'heavyModules': heavy, 'requestSeconds': timings}))
+'''
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (pct in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+class BenchmarkRequest:
+    """Minimal request object accepted by grader.handler"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+
+    def json(self) -> Dict[str, Any]:
+        return self._data
+
+def build_exam(size: int, exam_index: int, mix: str = 'mixed') -> Dict[str, Any]:
+    """Build a synthetic exam; answers are unique per exam so caches do not skew results"""
+    questions = []
+    answers = []
+    for index in range(size):
+        question_id = f"q{index}"
+        if mix == 'mixed' and index % 4 == 0:
+            question = {'id': question_id, 'type': 'multiple-choice', 'points': 2, 'correctAnswer': 'B',
+                        'question': f"Multiple-choice question {index}", 'category': 'Technical'}
+            answer_text = 'B' if (exam_index + index) % 3 else 'C'
+        elif mix == 'mixed' and index % 4 == 1:
+            question = {'id': question_id, 'type': 'calculation', 'points': 5, 'answerNumerical': 250.0,
+                        'question': f"Calculation question {index}", 'category': 'Technical'}
+            answer_text = f"{250 + (exam_index % 3)} MPa"
+        else:
+            question = {'id': question_id, 'type': 'essay', 'points': 10,
+                        'question': f"Explain the design trade-offs in scenario {index}.", 'category': 'Technical'}
+            answer_text = (f"Candidate {exam_index} answer {index}: I would start by profiling the API and database, "
+                           "then compare caching and batching approaches with a concrete example from a past project. ") * 3
+        questions.append(question)
+        answers.append({'questionId': question_id, 'answer': answer_text, 'timeSpent': 60})
+
+    return {
+        'answers': answers,
+        'questions': questions,
+        'userInfo': {'userId': f"benchmark-user-{exam_index}", 'firstName': 'Bench', 'lastName': f"Candidate{exam_index}",
+                     'position': 'Software Engineer', 'experience': 'Mid-Level', 'education': 'BSc'},
+        'completedAt': '2024-01-01T00:00:00Z'
+    }
+
+def run_scenario(exam_size: int, concurrency: int, exams: int, mock: MockXAIServer, fake_db,
+                 mix: str = 'mixed') -> Dict[str, Any]:
+    """Grade `exams` synthetic exams of `exam_size` questions and summarise latency and call counts"""
+    from grader import handler
+
+    os.environ['GRADING_MAX_CONCURRENCY'] = str(concurrency)
+    mock.reset_counts()
+    round_trips_before = fake_db.round_trips
+    latencies: List[float] = []
+    failures = 0
+
+    started = time.perf_counter()
+    for exam_index in range(exams):
+        request = BenchmarkRequest(build_exam(exam_size, exam_index, mix))
+        exam_started = time.perf_counter()
+        response = handler(request)
+        latencies.append(time.perf_counter() - exam_started)
+        if response['statusCode'] != 200:
+            failures += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'examSize': exam_size,
+        'concurrency': concurrency,
+        'exams': exams,
+        'failures': failures,
+        'p50Ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95Ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99Ms': round(percentile(latencies, 99) * 1000, 1),
+        'questionsPerSecond': round(exam_size * exams / elapsed, 2) if elapsed else 0.0,
+        'apiCallsPerExam': round(mock.counts['requests'] / exams, 2),
+        'dbRoundTripsPerExam': round((fake_db.round_trips - round_trips_before) / exams, 2)
+    }
+
+def measure_cold_start(exam_size: int, runs: int, requests_per_run: int = 5) -> Dict[str, Any]:
+    """
+    Compare cold and warm start in fresh interpreters against the configured mock server
+
+    Returns:
+        Median import time of grader, first (cold) request time and warm request time,
+        plus any heavy modules loaded by the import alone
+    """
+    python_dir = os.path.dirname(os.path.abspath(__file__))
+    import_ms: List[float] = []
+    cold_ms: List[float] = []
+    warm_ms: List[float] = []
+    heavy_modules: set = set()
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START_PROBE, json.dumps(HEAVY_MODULES), str(exam_size), str(max(2, requests_per_run))],
+            cwd=python_dir, env={**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [python_dir, os.getenv('PYTHONPATH')]))},
+            capture_output=True, text=True, check=True
+        ).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        import_ms.append(probe['importSeconds'] * 1000)
+        cold_ms.append(probe['requestSeconds'][0] * 1000)
+        warm_ms.extend(seconds * 1000 for seconds in probe['requestSeconds'][1:])
+        heavy_modules.update(probe['heavyModules'])
+
+    return {
+        'runs': runs,
+        'importMs': round(percentile(import_ms, 50), 1),
+        'coldRequestMs': round(percentile(cold_ms, 50), 1),
+        'warmRequestMs': round(percentile(warm_ms, 50), 1),
+        'coldStartMs': round(percentile(import_ms, 50) + percentile(cold_ms, 50), 1),
+        'heavyModulesAtImport': sorted(heavy_modules)
+    }
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    columns = ['examSize', 'concurrency', 'p50Ms', 'p95Ms', 'p99Ms', 'questionsPerSecond', 'apiCallsPerExam',
+               'dbRoundTripsPerExam', 'failures']
+    widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in columns]
+    lines = ['  '.join(column.rjust(width) for column, width in zip(columns, widths))]
+    for result in results:
+        lines.append('  '.join(str(result[column]).rjust(width) for column, width in zip(columns, widths)))
+    return '\n'.join(lines)
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item.strip()]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark grader.handler against a local mock xAI server")
+    parser.add_argument('--exam-sizes', type=parse_int_list, default=[5, 20, 40])
+    parser.add_argument('--concurrency', type=parse_int_list, default=[1, 8])
+    parser.add_argument('--exams', type=int, default=10, help="Exams graded per scenario")
+    parser.add_argument('--mix', choices=QUESTION_MIXES, default='mixed')
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--latency-jitter-ms', type=float, default=50.0)
+    parser.add_argument('--latency-distribution', choices=('fixed', 'normal', 'uniform', 'lognormal'), default='normal')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.5)
+    parser.add_argument('--response-shape', choices=RESPONSE_SHAPES, default='json')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--cache', action='store_true', help="Keep the grading cache enabled")
+    parser.add_argument('--json', dest='json_path', help="Write results as JSON to this path")
+    parser.add_argument('--max-p95-ms', type=float, help="Fail if any scenario's p95 exceeds this")
+    parser.add_argument('--max-api-calls-per-exam', type=float, help="Fail if any scenario exceeds this")
+    parser.add_argument('--cold-start-runs', type=int, default=0,
+                        help="Fresh interpreters used to measure cold vs warm start (0 skips it)")
+    parser.add_argument('--max-import-ms', type=float,
+                        help="Import-time budget for grader; also fails if heavy modules load at import")
+    args = parser.parse_args(argv)
+
+    mock = MockXAIServer(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        latency_distribution=args.latency_distribution,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_seconds=args.retry_after,
+        response_shape=args.response_shape,
+        seed=args.seed
+    ).start()
+
+    os.environ.setdefault('XAI_API_KEY', 'benchmark')
+    os.environ['XAI_BASE_URL'] = mock.base_url
+    os.environ.setdefault('XAI_REQUESTS_PER_MINUTE', '1000000')
+    os.environ.setdefault('XAI_TOKENS_PER_MINUTE', '1000000000')
+    if not args.cache:
+        os.environ['GRADING_CACHE_ENABLED'] = 'false'
+
+    from db_client import set_supabase_client
+    from fake_supabase import FakeSupabaseClient
+    fake_db = FakeSupabaseClient()
+    set_supabase_client(fake_db)
+
+    results = []
+    cold_start = None
+    try:
+        if args.cold_start_runs or args.max_import_ms is not None:
+            cold_start = measure_cold_start(args.exam_sizes[0], max(1, args.cold_start_runs))
+        for exam_size in args.exam_sizes:
+            for concurrency in args.concurrency:
+                results.append(run_scenario(exam_size, concurrency, args.exams, mock, fake_db, args.mix))
+    finally:
+        mock.stop()
+
+    print(format_table(results))
+    if cold_start:
+        print(f"\ncold start: import {cold_start['importMs']}ms + first request {cold_start['coldRequestMs']}ms "
+              f"= {cold_start['coldStartMs']}ms; warm request {cold_start['warmRequestMs']}ms "
+              f"(median of {cold_start['runs']} runs); heavy modules at import: "
+              f"{', '.join(cold_start['heavyModulesAtImport']) or 'none'}")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'scenarios': results, 'coldStart': cold_start} if cold_start else results, f, indent=2)
+
+    failed = False
+    if args.max_import_ms is not None:
+        if cold_start['importMs'] > args.max_import_ms:
+            print(f"FAIL: grader import {cold_start['importMs']}ms > {args.max_import_ms}ms")
+            failed = True
+        if cold_start['heavyModulesAtImport']:
+            print(f"FAIL: heavy modules loaded at import: {', '.join(cold_start['heavyModulesAtImport'])}")
+            failed = True
+    for result in results:
+        if args.max_p95_ms is not None and result['p95Ms'] > args.max_p95_ms:
+            print(f"FAIL: p95 {result['p95Ms']}ms > {args.max_p95_ms}ms "
+                  f"(examSize={result['examSize']}, concurrency={result['concurrency']})")
+            failed = True
+        if args.max_api_calls_per_exam is not None and result['apiCallsPerExam'] > args.max_api_calls_per_exam:
+            print(f"FAIL: {result['apiCallsPerExam']} API calls per exam > {args.max_api_calls_per_exam} "
+                  f"(examSize={result['examSize']}, concurrency={result['concurrency']})")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,445 @@
+# python/bulk_regrade.py - Offline bulk re-grading of stored user_responses
+"""
+Re-grade historical user_responses after a rubric, prompt or model change
+
+Responses are streamed from a JSONL or CSV export of the user_responses table, or from a
+paged Supabase query, and grouped into candidates by consecutive user_id (exports must be
+ordered by user_id). Candidates are graded by a process pool sharing one rate limit, and
+results are written in input order as JSONL or bulk updates of the user_responses rows'
+ai_feedback and is_correct columns. Fallback grades (xAI unavailable, throttled or the
+circuit open) are never written: they are counted as failures and kept in the checkpoint,
+and a resumed run re-grades just those responses first. A checkpoint written after each
+flushed window lets a killed run resume where it stopped; outputs are at-least-once if
+the process dies between a database flush and its checkpoint.
+
+    python bulk_regrade.py --source export.jsonl --output regraded.jsonl --workers 4
+    python bulk_regrade.py --source supabase --sink db --checkpoint regrade.ckpt
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+from rate_limiter import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_DB_BATCH_SIZE = 500
+DEFAULT_CHECKPOINT_EVERY = 100
+DEFAULT_DEADLINE_SECONDS = 600.0
+PROGRESS_INTERVAL_SECONDS = 10.0
+# Candidates submitted to the pool per worker; bounds memory regardless of input size
+IN_FLIGHT_PER_WORKER = 4
+
+def response_to_answer(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a user_responses row to a grading answer resolved through the question bank"""
+    text = row.get('response_text') or ''
+    numerical = row.get('response_numerical')
+    if numerical not in (None, ''):
+        # Calculation answers keep the number first so the rule grader finds it
+        text = f"{numerical}\n{text}".strip()
+    return {
+        'questionId': str(row['question_id']),
+        'questionType': row.get('question_type'),
+        'answer': text,
+        'responseId': row.get('id')
+    }
+
+def iter_jsonl_rows(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_csv_rows(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+def iter_supabase_rows(page_size: int = DEFAULT_PAGE_SIZE, after_user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Page through user_responses ordered by user_id, one request per page"""
+    from db_operations import get_user_responses_page
+
+    offset = 0
+    while True:
+        rows = get_user_responses_page(offset, page_size, after_user_id)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+def group_candidates(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Group consecutive rows with the same user_id into one grading request"""
+    user_id = None
+    answers: List[Dict[str, Any]] = []
+    for row in rows:
+        row_user_id = str(row['user_id'])
+        if row_user_id != user_id and answers:
+            yield {'userInfo': {'userId': user_id}, 'answers': answers}
+            answers = []
+        user_id = row_user_id
+        answers.append(response_to_answer(row))
+    if answers:
+        yield {'userInfo': {'userId': user_id}, 'answers': answers}
+
+def drop_fallbacks(result: Dict[str, Any]) -> List[Any]:
+    """
+    Remove fallback grades from a graded candidate, returning their response ids
+
+    A fallback only means xAI could not grade the answer; writing it would replace the
+    stored feedback with a placeholder.
+    """
+    kept, failed = [], []
+    for grading_result in result['gradingResults']:
+        if grading_result.get('fallback') or grading_result.get('needsRegrade'):
+            failed.append(grading_result.get('responseId'))
+        else:
+            kept.append(grading_result)
+    if failed:
+        result['gradingResults'] = kept
+        result['totalScore'] = sum(grading_result['score'] for grading_result in kept)
+        result['maxScore'] = sum(grading_result['maxScore'] for grading_result in kept)
+    return [response_id for response_id in failed if response_id is not None]
+
+def retry_subset(candidate: Optional[Dict[str, Any]], retry: Dict[str, List[Any]]) -> Optional[Dict[str, Any]]:
+    """The answers of a candidate that a previous run could only fallback-grade, or None"""
+    if candidate is None:
+        return None
+    response_ids = {str(response_id) for response_id in retry.get(candidate['userInfo']['userId'], ())}
+    answers = [answer for answer in candidate['answers'] if str(answer.get('responseId')) in response_ids]
+    if not answers:
+        return None
+    return {'userInfo': candidate['userInfo'], 'answers': answers, 'retry': True}
+
+def count_rows(path: str) -> int:
+    """Responses in an export, counted in one streaming pass for the ETA"""
+    if path.endswith('.csv'):
+        # Records, not lines: quoted answers may span several lines
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return sum(1 for _ in csv.DictReader(f))
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+class Checkpoint:
+    """Progress of a run, replaced atomically so a crash never leaves a partial file"""
+
+    def __init__(self, path: Optional[str], source: str):
+        self.path = path
+        self.source = source
+        self.candidates = 0
+        self.responses = 0
+        self.last_user_id: Optional[str] = None
+        self.output_offset = 0
+        # user_id -> response ids that only got a fallback grade and still need one
+        self.retry: Dict[str, List[Any]] = {}
+
+    @property
+    def failures(self) -> int:
+        return sum(len(response_ids) for response_ids in self.retry.values())
+
+    def load(self) -> bool:
+        """Restore a previous run over the same source; returns whether one was found"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('source') != self.source:
+            raise ValueError(f"Checkpoint {self.path} belongs to {state.get('source')}, not {self.source}")
+        self.candidates = state['candidates']
+        self.responses = state['responses']
+        self.last_user_id = state.get('lastUserId')
+        self.output_offset = state.get('outputOffset', 0)
+        self.retry = state.get('retry', {})
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        state = {
+            'source': self.source,
+            'candidates': self.candidates,
+            'responses': self.responses,
+            'lastUserId': self.last_user_id,
+            'outputOffset': self.output_offset,
+            'retry': self.retry,
+            'savedAt': time.time()
+        }
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+class JsonlSink:
+    """Appends one JSON line per candidate; resuming truncates to the checkpointed offset"""
+
+    def __init__(self, path: str, offset: int = 0):
+        mode = 'r+b' if offset and os.path.exists(path) else 'wb'
+        self._file = open(path, mode)
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def write(self, result: Dict[str, Any]):
+        from serialization import dumps
+        self._file.write(dumps(result).encode('utf-8') + b"\n")
+
+    def flush(self) -> int:
+        """Make written results durable, returning the offset to checkpoint"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+class DatabaseSink:
+    """
+    Buffers new grades for the source user_responses rows and writes them back in bulk
+
+    GradingResult rows reference UserAnswer, not user_responses, so grades go to the
+    response row's own ai_feedback and is_correct columns. run() strips fallback grades
+    before they reach a sink, so an outage never overwrites stored feedback.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_DB_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._rows: List[Dict[str, Any]] = []
+
+    def write(self, result: Dict[str, Any]):
+        for grading_result in result['gradingResults']:
+            if grading_result.get('responseId') is not None:
+                self._rows.append({
+                    'id': grading_result['responseId'],
+                    # Required columns, so the bulk upsert is valid; unchanged for existing rows
+                    'user_id': result['userId'],
+                    'question_type': grading_result.get('questionType'),
+                    'question_id': grading_result['questionId'],
+                    'ai_feedback': grading_result.get('feedback', ''),
+                    'is_correct': grading_result['maxScore'] > 0 and grading_result['score'] >= grading_result['maxScore']
+                })
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        from db_operations import update_user_response_grades
+        if self._rows:
+            update_user_response_grades(self._rows)
+            self._rows = []
+        return 0
+
+    def close(self):
+        self.flush()
+
+class ProgressReporter:
+    """Prints throughput and ETA to stderr at most every interval seconds"""
+
+    def __init__(self, total_responses: Optional[int], already_done: int = 0,
+                 interval: float = PROGRESS_INTERVAL_SECONDS, stream=sys.stderr):
+        self.total_responses = total_responses
+        self.already_done = already_done
+        self.interval = interval
+        self.stream = stream
+        self.started = time.monotonic()
+        self._reported_at = self.started
+
+    def update(self, candidates: int, responses: int, failures: int = 0, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._reported_at < self.interval:
+            return
+        self._reported_at = now
+        elapsed = max(now - self.started, 1e-9)
+        rate = (responses - self.already_done) / elapsed
+        line = f"{candidates} candidates, {responses} responses, {failures} failed, {rate:.1f} responses/s"
+        if self.total_responses:
+            left = max(0, self.total_responses - responses)
+            eta = f"{left / rate:.0f}s" if rate > 0 else 'unknown'
+            line += f", {100.0 * responses / self.total_responses:.1f}% done, ETA {eta}"
+        print(line, file=self.stream, flush=True)
+
+# Per-process state, created by _init_worker in each pool process
+_worker_engine = None
+
+def _init_worker(requests_per_minute: float, tokens_per_minute: float, deadline_seconds: float, incremental: bool):
+    """Give each worker its share of the global rate limit before any client exists"""
+    global _worker_engine
+    os.environ['XAI_REQUESTS_PER_MINUTE'] = str(requests_per_minute)
+    os.environ['XAI_TOKENS_PER_MINUTE'] = str(tokens_per_minute)
+
+    from api_client import XAIApiError, get_default_client
+    from grader import fallback_grading
+    from grading_engine import GradingEngine
+    from incremental_grading import IncrementalGrader
+
+    try:
+        ai_client = get_default_client()
+    except XAIApiError as e:
+        print(f"Warning: AI client initialization failed: {e}", file=sys.stderr)
+        ai_client = None
+    # No similarity index: it would hold every re-graded answer in worker memory and match old answers to each other
+    _worker_engine = GradingEngine(ai_client, fallback=fallback_grading, deadline_seconds=deadline_seconds,
+                                   similarity_index=None)
+    if incremental:
+        _worker_engine = IncrementalGrader(_worker_engine)
+
+def grade_candidate(candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """Grade one candidate's responses in a worker process"""
+    from question_bank import get_question_bank
+
+    bank = get_question_bank()
+    items = []
+    for answer in candidate['answers']:
+        question = bank.get(answer.get('questionType'), answer['questionId'])
+        if question is not None:
+            items.append((answer, question))
+
+    grading_results = _worker_engine.grade_exam(items, candidate['userInfo'])
+    for (answer, _), grading_result in zip(items, grading_results):
+        grading_result['responseId'] = answer.get('responseId')
+        grading_result['questionType'] = answer.get('questionType')
+    return {
+        'userId': candidate['userInfo']['userId'],
+        'responses': len(candidate['answers']),
+        'retry': candidate.get('retry', False),
+        'gradingResults': grading_results,
+        'totalScore': sum(result['score'] for result in grading_results),
+        'maxScore': sum(result['maxScore'] for result in grading_results)
+    }
+
+def run(candidates: Iterable[Dict[str, Any]], sink, checkpoint: Checkpoint, executor, progress: ProgressReporter,
+        max_in_flight: int, checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY) -> Checkpoint:
+    """
+    Grade candidates on the executor and write their results in input order
+
+    At most max_in_flight candidates are submitted or waiting to be written at any time,
+    so memory stays flat however long the input is. Fallback grades are left out of the
+    output and recorded in checkpoint.retry; a retried candidate does not advance the
+    checkpoint's position in the input.
+    """
+    candidates = iter(candidates)
+    pending: Dict[Any, int] = {}
+    finished: Dict[int, Dict[str, Any]] = {}
+    submitted = written = 0
+    since_checkpoint = 0
+    exhausted = False
+
+    while True:
+        while not exhausted and submitted - written < max_in_flight:
+            candidate = next(candidates, None)
+            if candidate is None:
+                exhausted = True
+                break
+            pending[executor.submit(grade_candidate, candidate)] = submitted
+            submitted += 1
+        if not pending:
+            break
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            finished[pending.pop(future)] = future.result()
+
+        # Write the contiguous completed prefix so output order matches input order
+        while written in finished:
+            result = finished.pop(written)
+            failed = drop_fallbacks(result)
+            sink.write(result)
+            written += 1
+            since_checkpoint += 1
+            if result['retry']:
+                checkpoint.retry.pop(result['userId'], None)
+            else:
+                checkpoint.candidates += 1
+                checkpoint.responses += result['responses']
+                checkpoint.last_user_id = result['userId']
+            if failed:
+                checkpoint.retry[result['userId']] = failed
+
+        if since_checkpoint >= checkpoint_every:
+            checkpoint.output_offset = sink.flush()
+            checkpoint.save()
+            since_checkpoint = 0
+        progress.update(checkpoint.candidates, checkpoint.responses, checkpoint.failures)
+
+    checkpoint.output_offset = sink.flush()
+    checkpoint.save()
+    progress.update(checkpoint.candidates, checkpoint.responses, checkpoint.failures, force=True)
+    return checkpoint
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-grade stored user_responses in bulk")
+    parser.add_argument('--source', required=True, help="JSONL or CSV export of user_responses, or 'supabase'")
+    parser.add_argument('--sink', choices=('jsonl', 'db'), default='jsonl')
+    parser.add_argument('--output', help="JSONL output path (--sink jsonl)")
+    parser.add_argument('--checkpoint', help="Checkpoint path; an existing checkpoint is resumed")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--requests-per-minute', type=float,
+                        default=float(os.getenv('XAI_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE)),
+                        help="Global xAI request budget, split evenly across workers")
+    parser.add_argument('--tokens-per-minute', type=float,
+                        default=float(os.getenv('XAI_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE)))
+    parser.add_argument('--deadline-seconds', type=float, default=DEFAULT_DEADLINE_SECONDS,
+                        help="Grading budget per candidate")
+    parser.add_argument('--incremental', action='store_true', help="Skip responses whose grade fingerprint is unchanged")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--db-batch-size', type=int, default=DEFAULT_DB_BATCH_SIZE)
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY, help="Candidates per checkpoint")
+    parser.add_argument('--total', type=int, help="Expected responses, for the ETA (counted for file sources)")
+    args = parser.parse_args(argv)
+
+    if args.sink == 'jsonl' and not args.output:
+        parser.error("--output is required with --sink jsonl")
+
+    source = 'supabase:user_responses' if args.source == 'supabase' else f"file:{os.path.abspath(args.source)}"
+    checkpoint = Checkpoint(args.checkpoint, source)
+    if not args.restart and checkpoint.load():
+        print(f"Resuming after {checkpoint.candidates} candidates ({checkpoint.responses} responses), "
+              f"retrying {checkpoint.failures} fallback-graded responses", file=sys.stderr)
+
+    # Responses a previous run could only fallback-grade go first
+    retried: List[Dict[str, Any]] = []
+    if args.source == 'supabase':
+        from db_operations import get_user_responses_by_ids
+
+        if checkpoint.retry:
+            response_ids = [response_id for response_ids in checkpoint.retry.values() for response_id in response_ids]
+            retried = [dict(candidate, retry=True)
+                       for candidate in group_candidates(get_user_responses_by_ids(response_ids))]
+        # Ordered by user_id, so resuming continues after the last written candidate
+        candidates = group_candidates(iter_supabase_rows(args.page_size, checkpoint.last_user_id))
+        total = args.total
+    else:
+        rows = iter_csv_rows(args.source) if args.source.endswith('.csv') else iter_jsonl_rows(args.source)
+        candidates = group_candidates(rows)
+        for _ in range(checkpoint.candidates):
+            subset = retry_subset(next(candidates, None), checkpoint.retry)
+            if subset is not None:
+                retried.append(subset)
+        total = args.total or count_rows(args.source)
+    candidates = chain(retried, candidates)
+
+    sink = JsonlSink(args.output, checkpoint.output_offset) if args.sink == 'jsonl' else DatabaseSink(args.db_batch_size)
+    workers = max(1, args.workers)
+    progress = ProgressReporter(total, already_done=checkpoint.responses)
+    started = time.monotonic()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(args.requests_per_minute / workers, args.tokens_per_minute / workers,
+                      args.deadline_seconds, args.incremental)
+        ) as executor:
+            run(candidates, sink, checkpoint, executor, progress, workers * IN_FLIGHT_PER_WORKER, args.checkpoint_every)
+    finally:
+        sink.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Graded {checkpoint.candidates} candidates ({checkpoint.responses} responses) in {elapsed:.1f}s, "
+          f"{checkpoint.failures} responses left with only a fallback grade", file=sys.stderr)
+    return 1 if checkpoint.failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
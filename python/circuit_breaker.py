@@ -0,0 +1,201 @@
+# python/circuit_breaker.py - Circuit breaker that fails xAI calls fast during an outage
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Any, Callable, Optional
+
+from metrics import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# Gauge values for xai_circuit_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_CALLS = 10
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_SLOW_CALL_SECONDS = 10.0
+DEFAULT_SLOW_CALL_RATE = 0.8
+DEFAULT_OPEN_SECONDS = 30.0
+DEFAULT_HALF_OPEN_CALLS = 3
+
+_shared_breaker: Optional['CircuitBreaker'] = None
+_shared_breaker_lock = threading.Lock()
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+def _setting(value: Optional[float], name: str, default: float) -> float:
+    return value if value is not None else _env_float(name, default)
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by the error rate and latency of recent calls
+
+    Closed: calls pass and their outcomes fill a sliding window. When at least min_calls
+    are in the window and the failure rate or slow-call rate reaches its threshold, the
+    breaker opens. Open: calls are rejected at once until open_seconds have passed.
+    Half-open: up to half_open_calls probes pass; any failure reopens the breaker and
+    that many successes close it. Listeners are called on every transition.
+    """
+
+    def __init__(self, window: Optional[int] = None, min_calls: Optional[int] = None,
+                 failure_rate: Optional[float] = None, slow_call_seconds: Optional[float] = None,
+                 slow_call_rate: Optional[float] = None, open_seconds: Optional[float] = None,
+                 half_open_calls: Optional[int] = None, enabled: Optional[bool] = None):
+        """
+        Args:
+            window: Recent calls considered (env: XAI_BREAKER_WINDOW)
+            min_calls: Calls in the window before the breaker may open (env: XAI_BREAKER_MIN_CALLS)
+            failure_rate: Failed fraction that opens the breaker (env: XAI_BREAKER_FAILURE_RATE)
+            slow_call_seconds: Latency at which a successful call counts as slow (env: XAI_BREAKER_SLOW_CALL_SECONDS)
+            slow_call_rate: Slow fraction that opens the breaker (env: XAI_BREAKER_SLOW_CALL_RATE)
+            open_seconds: Time spent open before probing (env: XAI_BREAKER_OPEN_SECONDS)
+            half_open_calls: Probe calls allowed, and successes needed to close (env: XAI_BREAKER_HALF_OPEN_CALLS)
+            enabled: Turn the breaker on or off (env: XAI_BREAKER, default on)
+        """
+        # Explicit arguments win even when 0; only None falls back to the environment
+        self.min_calls = int(_setting(min_calls, 'XAI_BREAKER_MIN_CALLS', DEFAULT_MIN_CALLS))
+        self.failure_rate = _setting(failure_rate, 'XAI_BREAKER_FAILURE_RATE', DEFAULT_FAILURE_RATE)
+        self.slow_call_seconds = _setting(slow_call_seconds, 'XAI_BREAKER_SLOW_CALL_SECONDS', DEFAULT_SLOW_CALL_SECONDS)
+        self.slow_call_rate = _setting(slow_call_rate, 'XAI_BREAKER_SLOW_CALL_RATE', DEFAULT_SLOW_CALL_RATE)
+        self.open_seconds = _setting(open_seconds, 'XAI_BREAKER_OPEN_SECONDS', DEFAULT_OPEN_SECONDS)
+        # At least one probe, or a half-open breaker could never close
+        self.half_open_calls = max(1, int(_setting(half_open_calls, 'XAI_BREAKER_HALF_OPEN_CALLS', DEFAULT_HALF_OPEN_CALLS)))
+        self.enabled = enabled if enabled is not None else os.getenv('XAI_BREAKER', 'true').lower() not in ('0', 'false', 'no')
+        # (failed, slow) per completed call
+        self.outcomes = deque(maxlen=max(1, int(_setting(window, 'XAI_BREAKER_WINDOW', DEFAULT_WINDOW))))
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+        self.rejected = 0
+        self.transitions = 0
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._events: List[tuple] = []
+        self._lock = threading.Lock()
+        metrics.set_gauge('xai_circuit_state', STATE_VALUES[CLOSED])
+
+    def allow_request(self) -> bool:
+        """Whether a call may be sent now; rejected calls should fail over immediately"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            allowed = self._allow(time.monotonic())
+        self._notify()
+        return allowed
+
+    def _allow(self, now: float) -> bool:
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._transition(HALF_OPEN, now)
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                # Probes whose outcome was never recorded must not wedge the breaker
+                if now - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.probes = 0
+                self.opened_at = now
+            self.probes += 1
+        return True
+
+    def record_success(self, seconds: float):
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if slow:
+                    self._transition(OPEN, time.monotonic())
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED, time.monotonic())
+            else:
+                self.outcomes.append((False, slow))
+                self._evaluate()
+        self._notify()
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN, time.monotonic())
+            else:
+                self.outcomes.append((True, False))
+                self._evaluate()
+        self._notify()
+
+    def record_ignored(self):
+        """A call whose outcome says nothing about xAI health; frees its half-open probe slot"""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def add_listener(self, listener: Callable[[str, str], None]):
+        """Call listener(old_state, new_state) on every transition (outside the breaker lock)"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self.outcomes)
+            return {
+                'state': self.state,
+                'enabled': self.enabled,
+                'calls': calls,
+                'failureRate': sum(1 for failed, _ in self.outcomes if failed) / calls if calls else 0.0,
+                'slowCallRate': sum(1 for _, slow in self.outcomes if slow) / calls if calls else 0.0,
+                'rejected': self.rejected,
+                'transitions': self.transitions,
+                'openForSeconds': round(time.monotonic() - self.opened_at, 1) if self.state != CLOSED else 0.0
+            }
+
+    def _evaluate(self):
+        if self.state != CLOSED or len(self.outcomes) < self.min_calls:
+            return
+        calls = len(self.outcomes)
+        failures = sum(1 for failed, _ in self.outcomes if failed)
+        slow = sum(1 for _, is_slow in self.outcomes if is_slow)
+        if failures / calls >= self.failure_rate or slow / calls >= self.slow_call_rate:
+            self._transition(OPEN, time.monotonic())
+
+    def _transition(self, state: str, now: float):
+        """Change state; callers hold the lock"""
+        previous, self.state = self.state, state
+        self.transitions += 1
+        if state in (OPEN, HALF_OPEN):
+            self.opened_at = now
+        if state != HALF_OPEN:
+            self.probes = 0
+        self.probe_successes = 0
+        if state == CLOSED:
+            self.outcomes.clear()
+        metrics.set_gauge('xai_circuit_state', STATE_VALUES[state])
+        metrics.inc('xai_circuit_transitions', to_state=state)
+        print(f"xAI circuit breaker {previous} -> {state}")
+        self._events.append((previous, state))
+
+    def _notify(self):
+        """Deliver queued transitions; listeners may call back into the breaker, so the lock is not held"""
+        with self._lock:
+            if not self._events:
+                return
+            events, self._events = self._events, []
+            listeners = list(self._listeners)
+        for previous, state in events:
+            for listener in listeners:
+                try:
+                    listener(previous, state)
+                except Exception as e:
+                    print(f"Circuit breaker listener failed: {e}")
+
+def get_shared_circuit_breaker() -> CircuitBreaker:
+    """Process-wide breaker, so every client sees the same view of xAI health"""
+    global _shared_breaker
+    with _shared_breaker_lock:
+        if _shared_breaker is None:
+            _shared_breaker = CircuitBreaker()
+        return _shared_breaker
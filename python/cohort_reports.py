@@ -0,0 +1,168 @@
+# python/cohort_reports.py - Batch report generation and statistics across a candidate cohort
+import heapq
+import math
+from array import array
+from itertools import islice
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+from report_analytics import analyze_cohort
+from report_generator import ReportGenerator
+from serialization import encode_report_content
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_TOP_N = 50
+DISTRIBUTION_BUCKETS = 10
+PERCENTILES = (10, 25, 50, 75, 90, 95, 99)
+
+class CohortStatistics:
+    """
+    Streaming cohort aggregates with memory bounded by cohort size in compact arrays
+
+    Only one float per candidate is kept for percentiles; per-category distributions
+    are fixed-size histograms and rankings keep the top N per position.
+    """
+
+    def __init__(self, top_n: int = DEFAULT_TOP_N):
+        self.top_n = top_n
+        self.percentages = array('d')
+        self.categories: Dict[str, Dict[str, Any]] = {}
+        self.rankings: Dict[str, List[tuple]] = {}
+        self.recommendations: Dict[str, int] = {}
+        self._sequence = 0
+
+    def add(self, report: Dict[str, Any]):
+        """Fold one candidate's report into the cohort aggregates"""
+        percentage = report['summary']['percentage']
+        self.percentages.append(percentage)
+
+        recommendation = report['analysis']['hiringRecommendation']
+        self.recommendations[recommendation] = self.recommendations.get(recommendation, 0) + 1
+
+        for result in report['gradingResults']:
+            max_score = result.get('maxScore', 0)
+            if not max_score:
+                continue
+            category = result.get('category') or result.get('type') or 'General'
+            stats = self.categories.setdefault(category, {
+                'count': 0, 'scoreSum': 0.0, 'histogram': [0] * DISTRIBUTION_BUCKETS
+            })
+            ratio = result.get('score', 0) / max_score
+            stats['count'] += 1
+            stats['scoreSum'] += ratio
+            stats['histogram'][min(DISTRIBUTION_BUCKETS - 1, max(0, int(ratio * DISTRIBUTION_BUCKETS)))] += 1
+
+        # Min-heap of the best N candidates per position; the sequence breaks ties stably
+        user_info = report['userInfo']
+        position = user_info.get('position') or 'Unknown'
+        heap = self.rankings.setdefault(position, [])
+        entry = (percentage, -self._sequence, user_info.get('userId'),
+                 f"{user_info.get('firstName', '')} {user_info.get('lastName', '')}".strip())
+        self._sequence += 1
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def summary(self) -> Dict[str, Any]:
+        """Cohort percentiles, per-category score distributions and per-position rankings"""
+        ordered = sorted(self.percentages)
+        count = len(ordered)
+
+        def percentile(pct: float) -> float:
+            # Nearest rank: the smallest value with at least pct% of the cohort at or below it
+            if not ordered:
+                return 0.0
+            rank = max(0, min(count - 1, math.ceil(pct / 100.0 * count) - 1))
+            return ordered[rank]
+
+        return {
+            'candidates': count,
+            'meanPercentage': round(sum(ordered) / count, 1) if count else 0.0,
+            'percentiles': {f"p{pct}": percentile(pct) for pct in PERCENTILES},
+            'hiringRecommendations': dict(self.recommendations),
+            'categories': {
+                category: {
+                    'questions': stats['count'],
+                    'meanScoreRatio': round(stats['scoreSum'] / stats['count'], 4),
+                    'distribution': stats['histogram']
+                }
+                for category, stats in self.categories.items()
+            },
+            'rankings': {
+                position: [
+                    {'rank': rank, 'userId': user_id, 'name': name, 'percentage': percentage}
+                    for rank, (percentage, _, user_id, name) in enumerate(sorted(heap, reverse=True), start=1)
+                ]
+                for position, heap in self.rankings.items()
+            }
+        }
+
+class CohortReportBuilder:
+    """Builds and bulk-persists reports for a stream of candidates in fixed-size chunks"""
+
+    def __init__(self, report_generator: Optional[ReportGenerator] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 top_n: int = DEFAULT_TOP_N, persist: bool = True):
+        """
+        Args:
+            report_generator: Generator used to build each report
+            chunk_size: Candidates analyzed and inserted per batch
+            top_n: Candidates kept per position in the rankings
+            persist: Bulk insert each chunk's reports into the Report table
+        """
+        self.report_generator = report_generator or ReportGenerator()
+        self.chunk_size = chunk_size
+        self.persist = persist
+        self.statistics = CohortStatistics(top_n)
+
+    def build_reports(self, candidates: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Build a report per candidate, yielding each once its chunk is persisted
+
+        Args:
+            candidates: Iterable of {'userInfo', 'gradingResults', 'examMetadata'} dicts;
+                consumed lazily so only one chunk is held in memory
+
+        Yields:
+            Complete exam reports in input order (with 'id' when persisted)
+        """
+        iterator = iter(candidates)
+        while True:
+            chunk = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                break
+
+            analytics = analyze_cohort([candidate.get('gradingResults', []) for candidate in chunk])
+            reports = [
+                self.report_generator.build_exam_report(
+                    candidate.get('gradingResults', []),
+                    candidate.get('userInfo', {}),
+                    candidate.get('examMetadata', {}),
+                    analytics=candidate_analytics
+                )
+                for candidate, candidate_analytics in zip(chunk, analytics)
+            ]
+
+            if self.persist:
+                self._persist(reports)
+
+            for report in reports:
+                self.statistics.add(report)
+                yield report
+
+    def run(self, candidates: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build and persist every report, returning only the cohort statistics"""
+        for _ in self.build_reports(candidates):
+            pass
+        return self.statistics.summary()
+
+    def _persist(self, reports: List[Dict[str, Any]]):
+        from db_operations import insert_reports
+
+        rows = [{'user_id': report['userInfo']['userId'], 'content': encode_report_content(report)} for report in reports]
+        for report, report_id in zip(reports, insert_reports(rows)):
+            report['id'] = report_id
+
+def generate_cohort_reports(candidates: Iterable[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            top_n: int = DEFAULT_TOP_N, persist: bool = True) -> Dict[str, Any]:
+    """Generate and bulk-insert reports for every candidate and return cohort statistics"""
+    return CohortReportBuilder(chunk_size=chunk_size, top_n=top_n, persist=persist).run(candidates)
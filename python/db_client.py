@@ -1,9 +1,39 @@
 import os
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING
 
-def create_supabase_client() -> Client:
+if TYPE_CHECKING:
+    from supabase import Client
+
+_client = None
+_client_lock = threading.Lock()
+
+def create_supabase_client() -> 'Client':
+    """
+    Client for SUPABASE_URL, authenticated with SUPABASE_SERVICE_ROLE_KEY when set
+
+    Server-side writes to RLS-protected tables (grading_jobs, CopyFlag, ...) need the
+    service role; SUPABASE_ANON_KEY still works for the public tables.
+    """
+    # supabase is slow to import; load it only when a client is first needed
+    from supabase import create_client
+    
     url = os.environ.get('SUPABASE_URL')
-    key = os.environ.get('SUPABASE_ANON_KEY')
+    key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or os.environ.get('SUPABASE_ANON_KEY')
     if not url or not key:
         raise ValueError('Missing Supabase credentials')
     return create_client(url, key)
+
+def get_supabase_client() -> 'Client':
+    """Get the process-wide Supabase client, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_supabase_client()
+        return _client
+
+def set_supabase_client(client):
+    """Replace the process-wide Supabase client (None resets it)"""
+    global _client
+    with _client_lock:
+        _client = client
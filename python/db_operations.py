@@ -1,32 +1,236 @@
-from db_client import create_supabase_client
+import time
+from typing import Dict, List, Any, Optional
+from db_client import get_supabase_client
+from metrics import metrics
+
+# PostgREST caps rows per response, so large selects are read in pages of this size
+DEFAULT_PAGE_SIZE = 1000
+
+def _execute(query, operation: str):
+    """Execute a Supabase query, recording one round trip and its latency"""
+    started = time.perf_counter()
+    try:
+        return query.execute()
+    finally:
+        metrics.observe('db_request_seconds', time.perf_counter() - started, operation=operation)
+        metrics.inc('db_round_trips', exam_key='dbRoundTrips', operation=operation)
 
 def insert_user_answer(user_id: str, question_id: str, answer_text: str):
-    client = create_supabase_client()
+    client = get_supabase_client()
     data = {'user_id': user_id, 'question_id': question_id, 'answer_text': answer_text}
-    response = client.table('UserAnswer').insert(data).execute()
+    response = _execute(client.table('UserAnswer').insert(data), 'insert_user_answer')
     if hasattr(response, 'error') and response.error:
         raise Exception(f'Insert failed: {response.error}')
     return response.data[0]['id']  # Return new answer ID for grading 
 
 def get_user_answer(answer_id: str):
-    client = create_supabase_client()
-    response = client.table('UserAnswer').select('*').eq('id', answer_id).single().execute()
+    client = get_supabase_client()
+    response = _execute(client.table('UserAnswer').select('*').eq('id', answer_id).single(), 'get_user_answer')
     if hasattr(response, 'error') and response.error:
         raise Exception(f'Query failed: {response.error}')
     return response.data
 
+def get_user_answers(answer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch many UserAnswer rows in one request, keyed by id"""
+    if not answer_ids:
+        return {}
+    client = get_supabase_client()
+    response = _execute(client.table('UserAnswer').select('*').in_('id', list(answer_ids)), 'get_user_answers')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Query failed: {response.error}')
+    return {str(row['id']): row for row in response.data}
+
 def insert_grading_result(answer_id: str, score: int, feedback: str):
-    client = create_supabase_client()
+    client = get_supabase_client()
     data = {'answer_id': answer_id, 'score': score, 'feedback': feedback}
-    response = client.table('GradingResult').insert(data).execute()
+    response = _execute(client.table('GradingResult').insert(data), 'insert_grading_result')
     if hasattr(response, 'error') and response.error:
         raise Exception(f'Insert failed: {response.error}')
     return response.data
 
-def insert_report(user_id: str, content: str):
-    client = create_supabase_client()
+def insert_grading_results(rows: List[Dict[str, Any]]):
+    """
+    Insert many GradingResult rows ({answer_id, score, feedback}) in one request
+
+    answer_id is unique, so a row for an answer that already has a result is skipped
+    rather than stored twice; only newly inserted rows are returned.
+    """
+    if not rows:
+        return []
+    client = get_supabase_client()
+    query = client.table('GradingResult').upsert(rows, on_conflict='answer_id', ignore_duplicates=True)
+    response = _execute(query, 'insert_grading_results')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Insert failed: {response.error}')
+    return response.data
+
+def grading_result_exists(answer_id: str) -> bool:
+    return bool(get_graded_answer_ids([answer_id]))
+
+def get_graded_answer_ids(answer_ids: List[str]) -> set:
+    """Return the subset of answer ids that already have a GradingResult, in one request"""
+    if not answer_ids:
+        return set()
+    client = get_supabase_client()
+    response = _execute(client.table('GradingResult').select('answer_id').in_('answer_id', list(answer_ids)), 'get_graded_answer_ids')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Query failed: {response.error}')
+    return {str(row['answer_id']) for row in response.data}
+
+def insert_report(user_id: str, content: str, exam_key: Optional[str] = None):
+    """Insert a Report row, or replace the exam's existing report when exam_key is given"""
+    client = get_supabase_client()
     data = {'user_id': user_id, 'content': content}
-    response = client.table('Report').insert(data).execute()
+    if exam_key is None:
+        query = client.table('Report').insert(data)
+    else:
+        query = client.table('Report').upsert({**data, 'exam_key': exam_key}, on_conflict='exam_key')
+    response = _execute(query, 'insert_report')
     if hasattr(response, 'error') and response.error:
         raise Exception(f'Insert failed: {response.error}')
     return response.data[0]['id']
+
+def insert_reports(rows: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Insert many Report rows ({user_id, content}) in one request, returning their ids in order
+
+    Rows carrying an exam_key replace that exam's existing report; keys must be unique
+    within one call.
+    """
+    if not rows:
+        return []
+    client = get_supabase_client()
+    if any(row.get('exam_key') is not None for row in rows):
+        keyed = [{'exam_key': None, **row} for row in rows]
+        query = client.table('Report').upsert(keyed, on_conflict='exam_key')
+    else:
+        query = client.table('Report').insert(rows)
+    response = _execute(query, 'insert_reports')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Insert failed: {response.error}')
+    return [row['id'] for row in response.data]
+
+def insert_copy_flags(rows: List[Dict[str, Any]]):
+    """Insert many CopyFlag rows ({user_id, question_id, max_similarity, cluster, created_at}) in one request"""
+    if not rows:
+        return []
+    client = get_supabase_client()
+    response = _execute(client.table('CopyFlag').insert(rows), 'insert_copy_flags')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Insert failed: {response.error}')
+    return response.data
+
+def get_exam_grading_results(user_id: str, question_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch a candidate's stored ExamGradingResult rows for many questions in one request, keyed by question id"""
+    if not question_ids:
+        return {}
+    client = get_supabase_client()
+    query = client.table('ExamGradingResult').select('*').eq('user_id', user_id).in_('question_id', list(question_ids))
+    response = _execute(query, 'get_exam_grading_results')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Query failed: {response.error}')
+    return {str(row['question_id']): row for row in response.data}
+
+def upsert_exam_grading_results(rows: List[Dict[str, Any]]):
+    """Insert or replace many ExamGradingResult rows ({key, user_id, question_id, fingerprint, result}) in one request"""
+    if not rows:
+        return []
+    client = get_supabase_client()
+    response = _execute(client.table('ExamGradingResult').upsert(rows, on_conflict='key'), 'upsert_exam_grading_results')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Upsert failed: {response.error}')
+    return response.data
+
+def get_question_rows(table: str, created_after: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Fetch every row of a question table, or only those created after a timestamp, one page per request"""
+    client = get_supabase_client()
+    rows: List[Dict[str, Any]] = []
+    while True:
+        query = client.table(table).select('*')
+        if created_after is not None:
+            query = query.gt('created_at', created_after)
+        query = query.order('id').range(len(rows), len(rows) + page_size - 1)
+        response = _execute(query, 'get_question_rows')
+        if hasattr(response, 'error') and response.error:
+            raise Exception(f'Query failed: {response.error}')
+        rows.extend(response.data)
+        if len(response.data) < page_size:
+            return rows
+
+def get_user_responses_by_ids(response_ids: List[Any]) -> List[Dict[str, Any]]:
+    """Fetch user_responses rows by id in one request, ordered by user_id"""
+    if not response_ids:
+        return []
+    client = get_supabase_client()
+    query = client.table('user_responses').select('*').in_('id', list(response_ids)).order('user_id').order('id')
+    response = _execute(query, 'get_user_responses_by_ids')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Query failed: {response.error}')
+    return response.data
+
+def update_user_response_grades(rows: List[Dict[str, Any]]):
+    """Write new grades ({id, user_id, question_type, question_id, ai_feedback, is_correct}) onto many user_responses rows in one request"""
+    if not rows:
+        return []
+    client = get_supabase_client()
+    response = _execute(client.table('user_responses').upsert(rows, on_conflict='id'), 'update_user_response_grades')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Upsert failed: {response.error}')
+    return response.data
+
+def get_user_responses_page(offset: int, page_size: int = DEFAULT_PAGE_SIZE, after_user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetch one page of user_responses ordered by user_id, optionally only users after after_user_id"""
+    client = get_supabase_client()
+    query = client.table('user_responses').select('*')
+    if after_user_id is not None:
+        query = query.gt('user_id', after_user_id)
+    query = query.order('user_id').order('id').range(offset, offset + page_size - 1)
+    response = _execute(query, 'get_user_responses_page')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Query failed: {response.error}')
+    return response.data
+
+def enqueue_grading_job(answer_id: str, idempotency_key: str) -> bool:
+    """Queue a grading job in the shared grading_jobs table (or revive a failed one); true if queued"""
+    client = get_supabase_client()
+    params = {'p_answer_id': answer_id, 'p_idempotency_key': idempotency_key}
+    response = _execute(client.rpc('enqueue_grading_job', params), 'enqueue_grading_job')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Enqueue failed: {response.error}')
+    return bool(response.data)
+
+def claim_grading_jobs(worker_id: str, limit: int, lease_seconds: float, max_attempts: int) -> List[Dict[str, Any]]:
+    """Lease up to limit available grading jobs to worker_id in one request"""
+    client = get_supabase_client()
+    params = {'p_worker': worker_id, 'p_limit': limit, 'p_lease_seconds': lease_seconds, 'p_max_attempts': max_attempts}
+    response = _execute(client.rpc('claim_grading_jobs', params), 'claim_grading_jobs')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Claim failed: {response.error}')
+    return response.data or []
+
+def finish_grading_job(job_id: int, worker_id: str, status: str, delay_seconds: float = 0.0,
+                       error: Optional[str] = None) -> bool:
+    """Move a job worker_id still holds to done, queued or failed; false if its lease was lost"""
+    client = get_supabase_client()
+    params = {'p_id': job_id, 'p_worker': worker_id, 'p_status': status, 'p_delay_seconds': delay_seconds, 'p_error': error}
+    response = _execute(client.rpc('finish_grading_job', params), 'finish_grading_job')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Update failed: {response.error}')
+    return bool(response.data)
+
+def renew_grading_jobs(job_ids: List[int], worker_id: str, lease_seconds: float) -> int:
+    """Extend the leases worker_id still holds on job_ids; returns how many were renewed"""
+    client = get_supabase_client()
+    params = {'p_ids': list(job_ids), 'p_worker': worker_id, 'p_lease_seconds': lease_seconds}
+    response = _execute(client.rpc('renew_grading_jobs', params), 'renew_grading_jobs')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Update failed: {response.error}')
+    return int(response.data or 0)
+
+def get_grading_job_counts() -> Dict[str, int]:
+    """Grading jobs by status"""
+    client = get_supabase_client()
+    response = _execute(client.rpc('grading_job_counts', {}), 'get_grading_job_counts')
+    if hasattr(response, 'error') and response.error:
+        raise Exception(f'Query failed: {response.error}')
+    return {row['status']: row['count'] for row in response.data or []}
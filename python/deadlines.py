@@ -0,0 +1,134 @@
+# python/deadlines.py - Request deadline propagation and latency-based hedging policy
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+DEFAULT_HEDGE_PERCENTILE = 95.0
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_MAX_FRACTION = 0.1
+DEFAULT_LATENCY_WINDOW = 200
+# Time left for the fallback grader and response assembly after a call gives up
+DEADLINE_SAFETY_SECONDS = 0.25
+
+_current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('grading_deadline', default=None)
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None, at: Optional[float] = None) -> Iterator[float]:
+    """
+    Bound everything in this context by a deadline
+
+    A nested scope can only shorten the enclosing deadline, never extend it.
+
+    Args:
+        seconds: Budget from now
+        at: Absolute time.monotonic() deadline (used instead of seconds)
+    """
+    deadline = at if at is not None else time.monotonic() + seconds
+    enclosing = _current_deadline.get()
+    if enclosing is not None:
+        deadline = min(deadline, enclosing)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    return _current_deadline.get()
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the current deadline minus the safety margin, or default without one"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    return deadline - time.monotonic() - DEADLINE_SAFETY_SECONDS
+
+def call_timeout(default: float) -> float:
+    """Timeout for one outbound call: the default, capped by the remaining budget"""
+    budget = remaining()
+    if budget is None:
+        return default
+    return max(0.0, min(default, budget))
+
+class HedgePolicy:
+    """
+    Decides when to send a duplicate request for a slow call
+
+    The hedge delay is the configured percentile of recent successful latencies, and at
+    most max_fraction of requests may be hedged so the extra cost stays bounded.
+    """
+
+    def __init__(self, percentile: Optional[float] = None, min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES,
+                 max_fraction: Optional[float] = None, window: int = DEFAULT_LATENCY_WINDOW,
+                 enabled: Optional[bool] = None):
+        """
+        Args:
+            percentile: Latency percentile after which a call is hedged (env: XAI_HEDGE_PERCENTILE)
+            min_samples: Successful calls observed before hedging starts
+            max_fraction: Upper bound on hedged requests / requests (env: XAI_HEDGE_MAX_FRACTION)
+            window: Recent latencies kept for the percentile
+            enabled: Turn hedging on or off (env: XAI_HEDGE, default on)
+        """
+        self.percentile = percentile or float(os.getenv('XAI_HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE))
+        self.min_samples = min_samples
+        self.max_fraction = max_fraction if max_fraction is not None else float(
+            os.getenv('XAI_HEDGE_MAX_FRACTION', DEFAULT_HEDGE_MAX_FRACTION))
+        self.enabled = enabled if enabled is not None else os.getenv('XAI_HEDGE', 'true').lower() not in ('0', 'false', 'no')
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        """Record the latency of a successful call"""
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging a new call, or None when it must not be hedged"""
+        with self._lock:
+            self.requests += 1
+            if not self.enabled or len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        # Nearest rank, as in cohort_reports
+        rank = max(0, min(len(ordered) - 1, math.ceil(self.percentile / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def try_hedge(self) -> bool:
+        """Claim a hedge if the hedged fraction allows another one"""
+        with self._lock:
+            if self.hedges + 1 > self.max_fraction * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedgeWins': self.hedge_wins,
+                'samples': len(self.latencies)
+            }
+
+_hedge_policy_lock = threading.Lock()
+_hedge_policy: Optional[HedgePolicy] = None
+
+def get_shared_hedge_policy() -> HedgePolicy:
+    """Process-wide hedge policy, so latency history is shared by every client"""
+    global _hedge_policy
+    with _hedge_policy_lock:
+        if _hedge_policy is None:
+            _hedge_policy = HedgePolicy()
+        return _hedge_policy
@@ -0,0 +1,124 @@
+# python/fake_supabase.py - In-memory stand-in for the Supabase client used by db_operations
+import itertools
+import threading
+from typing import Dict, List, Any, Callable, Optional
+
+class FakeResponse:
+    """Mimics the postgrest response object (data, error)"""
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.error = None
+
+class FakeQuery:
+    """Chainable query builder supporting the calls made by db_operations"""
+
+    def __init__(self, client: 'FakeSupabaseClient', table: str):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.payload: Any = None
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self.row_limit: Optional[int] = None
+        self.single_row = False
+        self.order_key: Optional[str] = None
+        self.order_desc = False
+        self.row_range: Optional[tuple] = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+
+    def select(self, *columns, **kwargs) -> 'FakeQuery':
+        self.operation = 'select'
+        return self
+
+    def insert(self, payload) -> 'FakeQuery':
+        self.operation = 'insert'
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict: Optional[str] = None, ignore_duplicates: bool = False, **kwargs) -> 'FakeQuery':
+        self.operation = 'upsert'
+        self.payload = payload
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def eq(self, column: str, value) -> 'FakeQuery':
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def gt(self, column: str, value) -> 'FakeQuery':
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def in_(self, column: str, values) -> 'FakeQuery':
+        wanted = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def order(self, column: str, desc: bool = False) -> 'FakeQuery':
+        self.order_key = column
+        self.order_desc = desc
+        return self
+
+    def limit(self, count: int) -> 'FakeQuery':
+        self.row_limit = count
+        return self
+
+    def range(self, start: int, end: int) -> 'FakeQuery':
+        self.row_range = (start, end)
+        return self
+
+    def single(self) -> 'FakeQuery':
+        self.single_row = True
+        return self
+
+    def execute(self) -> FakeResponse:
+        return self.client._execute(self)
+
+class FakeSupabaseClient:
+    """
+    Thread-safe in-memory tables with round-trip counting
+
+    Install with db_client.set_supabase_client(FakeSupabaseClient()).
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.round_trips = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def _execute(self, query: FakeQuery) -> FakeResponse:
+        with self._lock:
+            self.round_trips += 1
+            rows = self.tables.setdefault(query.table, [])
+
+            if query.operation in ('insert', 'upsert'):
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                inserted = []
+                for row in payload:
+                    row = dict(row)
+                    conflict = query.on_conflict or 'key'
+                    if query.operation == 'upsert' and row.get(conflict) is not None:
+                        if query.ignore_duplicates and any(existing.get(conflict) == row[conflict] for existing in rows):
+                            continue
+                        rows[:] = [existing for existing in rows if existing.get(conflict) != row[conflict]]
+                    row.setdefault('id', next(self._ids))
+                    rows.append(row)
+                    inserted.append(dict(row))
+                return FakeResponse(inserted)
+
+            matched = [dict(row) for row in rows if all(check(row) for check in query.filters)]
+            if query.order_key:
+                matched.sort(key=lambda row: row.get(query.order_key), reverse=query.order_desc)
+            if query.row_range:
+                matched = matched[query.row_range[0]:query.row_range[1] + 1]
+            if query.row_limit is not None:
+                matched = matched[:query.row_limit]
+            if query.single_row:
+                return FakeResponse(matched[0] if matched else None)
+            return FakeResponse(matched)
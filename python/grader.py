@@ -1,10 +1,28 @@
 import json
-from typing import Dict, List, Any
 import os
-from api_client import XAIClient, XAIApiError
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from api_client import XAIApiError, get_default_client
 from report_generator import ReportGenerator
-import requests
-from db_operations import get_user_answer, insert_grading_result
+from grading_engine import GradingEngine, DEFAULT_MAX_CONCURRENCY
+from incremental_grading import IncrementalGrader, incremental_enabled
+from question_bank import get_question_bank
+from similarity_index import get_similarity_index
+from circuit_breaker import CLOSED, get_shared_circuit_breaker
+from regrade_backlog import get_regrade_backlog, regrade_backlog_enabled
+from db_operations import get_user_answers, insert_copy_flags, insert_grading_results
+from serialization import dumps, loads, to_wire, wire_format
+from response_parser import parse_score_feedback
+from metrics import exam_metrics, metrics
+
+# Reused across invocations while the function instance stays warm
+_report_generator: Optional[ReportGenerator] = None
+
+# Minimum time between background drains of queued re-grades started by healthy exams
+DRAIN_CHECK_SECONDS = 30.0
+_last_drain_check = float('-inf')
 
 def handler(request):
     """
@@ -15,80 +33,35 @@ def handler(request):
         if hasattr(request, 'json'):
             data = request.json()
         else:
-            data = json.loads(request.get_data(as_text=True))
-        
-        answers = data.get('answers', [])
-        questions = data.get('questions', [])
-        user_info = data.get('userInfo', {})
-        
-        # Initialize AI client and report generator
-        try:
-            ai_client = XAIClient()
-            report_generator = ReportGenerator()
-        except XAIApiError as e:
-            print(f"Warning: AI client initialization failed: {e}")
-            ai_client = None
-            report_generator = ReportGenerator()
-        
-        # Grade each answer using AI or fallback
-        grading_results = []
-        total_score = 0
-        max_score = 0
+            data = loads(request.get_data(as_text=True))
+    except Exception as e:
+        print(f"Error in exam grading: {e}")
+        return _error_response(e)
+    
+    return grade_exam_data(data)
+
+def grade_exam_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Grade a parsed exam request
+    
+    Args:
+        data: Grading request (answers, userInfo, completedAt, optional questions, wireFormat
+            and incremental); answers carrying questionType may omit their question
         
-        for answer in answers:
-            question = next((q for q in questions if q['id'] == answer['questionId']), None)
-            if not question:
-                continue
-            
-            # Use AI grading if available, otherwise fallback
-            if ai_client:
-                try:
-                    grading_result = ai_client.grade_exam_response(
-                        question, 
-                        answer.get('answer', ''), 
-                        user_info
-                    )
-                except XAIApiError as e:
-                    print(f"AI grading failed for question {answer['questionId']}: {e}")
-                    grading_result = fallback_grading(answer, question)
-            else:
-                grading_result = fallback_grading(answer, question)
-            
-            grading_results.append({
-                'questionId': answer['questionId'],
-                'answer': answer.get('answer', ''),
-                'timeSpent': answer.get('timeSpent', 0),
-                **grading_result
-            })
+    Returns:
+        Response dict with statusCode, headers and the JSON-encoded body
+    """
+    try:
+        with exam_metrics() as exam_totals:
+            engine, report_generator, items = _prepare_grading(data)
             
-            total_score += grading_result['score']
-            max_score += grading_result['maxScore']
-        
-        # Generate comprehensive report
-        exam_metadata = {
-            'completedAt': data.get('completedAt', ''),
-            'timeSpent': sum(answer.get('timeSpent', 0) for answer in answers),
-            'totalQuestions': len(questions)
-        }
-        
-        report = report_generator.generate_exam_report(
-            grading_results, 
-            user_info, 
-            exam_metadata
-        )
-        
-        # Add legacy fields for backward compatibility
-        result = {
-            'userInfo': user_info,
-            'answers': answers,
-            'gradingResults': grading_results,
-            'totalScore': total_score,
-            'maxScore': max_score,
-            'overallFeedback': report['analysis']['overallFeedback'],
-            'completedAt': exam_metadata['completedAt'],
-            'timeSpent': exam_metadata['timeSpent'],
-            'report': report  # Include full report
-        }
+            # Grade all answers concurrently using AI or fallback
+            with metrics.span('grade'):
+                grading_results = engine.grade_exam(items, data.get('userInfo', {}))
+            result = _build_exam_result(data, grading_results, report_generator)
+            _record_copy_flags(data.get('userInfo', {}), engine)
+            _queue_regrade(data, grading_results)
+        result['metrics'] = exam_totals.summary()
         
         return {
             'statusCode': 200,
@@ -96,19 +69,216 @@ def handler(request):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result)
+            'body': dumps(to_wire(result, wire_format(data)))
         }
         
     except Exception as e:
         print(f"Error in exam grading: {e}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
+        return _error_response(e)
+
+def _error_response(error: Exception) -> Dict[str, Any]:
+    return {
+        'statusCode': 500,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': str(error)})
+    }
+
+def stream_grading(data: Dict[str, Any], event_format: str = 'ndjson') -> Iterator[str]:
+    """
+    Grade an exam, streaming one event per question as soon as it is graded
+    
+    Args:
+        data: Parsed grading request (answers, questions, userInfo, completedAt)
+        event_format: 'ndjson' for newline-delimited JSON or 'sse' for Server-Sent Events
+        
+    Yields:
+        Encoded "result" events in completion order, then one "summary" event
+        carrying the same payload as the non-streaming handler (or an "error" event)
+    """
+    try:
+        with exam_metrics() as exam_totals:
+            engine, report_generator, items = _prepare_grading(data)
+            grading_results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+            
+            for index, grading_result in engine.iter_exam(items, data.get('userInfo', {})):
+                grading_results[index] = grading_result
+                yield format_event('result', {'index': index, 'gradingResult': grading_result}, event_format)
+            
+            result = _build_exam_result(data, grading_results, report_generator)
+            _record_copy_flags(data.get('userInfo', {}), engine)
+            _queue_regrade(data, grading_results)
+        result['metrics'] = exam_totals.summary()
+        yield format_event('summary', to_wire(result, wire_format(data)), event_format)
+        
+    except Exception as e:
+        print(f"Error in streaming exam grading: {e}")
+        yield format_event('error', {'error': str(e)}, event_format)
+
+def format_event(event: str, payload: Dict[str, Any], event_format: str = 'ndjson') -> str:
+    """Encode a streaming event as an NDJSON line or an SSE frame"""
+    if event_format == 'sse':
+        return f"event: {event}\ndata: {dumps(payload)}\n\n"
+    return dumps({'event': event, **payload}) + "\n"
+
+def _prepare_grading(data: Dict[str, Any]) -> Tuple[GradingEngine, ReportGenerator, List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """
+    Build the grading engine and pair each answer with its question, preserving answer order
+    
+    Answers without a question in the request are resolved by (questionType, questionId)
+    from the question bank. With incremental grading requested the engine is wrapped so
+    only answers whose question, answer or prompt version changed are sent to xAI.
+    """
+    answers = data.get('answers', [])
+    questions = data.get('questions', [])
+    
+    # Reuse the warm AI client and report generator across invocations
+    global _report_generator
+    if _report_generator is None:
+        _report_generator = ReportGenerator()
+    report_generator = _report_generator
+    try:
+        ai_client = get_default_client()
+    except XAIApiError as e:
+        print(f"Warning: AI client initialization failed: {e}")
+        ai_client = None
+    
+    # Questions sent with the request win; the rest come from the preloaded question bank
+    questions_by_id = {str(question['id']): question for question in questions}
+    items = []
+    for answer in answers:
+        question = questions_by_id.get(str(answer['questionId']))
+        if question is None and answer.get('questionType'):
+            question = get_question_bank().get(answer['questionType'], answer['questionId'])
+        if not question:
+            continue
+        items.append((answer, question))
+    
+    engine = GradingEngine(ai_client, fallback=fallback_grading, similarity_index=get_similarity_index())
+    if incremental_enabled(data):
+        engine = IncrementalGrader(engine)
+    return engine, report_generator, items
+
+def _build_exam_result(data: Dict[str, Any], grading_results: List[Dict[str, Any]], report_generator: ReportGenerator) -> Dict[str, Any]:
+    """Total the grading results and generate the full exam report"""
+    answers = data.get('answers', [])
+    user_info = data.get('userInfo', {})
+    
+    total_score = sum(result['score'] for result in grading_results)
+    max_score = sum(result['maxScore'] for result in grading_results)
+    
+    # Generate comprehensive report
+    exam_metadata = {
+        'examId': data.get('examId'),
+        'completedAt': data.get('completedAt', ''),
+        'timeSpent': sum(answer.get('timeSpent', 0) for answer in answers),
+        'totalQuestions': len(data.get('questions') or answers)
+    }
+    
+    with metrics.span('report'):
+        report = report_generator.generate_exam_report(
+            grading_results, 
+            user_info, 
+            exam_metadata
+        )
+    
+    # Add legacy fields for backward compatibility
+    return {
+        'userInfo': user_info,
+        'answers': answers,
+        'gradingResults': grading_results,
+        'totalScore': total_score,
+        'maxScore': max_score,
+        'overallFeedback': report['analysis']['overallFeedback'],
+        'completedAt': exam_metadata['completedAt'],
+        'timeSpent': exam_metadata['timeSpent'],
+        'report': report  # Include full report
+    }
+
+def _queue_regrade(data: Dict[str, Any], grading_results: List[Dict[str, Any]]):
+    """
+    Queue the exam for re-grading if the circuit breaker turned any answer away (marked
+    needsRegrade), otherwise replay the backlog in the background while xAI is healthy
+    """
+    user_id = data.get('userInfo', {}).get('userId')
+    if not user_id or not regrade_backlog_enabled():
+        return
+    try:
+        if any(result.get('needsRegrade') for result in grading_results):
+            get_regrade_backlog().add(user_id, data)
+        else:
+            _drain_backlog()
+    except Exception as e:
+        print(f"Warning: could not update the re-grade backlog: {e}")
+
+def _drain_backlog():
+    """Start a background drain if the breaker is closed and exams are queued, at most every DRAIN_CHECK_SECONDS"""
+    global _last_drain_check
+    now = time.monotonic()
+    breaker = get_shared_circuit_breaker()
+    if breaker.state != CLOSED or now - _last_drain_check < DRAIN_CHECK_SECONDS:
+        return
+    backlog = get_regrade_backlog()
+    if backlog.pending() and backlog.start_drain(regrade_exam, can_run=lambda: breaker.state == CLOSED):
+        _last_drain_check = now
+
+def regrade_exam(data: Dict[str, Any]) -> bool:
+    """
+    Re-grade a queued exam and store its corrected report
+    
+    Runs incrementally, so answers graded by xAI the first time are reused when their
+    grades were stored. Nothing is stored while answers still fall back.
+    
+    Returns:
+        True when every answer got a real grade
+    """
+    with exam_metrics():
+        engine, report_generator, items = _prepare_grading({**data, 'incremental': True})
+        grading_results = engine.grade_exam(items, data.get('userInfo', {}))
+        if any(result.get('needsRegrade') for result in grading_results):
+            return False
+        _build_exam_result(data, grading_results, report_generator)
+    return True
+
+def _on_circuit_transition(previous: str, state: str):
+    """Replay the re-grade backlog on a background thread as soon as the xAI circuit closes"""
+    global _last_drain_check
+    if state != CLOSED or not regrade_backlog_enabled():
+        return
+    _last_drain_check = float('-inf')
+    _drain_backlog()
+
+get_shared_circuit_breaker().add_listener(_on_circuit_transition)
+
+def _record_copy_flags(user_info: Dict[str, Any], engine):
+    """
+    Store near-duplicates of this candidate's answers for reviewers
+    
+    Flags name other candidates, so they go to the CopyFlag table and never into the
+    candidate's report or the response.
+    """
+    if not user_info.get('userId'):
+        return
+    flags = engine.pop_copy_flags(user_info['userId'])
+    if not flags:
+        return
+    metrics.inc('copy_flags', len(flags), exam_key='copyFlags')
+    rows = [{
+        'user_id': str(user_info['userId']),
+        'question_id': str(flag['questionId']),
+        'max_similarity': flag['maxSimilarity'],
+        'cluster': dumps(flag['cluster']),
+        'created_at': time.time()
+    } for flag in flags]
+    try:
+        insert_copy_flags(rows)
+    except Exception as e:
+        # Flags exist only in this table, so a rejected write (e.g. RLS without the service
+        # role key) must be visible on the dashboards, not just in the function log
+        metrics.inc('copy_flag_write_failures', len(rows), exam_key='copyFlagWriteFailures')
+        print(f"Error: could not store {len(rows)} copy flags for {user_info['userId']}: {e}", file=sys.stderr)
 
 def fallback_grading(answer: Dict[str, Any], question: Dict[str, Any]) -> Dict[str, Any]:
     """Fallback grading when AI is unavailable"""
@@ -144,7 +314,9 @@ def fallback_grading(answer: Dict[str, Any], question: Dict[str, Any]) -> Dict[s
         'maxScore': max_score,
         'feedback': feedback,
         'strengths': strengths,
-        'improvements': improvements
+        'improvements': improvements,
+        # Not a real grade: never reused by incremental grading
+        'fallback': True
     }
 
 def identify_strengths(answer_text: str, question: Dict[str, Any]) -> List[str]:
@@ -179,20 +351,64 @@ def identify_improvements(answer_text: str, question: Dict[str, Any]) -> List[st
     
     return improvements
 
-def parse_response(response: dict) -> tuple[int, str]:
-    # Assume this parses the AI response to extract score and feedback
-    content = response['choices'][0]['message']['content']
-    # Simple parsing, adjust as needed
-    score_str, feedback = content.split(':', 1)
-    score = int(score_str.strip())
-    return score, feedback.strip()
+def parse_response(content: str) -> tuple[int, str]:
+    """
+    Extract the score and feedback from a "Grade:" completion
+    
+    Accepts a JSON object with score and feedback or a leading score such as
+    "8: ...", "Score: 8/10 - ..." or "8 points. ..."; failures are counted in
+    response_parser.parse_stats.
+    
+    Raises:
+        ResponseParseError: If the completion contains no score
+    """
+    score, feedback = parse_score_feedback(content)
+    return int(round(score)), feedback
 
 def grade_answer(answer_id: str):
-    client = create_supabase_client()  # If needed, but using db_operations
-    answer = get_user_answer(answer_id)
-    # AI call
-    response = requests.post('https://api.x.ai/v1/chat/completions', 
-                             headers={'Authorization': f'Bearer {os.environ["XAI_API_KEY"]}'},
-                             json={'model': 'grok-beta', 'messages': [{'role': 'user', 'content': f'Grade: {answer["answer_text"]}' }]})
-    score, feedback = parse_response(response.json())
-    insert_grading_result(answer_id, score, feedback)
+    return grade_answers([answer_id])
+
+def grade_answers(answer_ids: List[str], failures: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Grade stored UserAnswers with one bulk read and one bulk write
+    
+    An answer that is missing or fails to grade does not hold back the others: the
+    successful rows are still inserted.
+    
+    Args:
+        answer_ids: UserAnswer ids to grade
+        failures: Filled with {answer_id: error} for answers that could not be graded;
+            without it, any failure raises after the successful rows are inserted
+        
+    Returns:
+        The inserted GradingResult rows
+    """
+    answers = get_user_answers(answer_ids)
+    errors: Dict[str, str] = {}
+    for answer_id in answer_ids:
+        if str(answer_id) not in answers:
+            errors[str(answer_id)] = 'UserAnswer not found'
+    
+    client = get_default_client()
+    
+    def grade(answer_id):
+        # AI call over the shared, pooled xAI session
+        try:
+            content = client.call_grok_api(f'Grade: {answers[str(answer_id)]["answer_text"]}')
+            score, feedback = parse_response(content)
+        except Exception as e:
+            errors[str(answer_id)] = str(e)
+            return None
+        return {'answer_id': answer_id, 'score': score, 'feedback': feedback}
+    
+    gradable = [answer_id for answer_id in answer_ids if str(answer_id) not in errors]
+    max_workers = min(len(gradable), int(os.getenv('GRADING_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = [row for row in executor.map(grade, gradable) if row is not None]
+    
+    inserted = insert_grading_results(rows)
+    if failures is not None:
+        failures.update(errors)
+    elif errors:
+        raise Exception('Grading failed: ' + '; '.join(f'{answer_id}: {error}' for answer_id, error in errors.items()))
+    return inserted
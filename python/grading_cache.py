@@ -0,0 +1,213 @@
+# python/grading_cache.py - Content-addressed cache for parsed grading results
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from metrics import metrics
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+_default_cache: Optional['GradingCache'] = None
+_default_cache_lock = threading.Lock()
+
+def make_cache_key(model: str, temperature: float, prompt_version: str, question: Dict[str, Any], answer: str,
+                   context: Optional[Dict[str, str]] = None) -> str:
+    """
+    Build a content-addressed cache key for grading one answer
+
+    Only what determines the grade is hashed: the model, the prompt template version,
+    the question in canonical form, the grade-relevant candidate context (position and
+    experience level, which the prompt tells the model to weigh) and the answer. Names
+    and other candidate details are left out so identical answers from comparable
+    candidates share an entry, and answer whitespace is collapsed so formatting-only
+    differences do too.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{model}\x00{temperature}\x00{prompt_version}\x00".encode('utf-8'))
+    digest.update(json.dumps(question, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+    digest.update(b"\x00")
+    digest.update(json.dumps(context or {}, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    digest.update(b"\x00")
+    digest.update(' '.join(answer.split()).encode('utf-8'))
+    return digest.hexdigest()
+
+class MemoryCacheTier:
+    """In-process LRU cache tier with TTL and size-based eviction"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheTier:
+    """Persistent cache tier stored in a local SQLite file"""
+
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS grading_cache (key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM grading_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM grading_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO grading_cache (key, result, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            self._conn.commit()
+
+class SupabaseCacheTier:
+    """Persistent cache tier stored in a Supabase table (key, result, created_at)"""
+
+    def __init__(self, table: str = 'GradingCache', ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    def _client(self):
+        from db_client import get_supabase_client
+        return get_supabase_client()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self._client().table(self.table).select('result, created_at').eq('key', key).limit(1).execute()
+        if hasattr(response, 'error') and response.error:
+            raise Exception(f'Query failed: {response.error}')
+        if not response.data:
+            return None
+        row = response.data[0]
+        if time.time() - float(row['created_at']) > self.ttl_seconds:
+            return None
+        return json.loads(row['result'])
+
+    def set(self, key: str, value: Dict[str, Any]):
+        data = {'key': key, 'result': json.dumps(value), 'created_at': time.time()}
+        response = self._client().table(self.table).upsert(data).execute()
+        if hasattr(response, 'error') and response.error:
+            raise Exception(f'Upsert failed: {response.error}')
+
+class GradingCache:
+    """Two-tier grading result cache: in-process LRU in front of an optional persistent tier"""
+
+    def __init__(self, memory: Optional[MemoryCacheTier] = None, persistent=None):
+        self.memory = memory or MemoryCacheTier()
+        self.persistent = persistent
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a parsed grading result, returning a copy or None on a miss"""
+        value = self.memory.get(key)
+        if value is None and self.persistent is not None:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                print(f"Grading cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                with self._lock:
+                    self.persistent_hits += 1
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                metrics.inc('grading_cache_lookups', exam_key='cacheMisses', result='miss')
+                return None
+            self.hits += 1
+        metrics.inc('grading_cache_lookups', exam_key='cacheHits', result='hit')
+        return json.loads(json.dumps(value))
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a parsed grading result in every tier"""
+        value = json.loads(json.dumps(value))
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value)
+            except Exception as e:
+                print(f"Grading cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'persistentHits': self.persistent_hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memoryEntries': len(self.memory)
+            }
+
+def get_default_cache() -> Optional[GradingCache]:
+    """
+    Get the process-wide grading cache configured from the environment
+
+    GRADING_CACHE_ENABLED (default "true"), GRADING_CACHE_MAX_ENTRIES and
+    GRADING_CACHE_TTL_SECONDS configure the memory tier. GRADING_CACHE_SQLITE_PATH
+    or GRADING_CACHE_SUPABASE_TABLE enables a persistent tier.
+    """
+    global _default_cache
+    if os.getenv('GRADING_CACHE_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl_seconds = float(os.getenv('GRADING_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+            memory = MemoryCacheTier(
+                max_entries=int(os.getenv('GRADING_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+                ttl_seconds=ttl_seconds
+            )
+            persistent = None
+            if os.getenv('GRADING_CACHE_SQLITE_PATH'):
+                persistent = SQLiteCacheTier(os.environ['GRADING_CACHE_SQLITE_PATH'], ttl_seconds)
+            elif os.getenv('GRADING_CACHE_SUPABASE_TABLE'):
+                persistent = SupabaseCacheTier(os.environ['GRADING_CACHE_SUPABASE_TABLE'], ttl_seconds)
+            _default_cache = GradingCache(memory, persistent)
+        return _default_cache
@@ -0,0 +1,287 @@
+# python/grading_engine.py - Concurrent exam grading engine
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+from api_client import CircuitOpenError, XAIApiError, estimate_tokens, DEFAULT_BATCH_MAX_ITEMS
+from deadlines import deadline_scope
+from incremental_grading import question_fingerprint
+from metrics import metrics
+from rule_grader import NUMERIC_TYPES, RuleBasedGrader, explanation_requested
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_DEADLINE_SECONDS = 50.0
+DEFAULT_BATCH_MAX_ANSWER_TOKENS = 150
+
+class GradingEngine:
+    """Grades every question of an exam concurrently with bounded parallelism"""
+
+    def __init__(self, ai_client=None, fallback: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None,
+                 max_concurrency: Optional[int] = None, deadline_seconds: Optional[float] = None,
+                 rule_grader: Optional[RuleBasedGrader] = None, batch_token_budget: Optional[int] = None,
+                 question_deadline_seconds: Optional[float] = None, similarity_index=None,
+                 reuse_near_duplicates: Optional[bool] = None):
+        """
+        Args:
+            ai_client: XAIClient used for grading, or None to always use the fallback
+            fallback: fallback(answer, question) used when AI grading fails or the deadline passes
+            max_concurrency: Maximum number of questions graded at once (env: GRADING_MAX_CONCURRENCY)
+            deadline_seconds: Wall-clock budget for the whole exam (env: GRADING_DEADLINE_SECONDS);
+                every xAI call's timeout is derived from what is left of it
+            rule_grader: Deterministic grader tried before the LLM for questions with a known answer
+            batch_token_budget: Prompt token budget for packing short answers into one request;
+                0 disables batching (env: GRADING_BATCH_TOKEN_BUDGET)
+            question_deadline_seconds: Optional budget per question from when its grading starts,
+                capped by the exam deadline; 0 disables it (env: GRADING_QUESTION_DEADLINE_SECONDS)
+            similarity_index: SimilarityIndex that every graded free-response answer is checked
+                against and then added to; near-duplicates are collected for pop_copy_flags
+            reuse_near_duplicates: Reuse the grade of a verified near-identical answer instead of
+                calling xAI (env: GRADING_REUSE_NEAR_DUPLICATES, default off)
+        """
+        self.ai_client = ai_client
+        self.fallback = fallback
+        self.max_concurrency = max(1, max_concurrency if max_concurrency is not None else int(
+            os.getenv('GRADING_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)))
+        # An explicit 0 is an already-spent budget, not "use the default"
+        self.deadline_seconds = deadline_seconds if deadline_seconds is not None else float(
+            os.getenv('GRADING_DEADLINE_SECONDS', DEFAULT_DEADLINE_SECONDS))
+        self.rule_grader = rule_grader or RuleBasedGrader()
+        self.batch_token_budget = batch_token_budget if batch_token_budget is not None else int(
+            os.getenv('GRADING_BATCH_TOKEN_BUDGET', 0))
+        self.batch_max_answer_tokens = int(os.getenv('GRADING_BATCH_MAX_ANSWER_TOKENS', DEFAULT_BATCH_MAX_ANSWER_TOKENS))
+        self.question_deadline_seconds = (question_deadline_seconds if question_deadline_seconds is not None else float(
+            os.getenv('GRADING_QUESTION_DEADLINE_SECONDS', 0))) or None
+        self.similarity_index = similarity_index
+        self.reuse_near_duplicates = reuse_near_duplicates if reuse_near_duplicates is not None else os.getenv(
+            'GRADING_REUSE_NEAR_DUPLICATES', 'false').lower() in ('1', 'true', 'yes')
+        self._copy_flags: Dict[str, List[Dict[str, Any]]] = {}
+        self._copy_flags_lock = threading.Lock()
+
+    def grade_exam(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Grade all (answer, question) pairs of an exam
+
+        Args:
+            items: List of (answer, question) pairs in exam order
+            user_info: User information for context
+
+        Returns:
+            Grading results in the same order as items
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        for index, result in self.iter_exam(items, user_info):
+            results[index] = result
+        return results
+
+    def iter_exam(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Grade all (answer, question) pairs, yielding each result as soon as it is ready
+
+        Args:
+            items: List of (answer, question) pairs in exam order
+            user_info: User information for context
+
+        Yields:
+            (index into items, grading result) pairs in completion order
+        """
+        if not items:
+            return
+
+        deadline = time.monotonic() + self.deadline_seconds
+        units = self._plan_units(items)
+        executor = ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(units)))
+        try:
+            # Each unit runs in a copy of the caller's context so per-exam metrics and the
+            # exam deadline (which bounds every API call's timeout) follow it
+            with deadline_scope(at=deadline):
+                futures = {
+                    executor.submit(contextvars.copy_context().run, self._grade_unit, [items[index] for index in unit], user_info): unit
+                    for unit in units
+                }
+            pending = set(futures)
+            try:
+                for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                    pending.discard(future)
+                    for index, result in zip(futures[future], future.result()):
+                        yield index, result
+            except FuturesTimeoutError:
+                pass
+
+            # Questions still in flight at the deadline degrade to fallback grading
+            for future in pending:
+                future.cancel()
+                for index in futures[future]:
+                    answer, question = items[index]
+                    print(f"Grading deadline exceeded for question {answer['questionId']}, using fallback")
+                    metrics.inc('grading_deadline_exceeded', exam_key='deadlineExceeded')
+                    grading_result = self.rule_grader.grade(question, answer.get('answer', '')) or self._fallback(answer, question)
+                    yield index, self._build_result(answer, grading_result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _plan_units(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[List[int]]:
+        """Split items into units of work: short free-response answers share one batch unit"""
+        units: List[List[int]] = []
+        batchable: List[int] = []
+
+        for index, (answer, question) in enumerate(items):
+            if self._is_batchable(answer, question):
+                batchable.append(index)
+            else:
+                units.append([index])
+
+        # Each batch unit runs on its own worker; the client splits further by token budget
+        for start in range(0, len(batchable), DEFAULT_BATCH_MAX_ITEMS):
+            units.append(batchable[start:start + DEFAULT_BATCH_MAX_ITEMS])
+        return units
+
+    def _is_batchable(self, answer: Dict[str, Any], question: Dict[str, Any]) -> bool:
+        if self.batch_token_budget <= 0 or not hasattr(self.ai_client, 'grade_exam_batch'):
+            return False
+        if question.get('type') == 'multiple-choice' or self.rule_grader.grade(question, answer.get('answer', '')) is not None:
+            return False
+        return estimate_tokens(answer.get('answer', '')) <= self.batch_max_answer_tokens
+
+    def _grade_unit(self, unit_items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Grade one unit of work: a single question or a batch of short answers"""
+        if self.question_deadline_seconds:
+            with deadline_scope(self.question_deadline_seconds):
+                return self._grade_unit_items(unit_items, user_info)
+        return self._grade_unit_items(unit_items, user_info)
+
+    def _grade_unit_items(self, unit_items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Each answer is sketched once for both the reuse lookup and indexing
+        sketches = [self._sketch(answer, question) for answer, question in unit_items]
+        results = self._grade_unit_results(unit_items, user_info, sketches)
+        if self.similarity_index is not None:
+            self._index_answers(unit_items, results, user_info, sketches)
+        return results
+
+    def _grade_unit_results(self, unit_items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any],
+                            sketches: List[Any]) -> List[Dict[str, Any]]:
+        if len(unit_items) == 1:
+            answer, question = unit_items[0]
+            return [self._grade_one(answer, question, user_info, sketches[0])]
+
+        try:
+            grading_results = self.ai_client.grade_exam_batch(
+                [(question, answer.get('answer', '')) for answer, question in unit_items],
+                user_info,
+                token_budget=self.batch_token_budget
+            )
+        except XAIApiError as e:
+            print(f"AI batch grading failed: {e}")
+            return [self._grade_one(answer, question, user_info, sketch)
+                    for (answer, question), sketch in zip(unit_items, sketches)]
+
+        return [self._build_result(answer, grading_result)
+                for (answer, _), grading_result in zip(unit_items, grading_results)]
+
+    def _grade_one(self, answer: Dict[str, Any], question: Dict[str, Any], user_info: Dict[str, Any],
+                   sketch=None) -> Dict[str, Any]:
+        """Grade a single answer using rules, AI or fallback"""
+        # Questions with a known answer are scored locally unless feedback is requested
+        rule_result = self.rule_grader.grade(question, answer.get('answer', ''))
+        if rule_result is not None and not (self.ai_client and explanation_requested(question)):
+            metrics.inc('rule_graded', exam_key='ruleGraded')
+            return self._build_result(answer, rule_result)
+
+        if self.ai_client and rule_result is None and sketch is not None:
+            reused = self._reuse_near_duplicate(answer, question, user_info, sketch)
+            if reused is not None:
+                return self._build_result(answer, reused)
+
+        if self.ai_client:
+            try:
+                grading_result = self.ai_client.grade_exam_response(
+                    question,
+                    answer.get('answer', ''),
+                    user_info
+                )
+            except XAIApiError as e:
+                print(f"AI grading failed for question {answer['questionId']}: {e}")
+                grading_result = self._fallback(answer, question)
+                if isinstance(e, CircuitOpenError):
+                    grading_result['needsRegrade'] = True
+        else:
+            grading_result = self._fallback(answer, question)
+
+        if rule_result is not None:
+            # The LLM only explains; the deterministic score stands
+            grading_result['score'] = rule_result['score']
+            grading_result['maxScore'] = rule_result['maxScore']
+
+        return self._build_result(answer, grading_result)
+
+    def pop_copy_flags(self, user_id: Any) -> List[Dict[str, Any]]:
+        """
+        Copy-flag clusters collected while grading a candidate's answers, removed from the engine
+
+        Each flag names the question and the other candidates whose answers to it are
+        near-duplicates of this one. They are meant for reviewers, not the candidate.
+        """
+        with self._copy_flags_lock:
+            return self._copy_flags.pop(str(user_id), [])
+
+    def _sketch(self, answer: Dict[str, Any], question: Dict[str, Any]):
+        """Similarity sketch of a free-response answer, or None when it is not indexed"""
+        if self.similarity_index is None:
+            return None
+        if question.get('type') == 'multiple-choice' or question.get('type') in NUMERIC_TYPES:
+            return None
+        return self.similarity_index.sketch(answer.get('answer', ''))
+
+    def _reuse_near_duplicate(self, answer: Dict[str, Any], question: Dict[str, Any], user_info: Dict[str, Any],
+                              sketch) -> Optional[Dict[str, Any]]:
+        """Grade of another candidate's verified near-identical answer, if reuse is enabled"""
+        if self.similarity_index is None or not self.reuse_near_duplicates:
+            return None
+        match = self.similarity_index.find_reusable_grade(
+            answer['questionId'], sketch, question_fingerprint(question), exclude=user_info.get('userId'))
+        if match is None:
+            return None
+        key, grade = match
+        metrics.inc('near_duplicate_reuse', exam_key='nearDuplicatesReused')
+        grade['nearDuplicateOf'] = key
+        return grade
+
+    def _index_answers(self, unit_items: List[Tuple[Dict[str, Any], Dict[str, Any]]], results: List[Dict[str, Any]],
+                       user_info: Dict[str, Any], sketches: List[Any]):
+        """Flag graded free-response answers that match other candidates', then index them"""
+        user_id = user_info.get('userId')
+        if not user_id:
+            return
+        for (answer, question), result, sketch in zip(unit_items, results, sketches):
+            if sketch is None:
+                continue
+            matches = self.similarity_index.find_duplicates(answer['questionId'], sketch, exclude=user_id)
+            if matches:
+                with self._copy_flags_lock:
+                    self._copy_flags.setdefault(str(user_id), []).append({
+                        'questionId': answer['questionId'],
+                        'maxSimilarity': matches[0][1],
+                        'cluster': [{'userId': key, 'similarity': similarity} for key, similarity in matches]
+                    })
+            # Grades are only kept (with the shingles needed to verify them) when they may be reused
+            grade = None
+            if self.reuse_near_duplicates and not result.get('fallback') and 'nearDuplicateOf' not in result:
+                grade = {key: value for key, value in result.items() if key not in ('questionId', 'answer', 'timeSpent')}
+            self.similarity_index.add(answer['questionId'], user_id, sketch, grade, question_fingerprint(question))
+
+    def _fallback(self, answer: Dict[str, Any], question: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fallback:
+            metrics.inc('grading_fallbacks', exam_key='fallbacks', source='engine')
+            return self.fallback(answer, question)
+        if self.ai_client:
+            return self.ai_client._fallback_grading(question, answer.get('answer', ''))
+        raise XAIApiError("No fallback grading available")
+
+    def _build_result(self, answer: Dict[str, Any], grading_result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'questionId': answer['questionId'],
+            'answer': answer.get('answer', ''),
+            'timeSpent': answer.get('timeSpent', 0),
+            **grading_result
+        }
@@ -0,0 +1,432 @@
+# python/grading_queue.py - Durable grading queue (SQLite or Supabase table) with a worker pool
+"""
+Grade UserAnswers in the background with leased, retried jobs
+
+Two backends share one interface. The default SQLite file suits a single host that
+enqueues its own work. With GRADING_QUEUE_BACKEND=supabase the queue is the grading_jobs
+table from migration.sql: a trigger on UserAnswer enqueues every submitted answer, so the
+app's submission path (app/api/answers) feeds it with no extra call, and workers on any
+host claim from it. Run the workers with SUPABASE_SERVICE_ROLE_KEY set.
+
+    python grading_queue.py --backend supabase work --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+DEFAULT_QUEUE_PATH = 'grading_queue.sqlite'
+QUEUE_BACKENDS = ('sqlite', 'supabase')
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_BATCH_SIZE = 10
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+
+class GradingQueueError(Exception):
+    """Custom exception for grading queue errors"""
+    pass
+
+def retry_delay(attempts: int) -> float:
+    """Jittered exponential backoff before a failed job's next attempt"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+    return random.uniform(delay / 2, delay)
+
+class GradingQueue:
+    """Durable grading job queue stored in a local SQLite file"""
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            path: SQLite file holding the queue (env: GRADING_QUEUE_PATH)
+            lease_seconds: How long a claimed job stays invisible before another worker may retry it
+            max_attempts: Attempts before a job is marked failed
+        """
+        self.path = path or os.getenv('GRADING_QUEUE_PATH', DEFAULT_QUEUE_PATH)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS grading_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                answer_id TEXT NOT NULL,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_expires_at REAL,
+                worker TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                completed_at REAL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS grading_jobs_claim ON grading_jobs (status, available_at)"
+        )
+
+    def enqueue(self, answer_id: str, idempotency_key: Optional[str] = None) -> bool:
+        """
+        Enqueue a UserAnswer for grading
+
+        Args:
+            answer_id: UserAnswer id to grade
+            idempotency_key: Deduplication key (defaults to the answer id)
+
+        Returns:
+            True if a job was created or a failed one was queued again, False if the key was
+            already queued, running or graded
+        """
+        now = time.time()
+        cursor = self._conn.execute("""
+            INSERT INTO grading_jobs (answer_id, idempotency_key, available_at, created_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(idempotency_key) DO UPDATE SET
+                answer_id = excluded.answer_id, status = 'queued', attempts = 0, available_at = excluded.available_at,
+                lease_expires_at = NULL, worker = NULL, last_error = NULL
+            WHERE grading_jobs.status = 'failed'
+        """, (str(answer_id), idempotency_key or str(answer_id), now, now))
+        return cursor.rowcount == 1
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Claim the next available job, including jobs whose lease has expired"""
+        jobs = self.claim_batch(worker_id, 1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, worker_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Claim up to limit available jobs in one transaction"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute("""
+                SELECT * FROM grading_jobs
+                WHERE (status = 'queued' AND available_at <= ?)
+                   OR (status = 'running' AND lease_expires_at <= ?)
+                ORDER BY available_at, id
+                LIMIT ?
+            """, (now, now, limit)).fetchall()
+
+            jobs = []
+            for row in rows:
+                if row['attempts'] >= self.max_attempts:
+                    # A worker died holding this job on its final attempt
+                    self._conn.execute(
+                        "UPDATE grading_jobs SET status = 'failed', last_error = ? WHERE id = ?",
+                        ('Lease expired on final attempt', row['id'])
+                    )
+                    continue
+
+                self._conn.execute("""
+                    UPDATE grading_jobs
+                    SET status = 'running', attempts = attempts + 1, lease_expires_at = ?, worker = ?
+                    WHERE id = ?
+                """, (now + self.lease_seconds, worker_id, row['id']))
+                job = dict(row)
+                job['attempts'] += 1
+                jobs.append(job)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        return jobs
+
+    def ack(self, job_id: int, worker_id: str) -> bool:
+        """
+        Mark a job done; only call after its grading result is stored
+
+        Returns:
+            False if worker_id no longer holds the job's lease (another worker reclaimed it)
+        """
+        cursor = self._conn.execute("""
+            UPDATE grading_jobs SET status = 'done', completed_at = ?, lease_expires_at = NULL
+            WHERE id = ? AND worker = ? AND status = 'running'
+        """, (time.time(), job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def nack(self, job_id: int, worker_id: str, attempts: int, error: str) -> bool:
+        """
+        Release a failed job for a later retry with jittered exponential backoff
+
+        Returns:
+            False if worker_id no longer holds the job's lease (another worker reclaimed it)
+        """
+        if attempts >= self.max_attempts:
+            cursor = self._conn.execute("""
+                UPDATE grading_jobs SET status = 'failed', last_error = ?, lease_expires_at = NULL
+                WHERE id = ? AND worker = ? AND status = 'running'
+            """, (error, job_id, worker_id))
+            return cursor.rowcount == 1
+
+        cursor = self._conn.execute("""
+            UPDATE grading_jobs SET status = 'queued', available_at = ?, last_error = ?, lease_expires_at = NULL
+            WHERE id = ? AND worker = ? AND status = 'running'
+        """, (time.time() + retry_delay(attempts), error, job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def renew(self, job_ids: List[int], worker_id: str) -> int:
+        """Extend the leases worker_id still holds on job_ids; returns how many were renewed"""
+        if not job_ids:
+            return 0
+        placeholders = ','.join('?' * len(job_ids))
+        cursor = self._conn.execute(f"""
+            UPDATE grading_jobs SET lease_expires_at = ?
+            WHERE id IN ({placeholders}) AND worker = ? AND status = 'running'
+        """, (time.time() + self.lease_seconds, *job_ids, worker_id))
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status"""
+        rows = self._conn.execute("SELECT status, COUNT(*) AS count FROM grading_jobs GROUP BY status").fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+    def close(self):
+        self._conn.close()
+
+class SupabaseGradingQueue:
+    """
+    Grading job queue in the Supabase grading_jobs table, shared by the app and every worker
+
+    Same interface as GradingQueue. Jobs are created by the UserAnswer insert trigger or by
+    enqueue; claims, acks and lease renewals are database functions, so leases are timed by
+    the database clock rather than each worker's.
+    """
+
+    def __init__(self, lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, answer_id: str, idempotency_key: Optional[str] = None) -> bool:
+        """Enqueue a UserAnswer for grading; see GradingQueue.enqueue"""
+        from db_operations import enqueue_grading_job
+        return enqueue_grading_job(str(answer_id), idempotency_key or str(answer_id))
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        jobs = self.claim_batch(worker_id, 1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, worker_id: str, limit: int) -> List[Dict[str, Any]]:
+        from db_operations import claim_grading_jobs
+        return claim_grading_jobs(worker_id, limit, self.lease_seconds, self.max_attempts)
+
+    def ack(self, job_id: int, worker_id: str) -> bool:
+        from db_operations import finish_grading_job
+        return finish_grading_job(job_id, worker_id, 'done')
+
+    def nack(self, job_id: int, worker_id: str, attempts: int, error: str) -> bool:
+        from db_operations import finish_grading_job
+        if attempts >= self.max_attempts:
+            return finish_grading_job(job_id, worker_id, 'failed', error=error)
+        return finish_grading_job(job_id, worker_id, 'queued', retry_delay(attempts), error)
+
+    def renew(self, job_ids: List[int], worker_id: str) -> int:
+        from db_operations import renew_grading_jobs
+        return renew_grading_jobs(job_ids, worker_id, self.lease_seconds) if job_ids else 0
+
+    def stats(self) -> Dict[str, int]:
+        from db_operations import get_grading_job_counts
+        return get_grading_job_counts()
+
+    def close(self):
+        pass
+
+def queue_backend(backend: Optional[str] = None) -> str:
+    """The queue backend to use: backend if given, else GRADING_QUEUE_BACKEND (default sqlite)"""
+    backend = backend or os.getenv('GRADING_QUEUE_BACKEND', 'sqlite')
+    if backend not in QUEUE_BACKENDS:
+        raise GradingQueueError(f"Unknown grading queue backend: {backend}")
+    return backend
+
+def open_queue(queue_path: Optional[str] = None, backend: Optional[str] = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS):
+    """Open the configured queue; queue_path only applies to the SQLite backend"""
+    if queue_backend(backend) == 'supabase':
+        return SupabaseGradingQueue(lease_seconds)
+    return GradingQueue(queue_path, lease_seconds)
+
+class LeaseKeeper:
+    """
+    Renews a batch's leases from a background thread while it is being graded
+
+    Opens its own queue (sqlite3 connections are not shared across threads) and renews
+    every third of the lease, so a slow batch is not reclaimed and graded twice.
+    """
+
+    def __init__(self, queue_path: Optional[str], job_ids: List[int], worker_id: str,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, backend: Optional[str] = None):
+        self.queue_path = queue_path
+        self.backend = backend
+        self.job_ids = job_ids
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{worker_id}", daemon=True)
+
+    def __enter__(self) -> 'LeaseKeeper':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        queue = open_queue(self.queue_path, self.backend, self.lease_seconds)
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    renewed = queue.renew(self.job_ids, self.worker_id)
+                except Exception as e:
+                    print(f"Worker {self.worker_id} could not renew its leases: {e}")
+                    continue
+                if renewed < len(self.job_ids):
+                    print(f"Worker {self.worker_id} lost {len(self.job_ids) - renewed} of its leases")
+        finally:
+            queue.close()
+
+def process_jobs(jobs: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Grade a batch of jobs' answers, skipping answers that already have a grading result
+
+    The skip only saves work: GradingResult.answer_id is unique and results are inserted
+    with on-conflict-do-nothing, so a job graded twice still stores one result.
+
+    Returns:
+        {answer_id: error} for answers that could not be graded; the rest were stored
+    """
+    from db_operations import get_graded_answer_ids
+    from grader import grade_answers
+
+    answer_ids = [job['answer_id'] for job in jobs]
+    graded = get_graded_answer_ids(answer_ids)
+    for answer_id in graded:
+        print(f"Answer {answer_id} already graded, skipping")
+
+    failures: Dict[str, str] = {}
+    pending = [answer_id for answer_id in answer_ids if answer_id not in graded]
+    if pending:
+        grade_answers(pending, failures)
+    return failures
+
+def run_worker(worker_id: str, queue_path: Optional[str] = None, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               stop_event=None, max_jobs: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+               backend: Optional[str] = None):
+    """
+    Claim and grade jobs until stopped
+
+    Args:
+        worker_id: Name recorded on claimed jobs
+        queue_path: SQLite queue file
+        poll_interval: Seconds to sleep when the queue is empty
+        stop_event: multiprocessing.Event that stops the worker when set
+        max_jobs: Stop after this many jobs (None to run forever)
+        batch_size: Jobs claimed and graded per database round trip
+        backend: 'sqlite' or 'supabase' (env: GRADING_QUEUE_BACKEND)
+    """
+    queue = open_queue(queue_path, backend)
+    processed = 0
+    try:
+        while not (stop_event and stop_event.is_set()):
+            if max_jobs is not None and processed >= max_jobs:
+                break
+
+            limit = batch_size if max_jobs is None else min(batch_size, max_jobs - processed)
+            jobs = queue.claim_batch(worker_id, limit)
+            if not jobs:
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                with LeaseKeeper(queue_path, [job['id'] for job in jobs], worker_id, queue.lease_seconds, backend):
+                    failures = process_jobs(jobs)
+            except Exception as e:
+                # Nothing was stored (e.g. the bulk read or write failed), so every job is retried
+                failures = {job['answer_id']: str(e) for job in jobs}
+            for job in jobs:
+                error = failures.get(job['answer_id'])
+                if error is None:
+                    held = queue.ack(job['id'], worker_id)
+                else:
+                    print(f"Worker {worker_id} failed grading answer {job['answer_id']}: {error}")
+                    held = queue.nack(job['id'], worker_id, job['attempts'], error)
+                if not held:
+                    print(f"Worker {worker_id} lost the lease on job {job['id']}; leaving it to its new owner")
+            processed += len(jobs)
+    finally:
+        queue.close()
+
+def _run_pool_worker(worker_id: str, queue_path: Optional[str], poll_interval: float, stop_event, batch_size: int,
+                     backend: Optional[str]):
+    """Pool worker entry point: signals only set the stop event, so the current batch finishes"""
+    # Ctrl-C reaches the whole process group; the parent turns it into stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    run_worker(worker_id, queue_path, poll_interval, stop_event, None, batch_size, backend)
+
+def run_worker_pool(workers: int = DEFAULT_WORKERS, queue_path: Optional[str] = None,
+                    poll_interval: float = DEFAULT_POLL_INTERVAL, batch_size: int = DEFAULT_BATCH_SIZE,
+                    backend: Optional[str] = None):
+    """Run a pool of worker processes until SIGINT/SIGTERM"""
+    backend = queue_backend(backend)
+    open_queue(queue_path, backend).close()  # Create the schema before workers race for it
+    stop_event = multiprocessing.Event()
+    processes: List[multiprocessing.Process] = []
+
+    for index in range(workers):
+        process = multiprocessing.Process(
+            target=_run_pool_worker,
+            args=(f"{socket.gethostname()}-{os.getpid()}-{index}", queue_path, poll_interval, stop_event, batch_size, backend),
+            daemon=False
+        )
+        process.start()
+        processes.append(process)
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for process in processes:
+        process.join()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Durable grading queue")
+    parser.add_argument('--queue', default=None, help="SQLite queue file (env: GRADING_QUEUE_PATH)")
+    parser.add_argument('--backend', choices=QUEUE_BACKENDS, default=None,
+                        help="Queue backend (env: GRADING_QUEUE_BACKEND, default sqlite)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="Enqueue UserAnswer ids for grading")
+    enqueue_parser.add_argument('answer_ids', nargs='+')
+
+    work_parser = subparsers.add_parser('work', help="Run a pool of grading workers")
+    work_parser.add_argument('--workers', type=int, default=int(os.getenv('GRADING_QUEUE_WORKERS', DEFAULT_WORKERS)))
+    work_parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL)
+    work_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    subparsers.add_parser('stats', help="Show job counts by status")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'enqueue':
+        queue = open_queue(args.queue, args.backend)
+        created = sum(queue.enqueue(answer_id) for answer_id in args.answer_ids)
+        print(f"Enqueued {created} of {len(args.answer_ids)} answers")
+    elif args.command == 'work':
+        run_worker_pool(args.workers, args.queue, args.poll_interval, args.batch_size, args.backend)
+    else:
+        print(open_queue(args.queue, args.backend).stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# python/incremental_grading.py - Re-grade only the answers whose question, answer or prompt changed
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+
+from api_client import DEFAULT_MODEL
+from db_operations import get_exam_grading_results, upsert_exam_grading_results
+from metrics import metrics
+from prompt_templates import PROMPT_TEMPLATE_VERSION
+from serialization import dumps, loads
+
+# Keys of a grading result that come from the current submission rather than the grade
+_SUBMISSION_KEYS = ('questionId', 'answer', 'timeSpent')
+
+def incremental_enabled(data: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether the caller asked for incremental grading ('incremental'), else GRADING_INCREMENTAL (default off)"""
+    requested = (data or {}).get('incremental')
+    if requested is not None:
+        return bool(requested)
+    return os.getenv('GRADING_INCREMENTAL', 'false').lower() in ('1', 'true', 'yes')
+
+def grading_fingerprint(question: Dict[str, Any], answer: str, prompt_version: str = PROMPT_TEMPLATE_VERSION,
+                        model: str = DEFAULT_MODEL) -> str:
+    """
+    Fingerprint everything that determines a grade
+
+    The whole question is hashed in canonical form, so editing its text, points, correct
+    answer or rubric changes the fingerprint; so does a new prompt template version or
+    model. Answer whitespace is collapsed as in the grading cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(question_fingerprint(question, prompt_version, model).encode('utf-8'))
+    digest.update(b"\x00")
+    digest.update(' '.join(answer.split()).encode('utf-8'))
+    return digest.hexdigest()
+
+def question_fingerprint(question: Dict[str, Any], prompt_version: str = PROMPT_TEMPLATE_VERSION,
+                         model: str = DEFAULT_MODEL) -> str:
+    """Fingerprint of a question version: its canonical content, the prompt template version and model"""
+    digest = hashlib.sha256()
+    digest.update(f"{prompt_version}\x00{model}\x00".encode('utf-8'))
+    digest.update(json.dumps(question, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+class IncrementalGrader:
+    """
+    Wraps a GradingEngine so only changed (question, answer, prompt version) tuples are graded
+
+    Prior grades are kept per candidate and question with their fingerprint. Answers whose
+    fingerprint matches are served from the stored grade; the rest go through the engine
+    and replace the stored rows. Fallback grades are never stored or reused.
+    """
+
+    def __init__(self, engine, load_results: Callable[[str, List[str]], Dict[str, Dict[str, Any]]] = get_exam_grading_results,
+                 save_results: Callable[[List[Dict[str, Any]]], Any] = upsert_exam_grading_results):
+        """
+        Args:
+            engine: GradingEngine used for answers without a reusable grade
+            load_results: load_results(user_id, question_ids) -> stored rows keyed by question id
+            save_results: save_results(rows) persisting new rows in one request
+        """
+        self.engine = engine
+        self.load_results = load_results
+        self.save_results = save_results
+
+    def grade_exam(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Grade all (answer, question) pairs, returning results in the same order as items"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        for index, result in self.iter_exam(items, user_info):
+            results[index] = result
+        return results
+
+    def iter_exam(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]], user_info: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield reused grades first, then the engine's results for changed answers as they complete
+
+        Yields:
+            (index into items, grading result) pairs
+        """
+        user_id = user_info.get('userId')
+        if not user_id:
+            yield from self.engine.iter_exam(items, user_info)
+            return
+
+        fingerprints = [grading_fingerprint(question, answer.get('answer', '')) for answer, question in items]
+        stored = self._load(str(user_id), [str(answer['questionId']) for answer, _ in items])
+
+        stale: List[int] = []
+        for index, (answer, _) in enumerate(items):
+            prior = self._reusable(stored.get(str(answer['questionId'])), fingerprints[index])
+            if prior is None:
+                stale.append(index)
+                continue
+            metrics.inc('incremental_grades', exam_key='gradesReused', outcome='reused')
+            yield index, self._build_result(answer, prior)
+
+        if not stale:
+            return
+
+        rows = []
+        for stale_index, result in self.engine.iter_exam([items[index] for index in stale], user_info):
+            index = stale[stale_index]
+            metrics.inc('incremental_grades', exam_key='gradesRegraded', outcome='regraded')
+            if not result.get('fallback'):
+                rows.append(self._build_row(str(user_id), items[index][0], fingerprints[index], result))
+            yield index, result
+        self._save(rows)
+
+    def pop_copy_flags(self, user_id: Any) -> List[Dict[str, Any]]:
+        return self.engine.pop_copy_flags(user_id)
+
+    def _load(self, user_id: str, question_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            return self.load_results(user_id, question_ids)
+        except Exception as e:
+            # Without prior grades everything is re-graded, which is slower but correct
+            print(f"Warning: could not load prior grading results: {e}")
+            return {}
+
+    def _save(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        try:
+            self.save_results(rows)
+        except Exception as e:
+            print(f"Warning: could not store grading results: {e}")
+
+    def _reusable(self, row: Optional[Dict[str, Any]], fingerprint: str) -> Optional[Dict[str, Any]]:
+        if row is None or row.get('fingerprint') != fingerprint:
+            return None
+        try:
+            grade = loads(row['result'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not isinstance(grade, dict) or grade.get('fallback') or grade.get('needsRegrade'):
+            return None
+        return grade
+
+    def _build_result(self, answer: Dict[str, Any], grade: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'questionId': answer['questionId'],
+            'answer': answer.get('answer', ''),
+            'timeSpent': answer.get('timeSpent', 0),
+            **grade
+        }
+
+    def _build_row(self, user_id: str, answer: Dict[str, Any], fingerprint: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        question_id = str(answer['questionId'])
+        grade = {key: value for key, value in result.items() if key not in _SUBMISSION_KEYS}
+        return {
+            'key': f"{user_id}:{question_id}",
+            'user_id': user_id,
+            'question_id': question_id,
+            'fingerprint': fingerprint,
+            'result': dumps(grade),
+            'updated_at': time.time()
+        }
@@ -0,0 +1,223 @@
+# python/metrics.py - Stage timings and counters for the grading pipeline with Prometheus export
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+# Latency buckets in seconds, covering in-process stages through slow completions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = 'cloudhire_'
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class ExamMetrics:
+    """Per-exam totals of stage time and pipeline counters, returned with the grading response"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            totals = self.stages.setdefault(stage, {'count': 0, 'seconds': 0.0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+
+    def add(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stages': {
+                    stage: {'count': int(totals['count']), 'ms': round(totals['seconds'] * 1000, 1)}
+                    for stage, totals in self.stages.items()
+                },
+                **self.counters
+            }
+
+_current_exam: contextvars.ContextVar[Optional[ExamMetrics]] = contextvars.ContextVar('current_exam_metrics', default=None)
+
+class MetricsRegistry:
+    """
+    Thread-safe process-wide counters, gauges and histograms
+
+    Every recording is also added to the ExamMetrics active in the current context
+    (see exam_metrics), so one call site feeds both the Prometheus export and the
+    per-exam totals.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Dict[str, Any]]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1, exam_key: Optional[str] = None, **labels):
+        """Increment a counter; exam_key names the per-exam total it also feeds"""
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        exam = _current_exam.get()
+        if exam is not None and exam_key:
+            exam.add(exam_key, value)
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record a duration in a histogram"""
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['buckets'][position] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to its current value"""
+        key = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[None]:
+        """Time a pipeline stage into grading_stage_seconds and the current exam totals"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('grading_stage_seconds', elapsed, stage=stage, **labels)
+            exam = _current_exam.get()
+            if exam is not None:
+                exam.add_stage(stage, elapsed)
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict copy of every series, keyed by metric name then label string"""
+        with self._lock:
+            return {
+                'counters': {
+                    name: {_format_labels(key): value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+                'gauges': {
+                    name: {_format_labels(key): value for key, value in series.items()}
+                    for name, series in self._gauges.items()
+                },
+                'histograms': {
+                    name: {
+                        _format_labels(key): {'count': histogram['count'], 'sum': histogram['sum']}
+                        for key, histogram in series.items()
+                    }
+                    for name, series in self._histograms.items()
+                }
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every series in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                full_name = f"{METRIC_PREFIX}{name}_total"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+
+            for name in sorted(self._gauges):
+                full_name = f"{METRIC_PREFIX}{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} gauge")
+                for key, value in sorted(self._gauges[name].items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+
+            for name in sorted(self._histograms):
+                full_name = f"{METRIC_PREFIX}{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram['buckets']):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_format_labels(key + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(histogram['sum'])}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    escaped = (
+        (label, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for label, value in key
+    )
+    return '{' + ','.join(f'{label}="{value}"' for label, value in escaped) + '}'
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+@contextmanager
+def exam_metrics() -> Iterator[ExamMetrics]:
+    """
+    Collect per-exam totals for everything recorded in this context
+
+    Work submitted to thread pools must run in a copy of the context
+    (contextvars.copy_context().run) for its recordings to be included.
+    """
+    exam = ExamMetrics()
+    token = _current_exam.set(exam)
+    try:
+        yield exam
+    finally:
+        _current_exam.reset(token)
+
+metrics = MetricsRegistry()
+metrics.describe('grading_stage_seconds', 'Time spent in each grading pipeline stage')
+metrics.describe('xai_request_seconds', 'Latency of individual xAI chat completion requests')
+metrics.describe('xai_requests', 'xAI chat completion requests by outcome')
+metrics.describe('xai_retries', 'xAI requests retried after a failure')
+metrics.describe('xai_hedges', 'Duplicate xAI requests sent for slow calls')
+metrics.describe('xai_hedge_wins', 'Hedged calls answered first by the duplicate request')
+metrics.describe('xai_tokens', 'Tokens reported in xAI completion usage')
+metrics.describe('xai_token_budget', 'Locally estimated prompt tokens and requested max_tokens of xAI calls')
+metrics.describe('xai_truncated_responses', 'xAI completions cut off by max_tokens')
+metrics.describe('answer_compaction', 'Overlong answers compacted before grading')
+metrics.describe('answer_tokens_saved', 'Estimated prompt tokens removed by answer compaction')
+metrics.describe('xai_circuit_state', 'xAI circuit breaker state (0 closed, 1 half-open, 2 open)')
+metrics.describe('xai_circuit_transitions', 'xAI circuit breaker state changes')
+metrics.describe('xai_circuit_rejections', 'xAI calls failed fast by the open circuit breaker')
+metrics.describe('regrade_backlog', 'Exams queued for re-grading after fallback grading, by outcome')
+metrics.describe('grading_cache_lookups', 'Grading cache lookups by result')
+metrics.describe('grading_fallbacks', 'Questions graded by the non-AI fallback')
+metrics.describe('grading_deadline_exceeded', 'Questions still in flight when the exam deadline passed')
+metrics.describe('incremental_grades', 'Answers reused or re-graded by incremental grading')
+metrics.describe('near_duplicate_reuse', 'Grades reused from a verified near-identical answer')
+metrics.describe('copy_flags', 'Answers flagged as near-duplicates of another candidate')
+metrics.describe('rule_graded', 'Questions scored by the deterministic rule grader')
+metrics.describe('grading_parse_failures', 'Model responses that could not be parsed')
+metrics.describe('question_bank_lookups', 'Question bank lookups by result')
+metrics.describe('db_round_trips', 'Supabase requests by operation')
+metrics.describe('db_request_seconds', 'Latency of Supabase requests')
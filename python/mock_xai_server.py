@@ -0,0 +1,177 @@
+# python/mock_xai_server.py - Local stand-in for the xAI chat completions endpoint
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+RESPONSE_SHAPES = ('json', 'fenced', 'prose', 'malformed')
+
+class MockXAIServer:
+    """
+    Serves /v1/chat/completions on localhost with configurable latency, errors and response shapes
+
+    Point clients at it with XAI_BASE_URL=server.base_url.
+    """
+
+    def __init__(self, latency_ms: float = 200.0, latency_jitter_ms: float = 50.0, latency_distribution: str = 'normal',
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after_seconds: float = 1.0,
+                 response_shape: str = 'json', seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Mean response latency
+            latency_jitter_ms: Standard deviation (normal), half-width (uniform) or sigma scale (lognormal)
+            latency_distribution: 'fixed', 'normal', 'uniform' or 'lognormal'
+            error_rate: Fraction of requests answered with HTTP 500
+            rate_limit_rate: Fraction of requests answered with HTTP 429 and Retry-After
+            retry_after_seconds: Retry-After value sent with 429 responses
+            response_shape: 'json', 'fenced' (```json block), 'prose' (JSON wrapped in text) or 'malformed'
+            seed: Seed for reproducible latency and error sampling
+        """
+        if response_shape not in RESPONSE_SHAPES:
+            raise ValueError(f"Unknown response shape: {response_shape}")
+
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.response_shape = response_shape
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'ok': 0, 'errors': 0, 'rateLimited': 0}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def start(self) -> 'MockXAIServer':
+        server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        server.daemon_threads = True
+        self._server = server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts = {key: 0 for key in self.counts}
+
+    def sample_latency(self) -> float:
+        """Sampled latency in seconds"""
+        with self.lock:
+            if self.latency_distribution == 'fixed':
+                latency_ms = self.latency_ms
+            elif self.latency_distribution == 'uniform':
+                latency_ms = self.random.uniform(self.latency_ms - self.latency_jitter_ms, self.latency_ms + self.latency_jitter_ms)
+            elif self.latency_distribution == 'lognormal':
+                sigma = self.latency_jitter_ms / self.latency_ms if self.latency_ms else 0
+                latency_ms = self.latency_ms * self.random.lognormvariate(0, sigma)
+            else:
+                latency_ms = self.random.gauss(self.latency_ms, self.latency_jitter_ms)
+        return max(0.0, latency_ms) / 1000.0
+
+    def _outcome(self) -> str:
+        with self.lock:
+            self.counts['requests'] += 1
+            roll = self.random.random()
+            if roll < self.rate_limit_rate:
+                self.counts['rateLimited'] += 1
+                return 'rate_limited'
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.counts['errors'] += 1
+                return 'error'
+            self.counts['ok'] += 1
+            return 'ok'
+
+    def build_content(self, prompt: str) -> str:
+        """Build a grading completion for the prompt in the configured shape"""
+        points = [float(value) for value in re.findall(r'Points: ([\d.]+)', prompt)] or [10.0]
+
+        def grade(max_score: float) -> Dict[str, Any]:
+            return {
+                'score': round(max_score * 0.8, 1),
+                'maxScore': max_score,
+                'feedback': "Clear explanation showing solid technical understanding of the concept.",
+                'strengths': ["Clear explanation"],
+                'improvements': ["Add a concrete example"]
+            }
+
+        if 'JSON array' in prompt:
+            body = json.dumps([{'index': index, **grade(max_score)} for index, max_score in enumerate(points)])
+        else:
+            body = json.dumps(grade(points[0]))
+
+        if self.response_shape == 'fenced':
+            return f"```json\n{body}\n```"
+        if self.response_shape == 'prose':
+            return f"Here is my evaluation of the response:\n{body}\nLet me know if you need anything else."
+        if self.response_shape == 'malformed':
+            return body[:len(body) // 2]
+        return body
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                time.sleep(mock.sample_latency())
+
+                outcome = mock._outcome()
+                if outcome == 'rate_limited':
+                    self._send(429, {'error': 'rate limited'}, {'Retry-After': str(mock.retry_after_seconds)})
+                    return
+                if outcome == 'error':
+                    self._send(500, {'error': 'internal error'})
+                    return
+
+                prompt = '\n'.join(message.get('content', '') for message in payload.get('messages', []))
+                content = mock.build_content(prompt)
+                prompt_tokens = len(prompt) // 4 + 1
+                completion_tokens = len(content) // 4 + 1
+                finish_reason = 'stop'
+                max_tokens = payload.get('max_tokens')
+                if max_tokens and completion_tokens > max_tokens:
+                    # Cut off like the real API when the completion budget runs out
+                    content = content[:max_tokens * 4]
+                    completion_tokens = max_tokens
+                    finish_reason = 'length'
+                self._send(200, {
+                    'id': 'mock-completion',
+                    'object': 'chat.completion',
+                    'model': payload.get('model', 'grok-beta'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': finish_reason}],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens
+                    }
+                })
+
+            def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                encoded = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,188 @@
+# python/prompt_templates.py - Versioned grading prompt templates with a shared per-exam prefix
+import hashlib
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+
+from token_budget import batch_completion_budget, completion_budget
+
+# Bump when the wording of any template changes meaning; the template hash
+# below also changes on any edit, so cache keys never mix prompt revisions.
+PROMPT_VERSION = '2'
+
+GRADING_SYSTEM_PROMPT = """You are an expert technical evaluator grading exam responses. Be thorough and fair in your evaluation.
+
+Please respond with a JSON object in this exact format:
+{
+  "score": <number>,
+  "maxScore": <number>,
+  "feedback": "<detailed feedback>",
+  "strengths": ["<strength1>", "<strength2>"],
+  "improvements": ["<improvement1>", "<improvement2>"]
+}"""
+
+BATCH_SYSTEM_PROMPT = """You are an expert technical evaluator grading several exam responses from the same candidate. Evaluate each response independently and be thorough and fair.
+
+GRADING INSTRUCTIONS:
+- Grade based on:
+  * Understanding of concepts (40%)
+  * Clarity of explanation (30%)
+  * Technical accuracy (20%)
+  * Completeness (10%)
+- Never award more than the points available for a response
+- Consider the candidate's experience level in your evaluation
+
+Please respond with a JSON array containing one object per response, in this exact format:
+[
+  {
+    "index": <response number>,
+    "score": <number>,
+    "maxScore": <number>,
+    "feedback": "<detailed feedback>",
+    "strengths": ["<strength1>", "<strength2>"],
+    "improvements": ["<improvement1>", "<improvement2>"]
+  }
+]"""
+
+CANDIDATE_TEMPLATE = """CANDIDATE INFORMATION:
+- Name: {firstName} {lastName}
+- Position: {position}
+- Experience Level: {experience}
+- Education: {education}
+"""
+
+QUESTION_TEMPLATE = """
+QUESTION:
+Type: {type}
+Question: {question}
+Points: {points}
+Category: {category}
+
+STUDENT ANSWER:
+{answer}
+
+GRADING INSTRUCTIONS:
+{instructions}"""
+
+MULTIPLE_CHOICE_INSTRUCTIONS = """- This is a multiple-choice question
+- Correct answer: {correctAnswer}
+- Award {points} points for correct answer, 0 for incorrect
+- Provide brief feedback explaining why the answer is correct or incorrect
+"""
+
+OPEN_INSTRUCTIONS = """- This is a {type} question worth {points} points
+- Grade based on:
+  * Understanding of concepts (40%)
+  * Clarity of explanation (30%)
+  * Technical accuracy (20%)
+  * Completeness (10%)
+- Provide detailed feedback with specific strengths and areas for improvement
+- Consider the candidate's experience level in your evaluation
+"""
+
+BATCH_ITEM_TEMPLATE = """
+RESPONSE {index}:
+Type: {type}
+Question: {question}
+Points: {points}
+Category: {category}
+STUDENT ANSWER:
+{answer}
+"""
+
+_TEMPLATES = (GRADING_SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT, CANDIDATE_TEMPLATE, QUESTION_TEMPLATE,
+              MULTIPLE_CHOICE_INSTRUCTIONS, OPEN_INSTRUCTIONS, BATCH_ITEM_TEMPLATE)
+_CANDIDATE_FIELDS = ('firstName', 'lastName', 'position', 'experience', 'education')
+# Candidate fields the instructions ask the model to weigh ("Consider the candidate's experience level")
+GRADE_CONTEXT_FIELDS = ('position', 'experience')
+
+def _template_hash() -> str:
+    digest = hashlib.sha256()
+    for template in _TEMPLATES:
+        digest.update(template.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:8]
+
+PROMPT_TEMPLATE_VERSION = f"{PROMPT_VERSION}-{_template_hash()}"
+
+class RenderedPrompt:
+    """
+    Chat messages for one grading request, ordered so the static system prefix and the
+    per-exam candidate block come first and provider-side prompt caching can reuse them
+    """
+
+    def __init__(self, messages: List[Dict[str, str]], version: str = PROMPT_TEMPLATE_VERSION, expects: str = 'object',
+                 max_tokens: Optional[int] = None):
+        """
+        Args:
+            messages: Chat messages in send order
+            version: Template version, part of the grading cache key
+            expects: 'object' or 'array', the JSON shape the response should contain
+            max_tokens: Completion budget for the expected response (None for the client default)
+        """
+        self.messages = messages
+        self.version = version
+        self.expects = expects
+        self.max_tokens = max_tokens
+
+    @property
+    def text(self) -> str:
+        """All message contents, used for cache keys and token estimates"""
+        return '\n'.join(message['content'] for message in self.messages)
+
+    def __str__(self) -> str:
+        return self.text
+
+@lru_cache(maxsize=1024)
+def _render_candidate(candidate: Tuple[str, ...]) -> str:
+    return CANDIDATE_TEMPLATE.format(**dict(zip(_CANDIDATE_FIELDS, candidate)))
+
+def render_candidate_block(user_info: Dict[str, Any]) -> str:
+    """Candidate block shared by every question in an exam, rendered once per candidate"""
+    return _render_candidate(tuple(str(user_info.get(field, 'Unknown')) for field in _CANDIDATE_FIELDS))
+
+def grade_context(user_info: Dict[str, Any]) -> Dict[str, str]:
+    """The candidate fields that can change a grade, as rendered into the prompt"""
+    return {field: str(user_info.get(field, 'Unknown')) for field in GRADE_CONTEXT_FIELDS}
+
+def render_grading_prompt(question: Dict[str, Any], answer: str, user_info: Dict[str, Any]) -> RenderedPrompt:
+    """Prompt grading one response: static system message, then candidate block and question"""
+    if question.get('type') == 'multiple-choice':
+        instructions = MULTIPLE_CHOICE_INSTRUCTIONS.format(
+            correctAnswer=question.get('correctAnswer', 'Not specified'),
+            points=question.get('points', 0)
+        )
+    else:
+        instructions = OPEN_INSTRUCTIONS.format(type=question.get('type', 'essay'), points=question.get('points', 0))
+
+    question_part = QUESTION_TEMPLATE.format(
+        type=question.get('type', 'Unknown'),
+        question=question.get('question', 'No question provided'),
+        points=question.get('points', 0),
+        category=question.get('category', 'General'),
+        answer=answer,
+        instructions=instructions
+    )
+    return RenderedPrompt([
+        {'role': 'system', 'content': GRADING_SYSTEM_PROMPT},
+        {'role': 'user', 'content': render_candidate_block(user_info) + question_part}
+    ], max_tokens=completion_budget(question))
+
+def render_batch_prompt(items: List[Tuple[Dict[str, Any], str]], user_info: Dict[str, Any]) -> RenderedPrompt:
+    """Prompt grading several responses from one candidate in a single completion"""
+    parts = [render_candidate_block(user_info)]
+    parts.extend(render_batch_item(question, answer, index) for index, (question, answer) in enumerate(items))
+    return RenderedPrompt([
+        {'role': 'system', 'content': BATCH_SYSTEM_PROMPT},
+        {'role': 'user', 'content': ''.join(parts)}
+    ], expects='array', max_tokens=batch_completion_budget(question for question, _ in items))
+
+def render_batch_item(question: Dict[str, Any], answer: str, index: int = 0) -> str:
+    """The per-response part of a batch prompt, for token budgeting"""
+    return BATCH_ITEM_TEMPLATE.format(
+        index=index,
+        type=question.get('type', 'Unknown'),
+        question=question.get('question', 'No question provided'),
+        points=question.get('points', 0),
+        category=question.get('category', 'General'),
+        answer=answer
+    )
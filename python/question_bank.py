@@ -0,0 +1,216 @@
+# python/question_bank.py - Preloaded question tables indexed by (type, id)
+import os
+import threading
+import time
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+from db_operations import get_question_rows
+from metrics import metrics
+
+DEFAULT_TTL_SECONDS = 300.0
+# Minimum time between refreshes of one table triggered by unknown ids
+MISS_REFRESH_SECONDS = 5.0
+
+# Grading question type -> Supabase table (see prisma/schema.prisma)
+QUESTION_TABLES = {
+    'multiple-choice': 'questions_multiple_choice',
+    'calculation': 'questions_calculations',
+    'behavioral': 'questions_behavioral',
+    'free-response': 'questions_free_response'
+}
+
+# Type names used by the exam page and user_responses.question_type
+TYPE_ALIASES = {
+    'multiple_choice': 'multiple-choice',
+    'multipleChoice': 'multiple-choice',
+    'calculations': 'calculation',
+    'numerical': 'calculation',
+    'response': 'free-response',
+    'concepts': 'free-response',
+    'free_response': 'free-response'
+}
+
+# Points for rows whose points column is empty (or absent on older schemas)
+QUESTION_POINTS = {
+    'multiple-choice': 5,
+    'calculation': 10,
+    'behavioral': 10,
+    'free-response': 10
+}
+
+_default_bank: Optional['QuestionBank'] = None
+_default_bank_lock = threading.Lock()
+
+def normalize_question_type(question_type: Optional[str]) -> Optional[str]:
+    if question_type is None:
+        return None
+    return TYPE_ALIASES.get(question_type, question_type)
+
+def question_from_row(question_type: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a question table row to the question dict the graders expect"""
+    question = {
+        'id': str(row['id']),
+        'type': question_type,
+        'question': row.get('question') or '',
+        'points': row['points'] if row.get('points') is not None else QUESTION_POINTS[question_type],
+        'createdAt': row.get('created_at')
+    }
+    if question_type == 'multiple-choice':
+        question['options'] = [row[column] for column in ('option_a', 'option_b', 'option_c', 'option_d') if row.get(column)]
+        question['correctAnswer'] = row.get('correct_answer') or ''
+    elif question_type == 'calculation':
+        question['answerNumerical'] = row.get('answer_numerical')
+        question['answerExplanation'] = row.get('answer_explanation')
+    elif question_type == 'behavioral':
+        question['category'] = 'Behavioral'
+    return question
+
+class QuestionBank:
+    """
+    In-process copy of the question tables with O(1) lookup by (type, id)
+
+    The tables are loaded in bulk on first use. Every ttl_seconds, and when an unknown id
+    is requested, only rows created after the newest created_at seen are fetched. A change
+    of version (for example after questions were edited in place) drops everything and
+    reloads on the next lookup.
+
+    Rows are fetched without holding the lookup lock: one thread loads at a time, re-checks
+    whether the load is still needed once it has the loader lock, and publishes the rows
+    under the lookup lock. Lookups are only held up by a load when the bank is empty or the
+    id is unknown; a due TTL refresh already running elsewhere is not waited for.
+    """
+
+    def __init__(self, load_rows: Callable[..., List[Dict[str, Any]]] = get_question_rows,
+                 ttl_seconds: Optional[float] = None, version: Optional[str] = None):
+        """
+        Args:
+            load_rows: load_rows(table, created_after=None) -> rows, in bulk
+            ttl_seconds: Seconds between checks for new rows (env: QUESTION_BANK_TTL_SECONDS)
+            version: Content version; changing it invalidates the bank (env: QUESTION_BANK_VERSION)
+        """
+        self.load_rows = load_rows
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv('QUESTION_BANK_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+        self.version = version if version is not None else os.getenv('QUESTION_BANK_VERSION', '')
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._questions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._watermarks: Dict[str, Optional[str]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._loaded_version: Optional[str] = None
+
+    def get(self, question_type: Optional[str], question_id: Any) -> Optional[Dict[str, Any]]:
+        """Question with this type and id, or None if it does not exist"""
+        question_type = normalize_question_type(question_type)
+        if question_type not in QUESTION_TABLES:
+            return None
+        key = (question_type, str(question_id))
+
+        self._ensure_fresh()
+        with self._lock:
+            question = self._questions.get(key)
+        if question is None and self._refresh_due(question_type, MISS_REFRESH_SECONDS):
+            with self._load_lock:
+                if self._refresh_due(question_type, MISS_REFRESH_SECONDS):
+                    self._refresh_table(question_type)
+            with self._lock:
+                question = self._questions.get(key)
+
+        metrics.inc('question_bank_lookups', result='hit' if question is not None else 'miss')
+        return question
+
+    def invalidate(self, version: Optional[str] = None):
+        """Drop every cached question, optionally switching to a new content version"""
+        with self._lock:
+            if version is not None:
+                self.version = version
+            self._loaded_version = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for question_type, _ in self._questions:
+                counts[question_type] = counts.get(question_type, 0) + 1
+            return {'version': self._loaded_version, 'questions': counts, 'watermarks': dict(self._watermarks)}
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def _is_loaded(self) -> bool:
+        with self._lock:
+            return self._loaded_version == self.version
+
+    def _refresh_due(self, question_type: str, interval: float) -> bool:
+        with self._lock:
+            return time.monotonic() - self._checked_at.get(question_type, 0.0) >= interval
+
+    def _ensure_fresh(self):
+        if not self._is_loaded():
+            with self._load_lock:
+                if not self._is_loaded():
+                    self._load_all()
+            return
+
+        stale = [question_type for question_type in QUESTION_TABLES if self._refresh_due(question_type, self.ttl_seconds)]
+        # Serve the current rows rather than queue behind a refresh another thread is running
+        if stale and self._load_lock.acquire(blocking=False):
+            try:
+                for question_type in stale:
+                    if self._refresh_due(question_type, self.ttl_seconds):
+                        self._refresh_table(question_type)
+            finally:
+                self._load_lock.release()
+
+    def _load_all(self):
+        """Fetch every table and replace the bank in one step (caller holds _load_lock)"""
+        with self._lock:
+            version = self.version
+        questions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        watermarks: Dict[str, Optional[str]] = {}
+        checked_at: Dict[str, float] = {}
+        for question_type in QUESTION_TABLES:
+            rows = self.load_rows(QUESTION_TABLES[question_type], created_after=None)
+            checked_at[question_type] = time.monotonic()
+            watermarks[question_type] = self._index_rows(questions, question_type, rows, None)
+
+        with self._lock:
+            self._questions = questions
+            self._watermarks = watermarks
+            self._checked_at = checked_at
+            # An invalidate() during the load leaves the bank stale so the next lookup reloads
+            if self.version == version:
+                self._loaded_version = version
+
+    def _refresh_table(self, question_type: str):
+        """Fetch rows newer than the table's watermark and merge them in (caller holds _load_lock)"""
+        with self._lock:
+            watermark = self._watermarks.get(question_type)
+        rows = self.load_rows(QUESTION_TABLES[question_type], created_after=watermark)
+        questions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        watermark = self._index_rows(questions, question_type, rows, watermark)
+
+        with self._lock:
+            self._questions.update(questions)
+            self._watermarks[question_type] = watermark
+            self._checked_at[question_type] = time.monotonic()
+
+    @staticmethod
+    def _index_rows(questions: Dict[Tuple[str, str], Dict[str, Any]], question_type: str, rows: List[Dict[str, Any]],
+                    watermark: Optional[str]) -> Optional[str]:
+        """Add rows to questions and return the newest created_at seen"""
+        for row in rows:
+            question = question_from_row(question_type, row)
+            questions[(question_type, question['id'])] = question
+            created_at = row.get('created_at')
+            if created_at is not None and (watermark is None or str(created_at) > watermark):
+                watermark = str(created_at)
+        return watermark
+
+def get_question_bank() -> QuestionBank:
+    """Process-wide question bank, kept warm between invocations"""
+    global _default_bank
+    if _default_bank is None:
+        with _default_bank_lock:
+            if _default_bank is None:
+                _default_bank = QuestionBank()
+    return _default_bank
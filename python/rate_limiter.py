@@ -0,0 +1,220 @@
+# python/rate_limiter.py - Adaptive client-side rate limiting and retry policy for the xAI API
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+
+DEFAULT_REQUESTS_PER_MINUTE = 480
+DEFAULT_TOKENS_PER_MINUTE = 400000
+MIN_RATE_FRACTION = 0.1
+RECOVERY_STEP = 0.05
+
+_shared_limiter: Optional['AdaptiveRateLimiter'] = None
+_shared_limiter_lock = threading.Lock()
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate (callers hold the limiter lock)"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = float(per_minute)
+        self.capacity = self.per_minute
+        self.rate = self.per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def scale(self, fraction: float, now: float):
+        """Run the bucket at a fraction of its configured rate"""
+        self._refill(now)
+        self.capacity = self.per_minute * fraction
+        self.rate = self.capacity / 60.0
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount tokens are available (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class AdaptiveRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter shared by all grading tasks
+
+    Throttling responses shrink the effective rate and pause every caller until
+    the server's Retry-After has passed; successes slowly restore the rate.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        """
+        Args:
+            requests_per_minute: Request budget (env: XAI_REQUESTS_PER_MINUTE)
+            tokens_per_minute: Prompt + completion token budget (env: XAI_TOKENS_PER_MINUTE)
+        """
+        self.requests_per_minute = requests_per_minute or float(os.getenv('XAI_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE))
+        self.tokens_per_minute = tokens_per_minute or float(os.getenv('XAI_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE))
+        self.request_bucket = TokenBucket(self.requests_per_minute)
+        self.token_bucket = TokenBucket(self.tokens_per_minute)
+        self.rate_fraction = 1.0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> bool:
+        """
+        Block until a request costing the given tokens may be sent
+
+        Args:
+            tokens: Estimated prompt + completion tokens for the request
+            timeout: Maximum seconds to wait (None to wait indefinitely)
+
+        Returns:
+            True if acquired, False if the timeout elapsed first
+        """
+        started = time.monotonic()
+        waited_since = None
+        while True:
+            delay = self.reserve(tokens, waited_since)
+            if delay <= 0:
+                return True
+            if timeout is not None and time.monotonic() + delay - started > timeout:
+                return False
+            waited_since = started
+            time.sleep(min(delay, 1.0))
+
+    def reserve(self, tokens: int = 1, waited_since: Optional[float] = None) -> float:
+        """
+        Take capacity for one request without blocking
+
+        Args:
+            tokens: Estimated prompt + completion tokens for the request
+            waited_since: monotonic() time the caller started waiting, if it has already waited
+
+        Returns:
+            0 if the request may be sent now, otherwise seconds to wait before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = max(
+                self.paused_until - now,
+                self.request_bucket.wait_time(1, now),
+                self.token_bucket.wait_time(tokens, now)
+            )
+            if delay > 0:
+                return delay
+
+            self.request_bucket.take(1)
+            self.token_bucket.take(tokens)
+            self.requests += 1
+            if waited_since is not None:
+                self.waits += 1
+                self.wait_seconds += now - waited_since
+            return 0.0
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Record a 429: halve the effective rate and pause all callers for Retry-After"""
+        with self._lock:
+            self.throttled += 1
+            self._set_rate_fraction(max(MIN_RATE_FRACTION, self.rate_fraction / 2))
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def on_retry(self):
+        """Record a retried call"""
+        with self._lock:
+            self.retries += 1
+
+    def on_success(self):
+        """Record a successful call: additively restore the effective rate"""
+        with self._lock:
+            if self.rate_fraction < 1.0:
+                self._set_rate_fraction(min(1.0, self.rate_fraction + RECOVERY_STEP))
+
+    def _set_rate_fraction(self, fraction: float):
+        now = time.monotonic()
+        self.rate_fraction = fraction
+        self.request_bucket.scale(fraction, now)
+        self.token_bucket.scale(fraction, now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Throttling metrics for sizing grading concurrency"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'waits': self.waits,
+                'waitSeconds': round(self.wait_seconds, 3),
+                'effectiveRequestsPerMinute': round(self.requests_per_minute * self.rate_fraction, 1),
+                'effectiveTokensPerMinute': round(self.tokens_per_minute * self.rate_fraction, 1)
+            }
+
+class RetryPolicy:
+    """Jittered exponential backoff bounded by an attempt count and a total time budget"""
+
+    RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts: Optional[int] = None, base_delay: float = 0.5, max_delay: float = 20.0,
+                 total_budget_seconds: Optional[float] = None):
+        """
+        Args:
+            max_attempts: Attempts per call including the first (env: XAI_MAX_ATTEMPTS)
+            base_delay: Backoff before the first retry
+            max_delay: Cap on any single backoff
+            total_budget_seconds: Cap on time spent across all attempts of one call (env: XAI_RETRY_BUDGET_SECONDS)
+        """
+        self.max_attempts = max_attempts or int(os.getenv('XAI_MAX_ATTEMPTS', 4))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.total_budget_seconds = total_budget_seconds or float(os.getenv('XAI_RETRY_BUDGET_SECONDS', 60))
+
+    def is_retryable(self, status_code: int) -> bool:
+        return status_code in self.RETRYABLE_STATUS_CODES
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (1-based), honouring Retry-After when larger"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def should_retry(self, attempt: int, started_at: float, delay: float) -> bool:
+        """Whether another attempt fits in the attempt count and total time budget"""
+        if attempt >= self.max_attempts:
+            return False
+        return time.monotonic() - started_at + delay <= self.total_budget_seconds
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def get_shared_rate_limiter() -> AdaptiveRateLimiter:
+    """Get the process-wide limiter shared by every xAI client"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = AdaptiveRateLimiter()
+        return _shared_limiter
@@ -0,0 +1,164 @@
+# python/regrade_backlog.py - Exams graded by the fallback, re-graded once xAI is healthy again
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+from metrics import metrics
+from serialization import dumps, loads
+
+DEFAULT_BACKLOG_PATH = os.path.join(tempfile.gettempdir(), 'cloudhire_regrade_backlog.sqlite')
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_MAX_ROWS = 1000
+
+_backlog_lock = threading.Lock()
+_default_backlog: Optional['RegradeBacklog'] = None
+
+def regrade_backlog_enabled() -> bool:
+    """Off by default: serverless instances have no durable disk or background time to drain it (env: REGRADE_BACKLOG)"""
+    return os.getenv('REGRADE_BACKLOG', 'false').lower() in ('1', 'true', 'yes')
+
+class RegradeBacklog:
+    """
+    Durable list of exam requests with fallback grades, one row per candidate
+
+    A newer submission from the same candidate replaces the queued one. drain() replays
+    each request through a grade callback and drops it once every answer got a real grade.
+    Beyond max_rows the oldest requests are dropped.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 max_rows: Optional[int] = None):
+        """
+        Args:
+            path: SQLite file holding the backlog (env: REGRADE_BACKLOG_PATH), or ':memory:'
+            max_attempts: Replays that still fall back before a request is dropped
+            max_rows: Requests kept before the oldest are dropped (env: REGRADE_BACKLOG_MAX_ROWS)
+        """
+        self.path = path or os.getenv('REGRADE_BACKLOG_PATH', DEFAULT_BACKLOG_PATH)
+        self.max_attempts = max_attempts
+        self.max_rows = max_rows or int(os.getenv('REGRADE_BACKLOG_MAX_ROWS', DEFAULT_MAX_ROWS))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if self.path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS regrade_backlog (
+                user_id TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def add(self, user_id: str, data: Dict[str, Any]):
+        """Queue an exam request for re-grading, replacing the candidate's previous one"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO regrade_backlog (user_id, request, attempts, created_at, updated_at) VALUES (?, ?, 0, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET request = excluded.request, attempts = 0, updated_at = excluded.updated_at
+            """, (str(user_id), dumps(data), now, now))
+            dropped = self._conn.execute("""
+                DELETE FROM regrade_backlog WHERE user_id IN (
+                    SELECT user_id FROM regrade_backlog ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_rows,)).rowcount
+        metrics.inc('regrade_backlog', exam_key='regradeQueued', outcome='queued')
+        if dropped > 0:
+            print(f"Re-grade backlog full, dropped {dropped} oldest exams")
+            metrics.inc('regrade_backlog', dropped, outcome='dropped')
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM regrade_backlog").fetchone()[0]
+
+    def drain(self, grade: Callable[[Dict[str, Any]], bool], can_run: Callable[[], bool] = lambda: True) -> int:
+        """
+        Replay queued requests oldest first while can_run() holds
+
+        Args:
+            grade: grade(data) -> True when no answer fell back to local grading
+            can_run: Checked before each replay, e.g. that the circuit breaker is closed
+
+        Returns:
+            Requests re-graded and removed
+        """
+        regraded = 0
+        attempted = set()
+        while True:
+            # Requests queued while draining are picked up too, each at most once per drain
+            with self._lock:
+                rows = [row for row in self._conn.execute(
+                    "SELECT user_id, request, attempts, updated_at FROM regrade_backlog ORDER BY created_at"
+                ).fetchall() if (row['user_id'], row['updated_at']) not in attempted]
+            if not rows or not can_run():
+                return regraded
+            for row in rows:
+                if not can_run():
+                    return regraded
+                attempted.add((row['user_id'], row['updated_at']))
+                regraded += self._replay(row, grade)
+
+    def _replay(self, row: sqlite3.Row, grade: Callable[[Dict[str, Any]], bool]) -> int:
+        try:
+            complete = grade(loads(row['request']))
+        except Exception as e:
+            print(f"Re-grading exam for {row['user_id']} failed: {e}")
+            complete = False
+
+        with self._lock:
+            # A newer submission queued meanwhile has a later updated_at and is kept
+            if complete or row['attempts'] + 1 >= self.max_attempts:
+                self._conn.execute(
+                    "DELETE FROM regrade_backlog WHERE user_id = ? AND updated_at = ?", (row['user_id'], row['updated_at'])
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE regrade_backlog SET attempts = attempts + 1 WHERE user_id = ? AND updated_at = ?",
+                    (row['user_id'], row['updated_at'])
+                )
+        if complete:
+            metrics.inc('regrade_backlog', outcome='regraded')
+            return 1
+        if row['attempts'] + 1 >= self.max_attempts:
+            print(f"Giving up re-grading exam for {row['user_id']} after {self.max_attempts} attempts")
+            metrics.inc('regrade_backlog', outcome='dropped')
+        return 0
+
+    def start_drain(self, grade: Callable[[Dict[str, Any]], bool], can_run: Callable[[], bool] = lambda: True) -> bool:
+        """Drain on a daemon thread unless a drain is already running; returns whether one was started"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self.drain, args=(grade, can_run), name='regrade-backlog', daemon=True)
+            self._thread.start()
+            return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def get_regrade_backlog() -> RegradeBacklog:
+    """Process-wide backlog on the shared spool file"""
+    global _default_backlog
+    with _backlog_lock:
+        if _default_backlog is None:
+            _default_backlog = RegradeBacklog()
+        return _default_backlog
+
+if __name__ == '__main__':
+    # Replay the backlog now, e.g. from a cron job after an outage
+    from grader import regrade_exam
+
+    backlog = get_regrade_backlog()
+    queued = backlog.pending()
+    regraded = backlog.drain(regrade_exam)
+    print(f"Re-graded {regraded} of {queued} queued exams")
+    sys.exit(0 if backlog.pending() == 0 else 1)
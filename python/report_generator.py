@@ -1,14 +1,33 @@
 # python/report_generator.py - Modular report generation utilities
-import json
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 from db_operations import insert_report
+from report_analytics import analyze_grading_results
+from serialization import encode_report_content
+
+def report_exam_key(user_info: Dict[str, Any], exam_metadata: Dict[str, Any]) -> Optional[str]:
+    """
+    Identity of the exam a report belongs to: its examId, else candidate and completion time
+
+    Reports are stored under this key, so grading the same exam again (a backlog re-grade)
+    replaces its report instead of adding a second one. None when the exam cannot be told apart.
+    """
+    if exam_metadata.get('examId'):
+        return str(exam_metadata['examId'])
+    if user_info.get('userId') and exam_metadata.get('completedAt'):
+        return f"{user_info['userId']}:{exam_metadata['completedAt']}"
+    return None
 
 class ReportGenerator:
     """Generates comprehensive exam reports"""
     
-    def __init__(self):
-        pass
+    def __init__(self, report_writer=None):
+        """
+        Args:
+            report_writer: ReportWriter used for write-behind persistence
+                (defaults to the shared writer unless REPORT_WRITE_BEHIND=false)
+        """
+        self.report_writer = report_writer
     
     def generate_exam_report(self, grading_results: List[Dict[str, Any]], user_info: Dict[str, Any], exam_metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -22,16 +41,59 @@ class ReportGenerator:
         Returns:
             Complete exam report with summary and detailed analysis
         """
+        report = self.build_exam_report(grading_results, user_info, exam_metadata)
+        report_content = encode_report_content(report)
+        exam_key = report_exam_key(user_info, exam_metadata)
+        
+        # Spool the insert so the database write stays off the response path
+        writer = self._get_report_writer()
+        if writer is not None:
+            try:
+                report['reportRef'] = writer.submit(user_info['userId'], report, report_content, exam_key)
+                report['id'] = None
+                return report
+            except Exception as e:
+                print(f"Report spool unavailable, inserting synchronously: {e}")
+        
+        # Insert to DB
+        report_id = insert_report(user_info['userId'], report_content, exam_key)
+        report['id'] = report_id
+        return report
+    
+    def _get_report_writer(self):
+        if self.report_writer is not None:
+            return self.report_writer
+        from report_writer import get_default_report_writer, write_behind_enabled
+        return get_default_report_writer() if write_behind_enabled() else None
+    
+    def build_exam_report(self, grading_results: List[Dict[str, Any]], user_info: Dict[str, Any], exam_metadata: Dict[str, Any],
+                          analytics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build an exam report without persisting it
+        
+        Args:
+            grading_results: List of individual question grading results
+            user_info: User information
+            exam_metadata: Exam metadata (time spent, completion date, etc.)
+            analytics: Precomputed report_analytics aggregates, e.g. from analyze_cohort
+            
+        Returns:
+            Complete exam report with summary and detailed analysis
+        """
+        # Calculate every aggregate in a single pass
+        if analytics is None:
+            analytics = analyze_grading_results(grading_results)
+        
         # Calculate summary statistics
-        total_score = sum(result.get('score', 0) for result in grading_results)
-        max_score = sum(result.get('maxScore', 0) for result in grading_results)
+        total_score = analytics['totalScore']
+        max_score = analytics['maxScore']
         percentage = (total_score / max_score * 100) if max_score > 0 else 0
         
         # Generate overall feedback
         overall_feedback = self._generate_overall_feedback(percentage, grading_results, user_info)
         
         # Analyze strengths and improvements
-        strengths, improvements = self._analyze_patterns(grading_results)
+        strengths, improvements = self._analyze_patterns(analytics)
         
         # Determine recommended level
         recommended_level = self._determine_level(percentage, user_info)
@@ -57,16 +119,12 @@ class ReportGenerator:
                 'areasForImprovement': improvements,
                 'recommendedLevel': recommended_level,
                 'hiringRecommendation': hiring_recommendation,
-                'technicalCapability': self._assess_technical_capability(grading_results),
-                'problemSolvingSkills': self._assess_problem_solving(grading_results),
-                'communicationSkills': self._assess_communication(grading_results)
+                'technicalCapability': self._assess_technical_capability(analytics),
+                'problemSolvingSkills': self._assess_problem_solving(analytics),
+                'communicationSkills': self._assess_communication(analytics)
             },
             'generatedAt': datetime.now().isoformat()
         }
-        # Insert to DB
-        report_content = json.dumps(report)
-        report_id = insert_report(user_info['userId'], report_content)
-        report['id'] = report_id
         return report
     
     def _generate_overall_feedback(self, percentage: float, grading_results: List[Dict[str, Any]], user_info: Dict[str, Any]) -> str:
@@ -97,28 +155,11 @@ class ReportGenerator:
         
         return feedback
     
-    def _analyze_patterns(self, grading_results: List[Dict[str, Any]]) -> tuple[List[str], List[str]]:
+    def _analyze_patterns(self, analytics: Dict[str, Any]) -> tuple[List[str], List[str]]:
         """Analyze patterns in grading results to identify strengths and improvements"""
-        all_strengths = []
-        all_improvements = []
-        
-        for result in grading_results:
-            all_strengths.extend(result.get('strengths', []))
-            all_improvements.extend(result.get('improvements', []))
-        
-        # Count and prioritize
-        strength_counts = {}
-        improvement_counts = {}
-        
-        for strength in all_strengths:
-            strength_counts[strength] = strength_counts.get(strength, 0) + 1
-        
-        for improvement in all_improvements:
-            improvement_counts[improvement] = improvement_counts.get(improvement, 0) + 1
-        
         # Get top 3 most common
-        top_strengths = sorted(strength_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-        top_improvements = sorted(improvement_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+        top_strengths = sorted(analytics['strengthCounts'].items(), key=lambda x: x[1], reverse=True)[:3]
+        top_improvements = sorted(analytics['improvementCounts'].items(), key=lambda x: x[1], reverse=True)[:3]
         
         return [s[0] for s in top_strengths], [i[0] for i in top_improvements]
     
@@ -159,20 +200,13 @@ class ReportGenerator:
         else:
             return 'No Hire'
     
-    def _assess_technical_capability(self, grading_results: List[Dict[str, Any]]) -> str:
+    def _assess_technical_capability(self, analytics: Dict[str, Any]) -> str:
         """Assess overall technical capability"""
-        technical_scores = []
+        avg_score = analytics['familyAverages']['technical']
         
-        for result in grading_results:
-            if 'technical' in result.get('feedback', '').lower() or 'concept' in result.get('feedback', '').lower():
-                score = result.get('score', 0) / result.get('maxScore', 1)
-                technical_scores.append(score)
-        
-        if not technical_scores:
+        if avg_score is None:
             return "Unable to assess technical capability from available data"
         
-        avg_score = sum(technical_scores) / len(technical_scores)
-        
         if avg_score >= 0.9:
             return "Exceptional technical knowledge and understanding"
         elif avg_score >= 0.8:
@@ -184,20 +218,13 @@ class ReportGenerator:
         else:
             return "Limited technical capability requiring significant improvement"
     
-    def _assess_problem_solving(self, grading_results: List[Dict[str, Any]]) -> str:
+    def _assess_problem_solving(self, analytics: Dict[str, Any]) -> str:
         """Assess problem-solving skills"""
-        problem_solving_indicators = []
+        avg_score = analytics['familyAverages']['problemSolving']
         
-        for result in grading_results:
-            feedback = result.get('feedback', '').lower()
-            if any(term in feedback for term in ['approach', 'methodology', 'solution', 'problem-solving', 'logic']):
-                problem_solving_indicators.append(result.get('score', 0) / result.get('maxScore', 1))
-        
-        if not problem_solving_indicators:
+        if avg_score is None:
             return "Unable to assess problem-solving skills from available data"
         
-        avg_score = sum(problem_solving_indicators) / len(problem_solving_indicators)
-        
         if avg_score >= 0.9:
             return "Excellent problem-solving methodology and logical thinking"
         elif avg_score >= 0.8:
@@ -209,20 +236,13 @@ class ReportGenerator:
         else:
             return "Limited problem-solving skills needing significant improvement"
     
-    def _assess_communication(self, grading_results: List[Dict[str, Any]]) -> str:
+    def _assess_communication(self, analytics: Dict[str, Any]) -> str:
         """Assess communication skills"""
-        communication_indicators = []
+        avg_score = analytics['familyAverages']['communication']
         
-        for result in grading_results:
-            feedback = result.get('feedback', '').lower()
-            if any(term in feedback for term in ['clear', 'explanation', 'communication', 'articulate', 'well-written']):
-                communication_indicators.append(result.get('score', 0) / result.get('maxScore', 1))
-        
-        if not communication_indicators:
+        if avg_score is None:
             return "Unable to assess communication skills from available data"
         
-        avg_score = sum(communication_indicators) / len(communication_indicators)
-        
         if avg_score >= 0.9:
             return "Exceptional communication with clear, articulate explanations"
         elif avg_score >= 0.8:
@@ -0,0 +1,257 @@
+# python/report_writer.py - Write-behind persistence of exam reports through a durable spool
+import atexit
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Any, Optional
+
+from serialization import encode_report_content
+
+DEFAULT_SPOOL_PATH = os.path.join(tempfile.gettempdir(), 'cloudhire_report_spool.sqlite')
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_LEASE_SECONDS = 60.0
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 120.0
+
+_writer_lock = threading.Lock()
+_default_writer = None
+
+def write_behind_enabled() -> bool:
+    return os.getenv('REPORT_WRITE_BEHIND', 'true').lower() not in ('0', 'false', 'no')
+
+class ReportWriter:
+    """
+    Queues reports in a SQLite spool and inserts them into the Report table in batches
+    on a background thread
+
+    Delivery is at-least-once: a spooled report survives process exit and is flushed by
+    the next writer opened on the same spool. Use ':memory:' for a non-durable in-process queue.
+    """
+
+    def __init__(self, spool_path: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """
+        Args:
+            spool_path: SQLite spool file (env: REPORT_SPOOL_PATH), or ':memory:'
+            batch_size: Reports inserted per database request
+            flush_interval: Seconds between background flushes
+            max_attempts: Failed inserts before a report is marked failed and left in the spool
+            lease_seconds: How long a batch being flushed stays invisible to other writers
+        """
+        self.spool_path = spool_path or os.getenv('REPORT_SPOOL_PATH', DEFAULT_SPOOL_PATH)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.flushed = 0
+        self.failures = 0
+
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._conn = sqlite3.connect(self.spool_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if self.spool_path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS report_spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ref TEXT NOT NULL UNIQUE,
+                user_id TEXT NOT NULL,
+                exam_key TEXT,
+                content TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_expires_at REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS report_spool_due ON report_spool (status, available_at)"
+        )
+        # Spools created before reports were keyed by exam
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(report_spool)")}
+        if 'exam_key' not in columns:
+            self._conn.execute("ALTER TABLE report_spool ADD COLUMN exam_key TEXT")
+
+    def submit(self, user_id: str, report: Dict[str, Any], content: Optional[str] = None,
+               exam_key: Optional[str] = None) -> str:
+        """
+        Spool a report for insertion and return immediately
+
+        Args:
+            user_id: Report owner
+            report: Report to store
+            content: Pre-serialized report content (defaults to encode_report_content(report))
+            exam_key: Exam identity (see report_generator.report_exam_key); the stored report
+                for that exam is replaced, and an older one still pending here is dropped
+
+        Returns:
+            Reference id for the spooled report
+        """
+        ref = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            if exam_key is not None:
+                self._conn.execute("DELETE FROM report_spool WHERE exam_key = ? AND status = 'pending'", (exam_key,))
+            self._conn.execute(
+                "INSERT INTO report_spool (ref, user_id, exam_key, content, available_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (ref, str(user_id), exam_key, content if content is not None else encode_report_content(report), now, now)
+            )
+        self._ensure_thread()
+        if self.pending() >= self.batch_size:
+            self._wake.set()
+        return ref
+
+    def flush(self, max_batches: Optional[int] = None) -> int:
+        """
+        Insert due reports in batches until none remain or a batch fails
+
+        Returns:
+            Number of reports inserted
+        """
+        inserted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = self._claim_batch()
+            if not rows:
+                break
+            batches += 1
+            if not self._insert_batch(rows):
+                break
+            inserted += len(rows)
+        return inserted
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM report_spool WHERE status != 'failed'"
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM report_spool GROUP BY status"
+            ).fetchall())
+        return {
+            'pending': counts.get('pending', 0) + counts.get('flushing', 0),
+            'failed': counts.get('failed', 0),
+            'flushed': self.flushed,
+            'failures': self.failures
+        }
+
+    def close(self, timeout: float = 10.0):
+        """Stop the background thread and flush whatever is still due"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Report spool flush on close failed: {e}")
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name='report-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Report spool flush failed: {e}")
+
+    def _claim_batch(self) -> List[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("""
+                    SELECT * FROM report_spool
+                    WHERE (status = 'pending' AND available_at <= ?)
+                       OR (status = 'flushing' AND lease_expires_at <= ?)
+                    ORDER BY available_at, id
+                    LIMIT ?
+                """, (now, now, self.batch_size)).fetchall()
+                self._conn.executemany(
+                    "UPDATE report_spool SET status = 'flushing', lease_expires_at = ? WHERE id = ?",
+                    [(now + self.lease_seconds, row['id']) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _insert_batch(self, rows: List[sqlite3.Row]) -> bool:
+        from db_operations import insert_reports
+
+        try:
+            # The newest report per exam wins; one upsert may not touch a key twice
+            latest: Dict[Any, sqlite3.Row] = {}
+            for row in rows:
+                latest[row['exam_key'] if row['exam_key'] is not None else ('row', row['id'])] = row
+            insert_reports([{'user_id': row['user_id'], 'content': row['content'], 'exam_key': row['exam_key']}
+                            for row in latest.values()])
+        except Exception as e:
+            self._release(rows, str(e))
+            return False
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM report_spool WHERE id = ?", [(row['id'],) for row in rows])
+            self.flushed += len(rows)
+        return True
+
+    def _release(self, rows: List[sqlite3.Row], error: str):
+        """Return a failed batch to the spool with jittered exponential backoff"""
+        now = time.time()
+        with self._lock:
+            self.failures += 1
+            for row in rows:
+                attempts = row['attempts'] + 1
+                if attempts >= self.max_attempts:
+                    self._conn.execute(
+                        "UPDATE report_spool SET status = 'failed', attempts = ?, last_error = ?, lease_expires_at = NULL WHERE id = ?",
+                        (attempts, error, row['id'])
+                    )
+                    continue
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+                self._conn.execute(
+                    "UPDATE report_spool SET status = 'pending', attempts = ?, available_at = ?, last_error = ?, lease_expires_at = NULL WHERE id = ?",
+                    (attempts, now + random.uniform(delay / 2, delay), error, row['id'])
+                )
+        print(f"Report insert failed, {len(rows)} reports kept in spool: {error}")
+
+def get_default_report_writer() -> ReportWriter:
+    """Get the process-wide report writer, flushed on interpreter exit"""
+    global _default_writer
+    with _writer_lock:
+        if _default_writer is None:
+            _default_writer = ReportWriter(
+                batch_size=int(os.getenv('REPORT_WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+                flush_interval=float(os.getenv('REPORT_WRITE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+            )
+            atexit.register(_default_writer.close)
+            if _default_writer.pending():
+                # Reports left behind by an earlier process
+                _default_writer._ensure_thread()
+        return _default_writer
@@ -0,0 +1,256 @@
+# python/response_parser.py - Tolerant extraction and validation of JSON in LLM responses
+import json
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+
+from metrics import metrics
+
+MAX_RECORDED_FAILURES = 50
+SNIPPET_LENGTH = 200
+
+_NUMBER = re.compile(r'[-+]?\d+(?:\.\d+)?')
+_FRACTION = re.compile(r'(?P<score>[-+]?\d+(?:\.\d+)?)\s*(?:/|out of)\s*(?P<scale>\d+(?:\.\d+)?)', re.IGNORECASE)
+_SCORE_LINE = re.compile(
+    r'^\W*(?:score\W*)?(?P<score>[-+]?\d+(?:\.\d+)?)(?:\s*(?:/|out of)\s*(?P<scale>\d+(?:\.\d+)?))?\s*(?:points?)?\s*[:\-–—|,.]?\s*(?P<feedback>.*)$',
+    re.IGNORECASE | re.DOTALL
+)
+
+class ResponseParseError(ValueError):
+    """Raised when a model response holds no usable grading result"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+class ParseStats:
+    """Thread-safe counters and a bounded log of recent parse failures"""
+
+    def __init__(self, max_failures: int = MAX_RECORDED_FAILURES):
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.recovered = 0
+        self.failures: Dict[str, int] = {}
+        self.recent_failures = deque(maxlen=max_failures)
+
+    def record_success(self, recovered: bool = False):
+        with self._lock:
+            self.parsed += 1
+            if recovered:
+                self.recovered += 1
+
+    def record_failure(self, reason: str, text: str, context: str = 'grading'):
+        with self._lock:
+            self.failures[reason] = self.failures.get(reason, 0) + 1
+            self.recent_failures.append({'reason': reason, 'context': context, 'snippet': text[:SNIPPET_LENGTH]})
+        metrics.inc('grading_parse_failures', exam_key='parseFailures', reason=reason, context=context)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failed = sum(self.failures.values())
+            total = self.parsed + failed
+            return {
+                'parsed': self.parsed,
+                'recovered': self.recovered,
+                'failed': failed,
+                'failureReasons': dict(self.failures),
+                'failureRate': failed / total if total else 0.0,
+                'recentFailures': list(self.recent_failures)
+            }
+
+parse_stats = ParseStats()
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith('```'):
+        newline = text.find('\n')
+        text = text[newline + 1:] if newline != -1 else text[3:]
+    if text.endswith('```'):
+        text = text[:-3]
+    return text.strip()
+
+def extract_json(text: str, expected: type = dict) -> Tuple[Any, bool]:
+    """
+    Find the first JSON value of the expected type in a model response
+
+    Tries the whole (fence-stripped) text first, then decodes from each opening brace
+    or bracket in turn, so the first complete value embedded in prose is found.
+
+    Returns:
+        (value, recovered) where recovered is True when prose had to be skipped
+
+    Raises:
+        ResponseParseError: If no decodable value of the expected type is present
+    """
+    cleaned = _strip_fences(text)
+    try:
+        value = json.loads(cleaned)
+        if isinstance(value, expected):
+            return value, False
+    except json.JSONDecodeError:
+        pass
+
+    opener = '[' if expected is list else '{'
+    decoder = json.JSONDecoder()
+    position = cleaned.find(opener)
+    if position == -1:
+        raise ResponseParseError(f"No JSON {expected.__name__} found in response", 'no_json')
+    while position != -1:
+        # raw_decode stops at the end of the first complete value, ignoring trailing prose
+        try:
+            value, _ = decoder.raw_decode(cleaned, position)
+            if isinstance(value, expected):
+                return value, True
+        except json.JSONDecodeError:
+            pass
+        position = cleaned.find(opener, position + 1)
+    raise ResponseParseError(f"Invalid JSON {expected.__name__} in response", 'invalid_json')
+
+def coerce_number(value: Any, max_points: Optional[float] = None) -> Optional[float]:
+    """
+    Numbers pass through; numeric strings such as '8' or '8.5' become their leading number
+
+    A fraction such as '8/10' or '8 out of 10' is a ratio: it is scaled to max_points
+    when given and kept on its own scale otherwise. A zero denominator is unparseable.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        fraction = _FRACTION.search(value)
+        if fraction:
+            return _scale_fraction(fraction.group('score'), fraction.group('scale'), max_points)
+        match = _NUMBER.search(value)
+        if match:
+            return _as_number(float(match.group()))
+    return None
+
+def _scale_fraction(score: str, scale: str, max_points: Optional[float]) -> Optional[float]:
+    numerator, denominator = float(score), float(scale)
+    if denominator == 0:
+        return None
+    if max_points is None:
+        return _as_number(numerator)
+    return _as_number(round(numerator / denominator * max_points, 2))
+
+def _as_number(number: float) -> float:
+    return int(number) if number.is_integer() else number
+
+def _string_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, list):
+        return [str(item) for item in value if item is not None and str(item).strip()]
+    return [str(value)]
+
+def validate_grading_result(result: Any, max_points: float) -> Dict[str, Any]:
+    """
+    Check a decoded grading object against the grading schema
+
+    score (number or numeric string) and feedback (string) are required; strengths and
+    improvements are normalized to lists of strings. A fractional score ("8/10") is
+    scaled to the question's points, the score is clamped to them and maxScore is
+    set from them.
+
+    Raises:
+        ResponseParseError: If the object does not satisfy the schema
+    """
+    if not isinstance(result, dict):
+        raise ResponseParseError("Grading result is not a JSON object", 'not_object')
+
+    for field in ('score', 'feedback'):
+        if field not in result:
+            raise ResponseParseError(f"Missing required field: {field}", f"missing_{field}")
+
+    score = coerce_number(result['score'], max_points)
+    if score is None:
+        raise ResponseParseError(f"Score is not numeric: {result['score']!r}", 'invalid_score')
+    if not isinstance(result['feedback'], str):
+        result['feedback'] = '' if result['feedback'] is None else str(result['feedback'])
+
+    result['score'] = max(0, min(score, max_points))
+    result['maxScore'] = max_points
+    result['strengths'] = _string_list(result.get('strengths'))
+    result['improvements'] = _string_list(result.get('improvements'))
+    return result
+
+def parse_grading_result(text: str, max_points: float, context: str = 'grading') -> Dict[str, Any]:
+    """
+    Extract and validate a single grading object, counting the outcome in parse_stats
+
+    Raises:
+        ResponseParseError: If the response holds no valid grading object
+    """
+    try:
+        value, recovered = extract_json(text, dict)
+        result = validate_grading_result(value, max_points)
+    except ResponseParseError as e:
+        parse_stats.record_failure(e.reason, text, context)
+        raise
+    parse_stats.record_success(recovered)
+    return result
+
+def parse_grading_array(text: str, context: str = 'batch') -> List[Any]:
+    """
+    Extract the JSON array from a batch grading response
+
+    Accepts a bare array or an object wrapping it under "results" (as JSON mode returns).
+
+    Raises:
+        ResponseParseError: If no array is present
+    """
+    try:
+        try:
+            value, recovered = extract_json(text, list)
+        except ResponseParseError:
+            wrapper, recovered = extract_json(text, dict)
+            value = wrapper.get('results')
+            if not isinstance(value, list):
+                raise ResponseParseError("Batch response has no results array", 'no_array')
+    except ResponseParseError as e:
+        parse_stats.record_failure(e.reason, text, context)
+        raise
+    parse_stats.record_success(recovered)
+    return value
+
+def parse_score_feedback(text: str, max_points: Optional[float] = None) -> Tuple[float, str]:
+    """
+    Parse a short "score: feedback" completion
+
+    Accepts a JSON object with score and feedback, or a leading score in forms like
+    "8: ...", "Score: 8/10 - ..." or "8 points. ...". Fractional scores are scaled to
+    max_points when it is given (see coerce_number).
+
+    Raises:
+        ResponseParseError: If no score can be found
+    """
+    try:
+        value, recovered = extract_json(text, dict)
+        if 'score' in value:
+            score = coerce_number(value['score'], max_points)
+            if score is not None:
+                parse_stats.record_success(recovered)
+                return score, str(value.get('feedback', '')).strip()
+    except ResponseParseError:
+        pass
+
+    match = _SCORE_LINE.match(_strip_fences(text))
+    if match is None:
+        parse_stats.record_failure('no_score', text, 'score_feedback')
+        raise ResponseParseError("No score found in response", 'no_score')
+    if match.group('scale') is not None:
+        score = _scale_fraction(match.group('score'), match.group('scale'), max_points)
+        if score is None:
+            parse_stats.record_failure('invalid_score', text, 'score_feedback')
+            raise ResponseParseError(f"Invalid score in response: {match.group(0)[:40]!r}", 'invalid_score')
+    else:
+        score = _as_number(float(match.group('score')))
+    parse_stats.record_success(recovered=True)
+    return score, match.group('feedback').strip()
+
+def get_parse_stats() -> Dict[str, Any]:
+    return parse_stats.stats()
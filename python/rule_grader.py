@@ -0,0 +1,118 @@
+# python/rule_grader.py - Deterministic grading for multiple-choice and numeric questions
+import math
+import os
+import re
+from typing import Dict, Any, Optional
+
+DEFAULT_REL_TOLERANCE = 0.01
+DEFAULT_ABS_TOLERANCE = 1e-9
+NUMERIC_TYPES = ('calculation', 'calculations', 'numerical')
+OPTION_LETTERS = 'abcdefgh'
+
+_NUMBER_PATTERN = re.compile(r'[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)?(?:\.\d+)?(?:[eE][-+]?\d+)?')
+
+def explanation_requested(question: Dict[str, Any]) -> bool:
+    """Whether the question asks for written feedback that only the LLM can provide"""
+    if os.getenv('GRADING_ALWAYS_EXPLAIN', 'false').lower() in ('1', 'true', 'yes'):
+        return True
+    return bool(question.get('requireExplanation'))
+
+def parse_number(text: Any) -> Optional[float]:
+    """Extract the first number from an answer such as "1,250.5 MPa" or "3.2e-4" """
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text)
+    if not isinstance(text, str):
+        return None
+    for match in _NUMBER_PATTERN.finditer(text):
+        token = match.group(0)
+        if any(ch.isdigit() for ch in token):
+            try:
+                return float(token.replace(',', ''))
+            except ValueError:
+                continue
+    return None
+
+class RuleBasedGrader:
+    """Scores questions with a known answer exactly, without calling the LLM"""
+
+    def __init__(self, rel_tolerance: Optional[float] = None, abs_tolerance: Optional[float] = None):
+        """
+        Args:
+            rel_tolerance: Relative tolerance for numeric answers (env: GRADING_NUMERIC_REL_TOLERANCE)
+            abs_tolerance: Absolute tolerance for numeric answers (env: GRADING_NUMERIC_ABS_TOLERANCE)
+        """
+        self.rel_tolerance = rel_tolerance if rel_tolerance is not None else float(
+            os.getenv('GRADING_NUMERIC_REL_TOLERANCE', DEFAULT_REL_TOLERANCE))
+        self.abs_tolerance = abs_tolerance if abs_tolerance is not None else float(
+            os.getenv('GRADING_NUMERIC_ABS_TOLERANCE', DEFAULT_ABS_TOLERANCE))
+
+    def grade(self, question: Dict[str, Any], answer: str) -> Optional[Dict[str, Any]]:
+        """
+        Grade a question deterministically
+
+        Args:
+            question: Question data including type, points and the known answer
+            answer: Student's answer
+
+        Returns:
+            Grading result, or None when the question has no deterministic answer
+        """
+        question_type = question.get('type')
+        if question_type == 'multiple-choice' and question.get('correctAnswer') not in (None, ''):
+            return self._grade_multiple_choice(question, answer)
+        if question_type in NUMERIC_TYPES:
+            expected = parse_number(question.get('answerNumerical', question.get('answer_numerical')))
+            if expected is not None:
+                return self._grade_numeric(question, answer, expected)
+        return None
+
+    def _grade_multiple_choice(self, question: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        max_score = question.get('points', 0)
+        correct_answer = str(question['correctAnswer'])
+        accepted = self._accepted_choices(correct_answer, question.get('options') or [])
+        is_correct = self._normalize(answer) in accepted
+
+        return self._result(
+            max_score if is_correct else 0,
+            max_score,
+            "Correct!" if is_correct else f"Incorrect. The correct answer was: {correct_answer}",
+            is_correct
+        )
+
+    def _grade_numeric(self, question: Dict[str, Any], answer: str, expected: float) -> Dict[str, Any]:
+        max_score = question.get('points', 0)
+        submitted = parse_number(answer)
+        is_correct = submitted is not None and math.isclose(
+            submitted, expected, rel_tol=self.rel_tolerance, abs_tol=self.abs_tolerance)
+
+        if submitted is None:
+            feedback = f"No numeric answer found. The expected answer was: {expected:g}"
+        elif is_correct:
+            feedback = "Correct!"
+        else:
+            feedback = f"Incorrect. The expected answer was: {expected:g}"
+
+        return self._result(max_score if is_correct else 0, max_score, feedback, is_correct)
+
+    def _accepted_choices(self, correct_answer: str, options: list) -> set:
+        """Accept the correct option either by its text or by its letter"""
+        normalized = self._normalize(correct_answer)
+        accepted = {normalized}
+        option_texts = [self._normalize(option) for option in options]
+        if len(normalized) == 1 and normalized in OPTION_LETTERS[:len(option_texts)]:
+            accepted.add(option_texts[OPTION_LETTERS.index(normalized)])
+        elif normalized in option_texts:
+            accepted.add(OPTION_LETTERS[option_texts.index(normalized)])
+        return accepted
+
+    def _normalize(self, value: Any) -> str:
+        return ' '.join(str(value).split()).casefold()
+
+    def _result(self, score: float, max_score: float, feedback: str, is_correct: bool) -> Dict[str, Any]:
+        return {
+            'score': score,
+            'maxScore': max_score,
+            'feedback': feedback,
+            'strengths': ["Correct answer"] if is_correct else [],
+            'improvements': [] if is_correct else ["Review the underlying concept for this question"]
+        }
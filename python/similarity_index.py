@@ -0,0 +1,253 @@
+# python/similarity_index.py - MinHash/LSH index of free-response answers for copy detection and grade reuse
+import hashlib
+import os
+import random
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_COPY_THRESHOLD = 0.8
+DEFAULT_REUSE_THRESHOLD = 0.95
+DEFAULT_MAX_PER_QUESTION = 1000
+# Bound on answers held across all questions; each costs about 1KB, plus its shingles when it carries a grade
+DEFAULT_MAX_ENTRIES = 5000
+# Answers shorter than this many words are too generic to call copies
+MIN_WORDS = 8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 64) - 1
+_WORD = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+
+_default_index: Optional['SimilarityIndex'] = None
+_default_index_lock = threading.Lock()
+
+def shingle(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> Set[int]:
+    """
+    Hashed word n-grams of an answer
+
+    Case, punctuation and whitespace are ignored. Hashes are stable across processes
+    (unlike hash()), so signatures can be compared between workers.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[start:start + size]) for start in range(len(words) - size + 1)]
+    return {int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big') for gram in grams}
+
+def jaccard(first: Set[int], second: Set[int]) -> float:
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+class MinHasher:
+    """MinHash signatures from a fixed, seeded family of universal hash functions"""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        generator = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (generator.randrange(1, _MERSENNE_PRIME), generator.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: Set[int]) -> array:
+        """Signature as a compact array of unsigned 64-bit minima"""
+        if not shingles:
+            return array('Q', [_MAX_HASH] * self.num_perm)
+        return array('Q', (
+            min((a * value + b) % _MERSENNE_PRIME for value in shingles)
+            for a, b in self.permutations
+        ))
+
+def estimate_similarity(first: array, second: array) -> float:
+    """Estimated Jaccard similarity: the fraction of matching signature positions"""
+    return sum(1 for left, right in zip(first, second) if left == right) / len(first)
+
+class AnswerSketch:
+    """Shingles and MinHash signature of one answer, computed once and shared by lookups and add"""
+    __slots__ = ('shingles', 'signature')
+
+    def __init__(self, shingles: Set[int], signature: array):
+        self.shingles = shingles
+        self.signature = signature
+
+class _Entry:
+    __slots__ = ('shingles', 'signature', 'grade', 'question_fingerprint')
+
+    def __init__(self, shingles: Optional[Set[int]], signature: array, grade: Optional[Dict[str, Any]],
+                 question_fingerprint: Optional[str]):
+        self.shingles = shingles
+        self.signature = signature
+        self.grade = grade
+        self.question_fingerprint = question_fingerprint
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing over MinHash signatures for one question
+
+    The signature is split into bands; answers sharing any whole band land in the same
+    bucket, so likely duplicates are found without comparing against every answer.
+    Entries are evicted oldest first beyond max_entries.
+    """
+
+    def __init__(self, hasher: MinHasher, bands: int = DEFAULT_BANDS, max_entries: int = DEFAULT_MAX_PER_QUESTION):
+        if hasher.num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.hasher = hasher
+        self.bands = bands
+        self.rows = hasher.num_perm // bands
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self.buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def _band_keys(self, signature: array) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: str, entry: _Entry) -> List[str]:
+        """Add an entry, returning the keys evicted to stay within max_entries"""
+        self.remove(key)
+        self.entries[key] = entry
+        for band, band_key in self._band_keys(entry.signature):
+            self.buckets[band].setdefault(band_key, set()).add(key)
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(next(iter(self.entries)))
+            self.remove(evicted[-1])
+        return evicted
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for band, band_key in self._band_keys(entry.signature):
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def candidates(self, signature: array) -> Set[str]:
+        keys: Set[str] = set()
+        for band, band_key in self._band_keys(signature):
+            keys.update(self.buckets[band].get(band_key, ()))
+        return keys
+
+class SimilarityIndex:
+    """
+    Per-question near-duplicate index of free-response answers
+
+    Answers are keyed by candidate (userId). Callers sketch an answer once and pass the
+    sketch to every lookup and to add. Candidates found through LSH are confirmed with the
+    estimated similarity, and a stored grade is only reused after the exact shingle
+    Jaccard similarity clears reuse_threshold for the same question version, so shingles
+    are only kept for entries that carry a grade. The oldest answers are evicted once
+    max_entries are held across all questions.
+    """
+
+    def __init__(self, copy_threshold: Optional[float] = None, reuse_threshold: Optional[float] = None,
+                 num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS, max_per_question: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        """
+        Args:
+            copy_threshold: Similarity at which answers are flagged as copies (env: SIMILARITY_COPY_THRESHOLD)
+            reuse_threshold: Exact similarity required to reuse a grade (env: SIMILARITY_REUSE_THRESHOLD)
+            num_perm: MinHash signature length
+            bands: LSH bands; num_perm / bands rows each
+            max_per_question: Answers kept per question (env: SIMILARITY_MAX_PER_QUESTION)
+            max_entries: Answers kept across all questions (env: SIMILARITY_MAX_ENTRIES)
+        """
+        self.copy_threshold = copy_threshold or float(os.getenv('SIMILARITY_COPY_THRESHOLD', DEFAULT_COPY_THRESHOLD))
+        self.reuse_threshold = reuse_threshold or float(os.getenv('SIMILARITY_REUSE_THRESHOLD', DEFAULT_REUSE_THRESHOLD))
+        self.max_per_question = max_per_question or int(os.getenv('SIMILARITY_MAX_PER_QUESTION', DEFAULT_MAX_PER_QUESTION))
+        self.max_entries = max_entries or int(os.getenv('SIMILARITY_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        self._questions: Dict[str, LSHIndex] = {}
+        # (question id, key) of every entry, oldest first, for the global bound
+        self._order: 'OrderedDict[Tuple[str, str], None]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sketch(self, answer: str) -> Optional[AnswerSketch]:
+        """Shingle and sign an answer, or None when it is too short to compare"""
+        if len(_WORD.findall(answer.lower())) < MIN_WORDS:
+            return None
+        shingles = shingle(answer)
+        return AnswerSketch(shingles, self.hasher.signature(shingles))
+
+    def add(self, question_id: Any, key: Any, sketch: AnswerSketch, grade: Optional[Dict[str, Any]] = None,
+            question_fingerprint: Optional[str] = None):
+        """Index one candidate's sketched answer, replacing their previous answer to the question"""
+        question_id, key = str(question_id), str(key)
+        entry = _Entry(sketch.shingles if grade is not None else None, sketch.signature, grade, question_fingerprint)
+        with self._lock:
+            index = self._questions.get(question_id)
+            if index is None:
+                index = self._questions[question_id] = LSHIndex(self.hasher, self.bands, self.max_per_question)
+            for evicted in index.add(key, entry):
+                self._order.pop((question_id, evicted), None)
+            self._order.pop((question_id, key), None)
+            self._order[(question_id, key)] = None
+            while len(self._order) > self.max_entries:
+                oldest_question, oldest_key = self._order.popitem(last=False)[0]
+                oldest_index = self._questions[oldest_question]
+                oldest_index.remove(oldest_key)
+                if not oldest_index.entries:
+                    del self._questions[oldest_question]
+
+    def find_duplicates(self, question_id: Any, sketch: AnswerSketch, exclude: Any = None) -> List[Tuple[str, float]]:
+        """Indexed answers to the question at or above copy_threshold, most similar first"""
+        matches = self._matches(question_id, sketch, exclude)
+        return [(key, round(similarity, 3)) for key, similarity, _ in matches]
+
+    def find_reusable_grade(self, question_id: Any, sketch: AnswerSketch, question_fingerprint: Optional[str] = None,
+                            exclude: Any = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Grade of a verified near-identical answer to the same question version
+
+        Returns:
+            (key of the matched answer, a copy of its grade), or None
+        """
+        for key, _, entry in self._matches(question_id, sketch, exclude):
+            if entry.grade is None or entry.question_fingerprint != question_fingerprint:
+                continue
+            if jaccard(sketch.shingles, entry.shingles) >= self.reuse_threshold:
+                return key, dict(entry.grade)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'questions': len(self._questions), 'answers': len(self._order)}
+
+    def _matches(self, question_id: Any, sketch: AnswerSketch, exclude: Any) -> List[Tuple[str, float, _Entry]]:
+        exclude = None if exclude is None else str(exclude)
+        with self._lock:
+            index = self._questions.get(str(question_id))
+            if index is None:
+                return []
+            matches = []
+            for key in index.candidates(sketch.signature):
+                if key == exclude:
+                    continue
+                entry = index.entries[key]
+                similarity = estimate_similarity(sketch.signature, entry.signature)
+                if similarity >= self.copy_threshold:
+                    matches.append((key, similarity, entry))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Process-wide answer index, or None unless SIMILARITY_INDEX_ENABLED is set (default off)"""
+    global _default_index
+    if os.getenv('SIMILARITY_INDEX_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = SimilarityIndex()
+        return _default_index
@@ -0,0 +1,128 @@
+# python/tests/test_circuit_breaker.py
+from types import SimpleNamespace
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+def make_breaker(**settings) -> CircuitBreaker:
+    defaults = dict(window=4, min_calls=4, failure_rate=0.5, slow_call_seconds=1.0, slow_call_rate=0.75,
+                    open_seconds=30.0, half_open_calls=2, enabled=True)
+    return CircuitBreaker(**{**defaults, **settings})
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+def test_opens_at_failure_rate(clock):
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.stats()['rejected'] == 1
+
+def test_opens_on_slow_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_success(2.0)
+    breaker.record_success(0.1)
+    assert breaker.state == OPEN
+
+def test_half_open_probes_close_the_breaker(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['calls'] == 0
+
+@pytest.mark.parametrize('outcome', ['failure', 'slow'])
+def test_half_open_failure_or_slow_probe_reopens(clock, outcome):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    if outcome == 'failure':
+        breaker.record_failure()
+    else:
+        breaker.record_success(5.0)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+def test_ignored_probe_frees_its_slot(clock):
+    breaker = make_breaker(half_open_calls=1)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_ignored()
+    assert breaker.allow_request()
+
+def test_lost_probes_do_not_wedge_half_open(clock):
+    breaker = make_breaker(half_open_calls=1)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request()
+
+def test_explicit_zero_settings_override_environment(clock, monkeypatch):
+    monkeypatch.setenv('XAI_BREAKER_OPEN_SECONDS', '60')
+    monkeypatch.setenv('XAI_BREAKER_MIN_CALLS', '10')
+    breaker = make_breaker(open_seconds=0, min_calls=0, failure_rate=0.5)
+    assert breaker.open_seconds == 0
+    assert breaker.min_calls == 0
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+
+def test_half_open_calls_is_at_least_one(clock):
+    assert make_breaker(half_open_calls=0).half_open_calls == 1
+
+def test_disabled_breaker_allows_everything(clock):
+    breaker = make_breaker(enabled=False)
+    open_breaker(breaker)
+    assert breaker.allow_request()
+
+def test_listeners_see_transitions_and_errors_are_contained(clock):
+    breaker = make_breaker()
+    seen = []
+    breaker.add_listener(lambda previous, state: seen.append((previous, state)))
+    breaker.add_listener(lambda previous, state: 1 / 0)
+    open_breaker(breaker)
+    clock.now += 30
+    breaker.allow_request()
+    assert seen == [(CLOSED, OPEN), (OPEN, HALF_OPEN)]
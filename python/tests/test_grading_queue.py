@@ -0,0 +1,120 @@
+# python/tests/test_grading_queue.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import grading_queue
+from grading_queue import GradingQueue, GradingQueueError, LeaseKeeper, queue_backend
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(grading_queue, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = GradingQueue(str(tmp_path / 'queue.sqlite'), lease_seconds=60, max_attempts=3)
+    yield queue
+    queue.close()
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue('a1')
+    assert not queue.enqueue('a1')
+    assert queue.stats() == {'queued': 1}
+
+def test_claim_leases_job_to_one_worker(queue):
+    queue.enqueue('a1')
+    job = queue.claim('w1')
+    assert job['answer_id'] == 'a1'
+    assert job['attempts'] == 1
+    assert queue.claim('w2') is None
+
+def test_ack_marks_done(queue):
+    queue.enqueue('a1')
+    job = queue.claim('w1')
+    assert queue.ack(job['id'], 'w1')
+    assert queue.stats() == {'done': 1}
+    assert not queue.enqueue('a1')
+
+def test_expired_lease_is_reclaimed_and_stale_worker_is_fenced(queue, clock):
+    queue.enqueue('a1')
+    job = queue.claim('w1')
+    clock.now += 61
+    reclaimed = queue.claim('w2')
+    assert reclaimed['id'] == job['id']
+    assert reclaimed['attempts'] == 2
+    assert not queue.ack(job['id'], 'w1')
+    assert not queue.nack(job['id'], 'w1', job['attempts'], 'late')
+    assert queue.renew([job['id']], 'w1') == 0
+    assert queue.ack(reclaimed['id'], 'w2')
+
+def test_renew_extends_lease(queue, clock):
+    queue.enqueue('a1')
+    job = queue.claim('w1')
+    clock.now += 50
+    assert queue.renew([job['id']], 'w1') == 1
+    clock.now += 50
+    assert queue.claim('w2') is None
+    assert queue.renew([], 'w1') == 0
+
+def test_nack_retries_after_backoff(queue, clock, monkeypatch):
+    monkeypatch.setattr(grading_queue, 'retry_delay', lambda attempts: 10.0)
+    queue.enqueue('a1')
+    job = queue.claim('w1')
+    assert queue.nack(job['id'], 'w1', job['attempts'], 'timeout')
+    assert queue.claim('w1') is None
+    clock.now += 10
+    assert queue.claim('w1')['attempts'] == 2
+
+def test_nack_on_final_attempt_fails_job_and_enqueue_revives_it(queue, clock):
+    queue.enqueue('a1')
+    job = queue.claim('w1')
+    assert queue.nack(job['id'], 'w1', 3, 'bad answer')
+    assert queue.stats() == {'failed': 1}
+    assert queue.enqueue('a1')
+    assert queue.claim('w1')['attempts'] == 1
+
+def test_lease_expiring_on_final_attempt_fails_job(queue, clock):
+    queue.enqueue('a1')
+    for _ in range(3):
+        assert queue.claim('w1') is not None
+        clock.now += 61
+    assert queue.claim('w1') is None
+    assert queue.stats() == {'failed': 1}
+
+def test_retry_delay_is_bounded():
+    for attempts in (1, 2, 5, 30):
+        delay = grading_queue.retry_delay(attempts)
+        assert 0 < delay <= grading_queue.RETRY_MAX_DELAY
+
+def test_queue_backend(monkeypatch):
+    monkeypatch.delenv('GRADING_QUEUE_BACKEND', raising=False)
+    assert queue_backend() == 'sqlite'
+    monkeypatch.setenv('GRADING_QUEUE_BACKEND', 'supabase')
+    assert queue_backend() == 'supabase'
+    with pytest.raises(GradingQueueError):
+        queue_backend('redis')
+
+def test_lease_keeper_renews_until_exit(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    lease_seconds = 0.3
+    queue = GradingQueue(path, lease_seconds=lease_seconds)
+    try:
+        queue.enqueue('a1')
+        job = queue.claim('w1')
+        with LeaseKeeper(path, [job['id']], 'w1', lease_seconds):
+            time.sleep(lease_seconds * 2)
+            assert queue.claim('w2') is None
+        time.sleep(lease_seconds * 1.5)
+        assert queue.claim('w2')['id'] == job['id']
+    finally:
+        queue.close()
@@ -0,0 +1,92 @@
+# python/tests/test_response_parser.py
+import pytest
+
+from response_parser import (
+    ResponseParseError, coerce_number, extract_json, parse_grading_array, parse_grading_result,
+    parse_score_feedback
+)
+
+def test_extract_json_plain_object():
+    assert extract_json('{"score": 7, "feedback": "ok"}') == ({'score': 7, 'feedback': 'ok'}, False)
+
+def test_extract_json_strips_code_fences():
+    value, recovered = extract_json('```json\n{"score": 7}\n```')
+    assert value == {'score': 7}
+    assert not recovered
+
+def test_extract_json_skips_prose_and_stray_braces():
+    value, recovered = extract_json('Here is {my} grade: {"score": 7, "feedback": "ok"} hope it helps')
+    assert value == {'score': 7, 'feedback': 'ok'}
+    assert recovered
+
+def test_extract_json_expected_list():
+    value, _ = extract_json('Results: [{"index": 0}] done', list)
+    assert value == [{'index': 0}]
+
+@pytest.mark.parametrize('text, reason', [
+    ('no json here', 'no_json'),
+    ('{"score": 7', 'invalid_json'),
+])
+def test_extract_json_failure_reasons(text, reason):
+    with pytest.raises(ResponseParseError) as excinfo:
+        extract_json(text)
+    assert excinfo.value.reason == reason
+
+@pytest.mark.parametrize('value, max_points, expected', [
+    (7, None, 7),
+    (7.5, None, 7.5),
+    ('8', None, 8),
+    ('8.5 points', None, 8.5),
+    ('8/10', 20, 16),
+    ('8 out of 10', 5, 4),
+    ('8/10', None, 8),
+    ('3/0', 10, None),
+    (True, None, None),
+    ('none', None, None),
+    (None, None, None),
+])
+def test_coerce_number(value, max_points, expected):
+    assert coerce_number(value, max_points) == expected
+
+def test_parse_grading_result_normalizes_fields():
+    result = parse_grading_result('{"score": "12", "feedback": null, "strengths": "Clear", "improvements": ["", "More depth"]}', 10)
+    assert result['score'] == 10
+    assert result['maxScore'] == 10
+    assert result['feedback'] == ''
+    assert result['strengths'] == ['Clear']
+    assert result['improvements'] == ['More depth']
+
+def test_parse_grading_result_clamps_negative_score():
+    assert parse_grading_result('{"score": -3, "feedback": "x"}', 10)['score'] == 0
+
+@pytest.mark.parametrize('text, reason', [
+    ('{"feedback": "x"}', 'missing_score'),
+    ('{"score": 5}', 'missing_feedback'),
+    ('{"score": "great", "feedback": "x"}', 'invalid_score'),
+])
+def test_parse_grading_result_schema_errors(text, reason):
+    with pytest.raises(ResponseParseError) as excinfo:
+        parse_grading_result(text, 10)
+    assert excinfo.value.reason == reason
+
+def test_parse_grading_array_accepts_results_wrapper():
+    assert parse_grading_array('{"results": [{"index": 0}, {"index": 1}]}') == [{'index': 0}, {'index': 1}]
+
+def test_parse_grading_array_without_array():
+    with pytest.raises(ResponseParseError) as excinfo:
+        parse_grading_array('{"score": 5}')
+    assert excinfo.value.reason == 'no_array'
+
+@pytest.mark.parametrize('text, max_points, expected', [
+    ('{"score": 8, "feedback": "Good"}', None, (8, 'Good')),
+    ('8: Solid answer', None, (8, 'Solid answer')),
+    ('Score: 8/10 - Solid answer', 5, (4, 'Solid answer')),
+    ('8 points. Solid answer', None, (8, 'Solid answer')),
+])
+def test_parse_score_feedback(text, max_points, expected):
+    assert parse_score_feedback(text, max_points) == expected
+
+@pytest.mark.parametrize('text', ['Solid answer', 'Score: 8/0 - divide by zero'])
+def test_parse_score_feedback_rejects_missing_or_invalid_score(text):
+    with pytest.raises(ResponseParseError):
+        parse_score_feedback(text, 10)
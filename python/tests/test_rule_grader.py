@@ -0,0 +1,73 @@
+# python/tests/test_rule_grader.py
+import pytest
+
+from rule_grader import RuleBasedGrader, explanation_requested, parse_number
+
+MULTIPLE_CHOICE = {
+    'type': 'multiple-choice',
+    'points': 5,
+    'correctAnswer': 'B',
+    'options': ['Steel', 'Aluminium', 'Copper']
+}
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,250.5 MPa', 1250.5),
+    ('3.2e-4', 3.2e-4),
+    ('-12 kN', -12.0),
+    ('about .5', 0.5),
+    (42, 42.0),
+    ('no number', None),
+    (True, None),
+    (None, None),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == expected
+
+@pytest.mark.parametrize('answer', ['B', ' b ', 'Aluminium', 'aluminium'])
+def test_multiple_choice_accepts_letter_or_option_text(answer):
+    result = RuleBasedGrader().grade(MULTIPLE_CHOICE, answer)
+    assert result['score'] == 5
+    assert result['maxScore'] == 5
+    assert result['feedback'] == 'Correct!'
+
+def test_multiple_choice_correct_answer_given_as_text():
+    question = {**MULTIPLE_CHOICE, 'correctAnswer': 'Copper'}
+    assert RuleBasedGrader().grade(question, 'c')['score'] == 5
+
+def test_multiple_choice_wrong_answer():
+    result = RuleBasedGrader().grade(MULTIPLE_CHOICE, 'Steel')
+    assert result['score'] == 0
+    assert result['feedback'] == 'Incorrect. The correct answer was: B'
+    assert result['improvements']
+
+def test_multiple_choice_without_correct_answer_is_left_to_the_llm():
+    assert RuleBasedGrader().grade({**MULTIPLE_CHOICE, 'correctAnswer': ''}, 'B') is None
+
+@pytest.mark.parametrize('answer, score', [
+    ('205 GPa', 10),
+    ('206.9', 10),
+    ('210', 0),
+])
+def test_numeric_answer_within_relative_tolerance(answer, score):
+    question = {'type': 'calculation', 'points': 10, 'answerNumerical': 205}
+    assert RuleBasedGrader(rel_tolerance=0.01).grade(question, answer)['score'] == score
+
+def test_numeric_answer_without_a_number():
+    question = {'type': 'numerical', 'points': 10, 'answer_numerical': '205'}
+    result = RuleBasedGrader().grade(question, 'I am not sure')
+    assert result['score'] == 0
+    assert result['feedback'] == 'No numeric answer found. The expected answer was: 205'
+
+def test_explicit_zero_tolerance_is_honoured():
+    question = {'type': 'calculation', 'points': 10, 'answerNumerical': 1.0}
+    assert RuleBasedGrader(rel_tolerance=0, abs_tolerance=0).grade(question, '1.0000001')['score'] == 0
+
+def test_free_response_is_left_to_the_llm():
+    assert RuleBasedGrader().grade({'type': 'free-response', 'points': 10}, 'An essay') is None
+
+def test_explanation_requested(monkeypatch):
+    monkeypatch.delenv('GRADING_ALWAYS_EXPLAIN', raising=False)
+    assert not explanation_requested({})
+    assert explanation_requested({'requireExplanation': True})
+    monkeypatch.setenv('GRADING_ALWAYS_EXPLAIN', 'true')
+    assert explanation_requested({})
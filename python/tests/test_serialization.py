@@ -0,0 +1,40 @@
+# python/tests/test_serialization.py
+import pytest
+
+from serialization import decode_report_content, encode_report_content, expand_wire, to_wire, wire_format
+
+RESULT = {
+    'answers': [{'questionId': 'q1', 'answer': 'Steel', 'timeSpent': 30}],
+    'userInfo': {'userId': 'u1', 'name': 'Ada'},
+    'gradingResults': [{
+        'questionId': 'q1', 'answer': 'Steel', 'timeSpent': 30,
+        'score': 5, 'maxScore': 5, 'feedback': 'Correct!', 'strengths': [], 'improvements': []
+    }],
+    'totalScore': 5,
+}
+RESULT['report'] = {'userInfo': RESULT['userInfo'], 'summary': 'ok', 'gradingResults': RESULT['gradingResults']}
+
+def test_wire_format_defaults_to_legacy(monkeypatch):
+    monkeypatch.delenv('GRADING_WIRE_FORMAT', raising=False)
+    assert wire_format() == 'legacy'
+    assert wire_format({'wireFormat': 'compact'}) == 'compact'
+    with pytest.raises(ValueError):
+        wire_format({'wireFormat': 'xml'})
+
+def test_legacy_is_unchanged():
+    assert to_wire(RESULT) is RESULT
+
+def test_compact_round_trip():
+    compact = to_wire(RESULT, 'compact')
+    assert 'answer' not in compact['gradingResults'][0]
+    assert 'gradingResults' not in compact['report']
+    assert expand_wire(compact) == RESULT
+
+@pytest.mark.parametrize('compression', ['none', 'gzip'])
+def test_report_content_round_trip(compression):
+    content = encode_report_content(RESULT['report'], compression)
+    assert decode_report_content(content) == RESULT['report']
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        encode_report_content({}, 'brotli')
@@ -0,0 +1,42 @@
+# python/tests/test_similarity_index.py
+from similarity_index import SimilarityIndex, jaccard, shingle
+
+ANSWER = ('The beam fails in shear near the support because the web is too thin, '
+          'so I would add stiffeners and check the bearing capacity again')
+OTHER = ('Thermal expansion of the pipe run is absorbed by an expansion loop, '
+         'and anchors are placed at both ends to control movement')
+
+def test_shingles_ignore_case_and_punctuation():
+    assert shingle('The Beam, fails!') == shingle('the beam fails')
+    assert jaccard(shingle(ANSWER), shingle(ANSWER.upper())) == 1.0
+
+def test_short_answers_are_not_sketched():
+    assert SimilarityIndex().sketch('too short to compare') is None
+
+def test_finds_copied_answer_but_not_a_different_one():
+    index = SimilarityIndex(copy_threshold=0.8)
+    index.add('q1', 'alice', index.sketch(ANSWER))
+    index.add('q1', 'bob', index.sketch(OTHER))
+    duplicates = index.find_duplicates('q1', index.sketch(ANSWER + '.'), exclude='carol')
+    assert [key for key, _ in duplicates] == ['alice']
+    assert index.find_duplicates('q2', index.sketch(ANSWER)) == []
+    assert index.find_duplicates('q1', index.sketch(ANSWER), exclude='alice') == []
+
+def test_reuses_grade_only_for_same_question_version():
+    index = SimilarityIndex()
+    grade = {'score': 8, 'maxScore': 10, 'feedback': 'Good'}
+    index.add('q1', 'alice', index.sketch(ANSWER), grade, 'v1')
+    key, reused = index.find_reusable_grade('q1', index.sketch(ANSWER), 'v1')
+    assert key == 'alice'
+    assert reused == grade and reused is not grade
+    assert index.find_reusable_grade('q1', index.sketch(ANSWER), 'v2') is None
+
+def test_readding_replaces_answer_and_max_entries_evicts_oldest():
+    index = SimilarityIndex(max_entries=2)
+    index.add('q1', 'alice', index.sketch(ANSWER))
+    index.add('q1', 'alice', index.sketch(OTHER))
+    assert index.find_duplicates('q1', index.sketch(ANSWER)) == []
+    index.add('q2', 'bob', index.sketch(ANSWER))
+    index.add('q3', 'carol', index.sketch(ANSWER))
+    assert index.stats() == {'questions': 2, 'answers': 2}
+    assert index.find_duplicates('q1', index.sketch(OTHER)) == []
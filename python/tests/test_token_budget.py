@@ -0,0 +1,51 @@
+# python/tests/test_token_budget.py
+import pytest
+
+from token_budget import batch_completion_budget, compact_answer, completion_budget, estimate_tokens
+
+@pytest.fixture(autouse=True)
+def budget_env(monkeypatch):
+    for name in ('TOKEN_BUDGET', 'XAI_MAX_TOKENS', 'TOKEN_BUDGET_HEADROOM', 'ANSWER_TOKEN_LIMIT'):
+        monkeypatch.delenv(name, raising=False)
+
+def test_estimate_tokens_grows_with_text():
+    assert estimate_tokens('') == 1
+    assert estimate_tokens('one two three') < estimate_tokens('one two three four five six')
+    assert estimate_tokens('123456789') == 1 + 3
+
+def test_completion_budget_depends_on_question_type():
+    assert completion_budget({'type': 'multiple-choice'}) < completion_budget({'type': 'free-response'})
+
+def test_completion_budget_capped_by_max_tokens(monkeypatch):
+    monkeypatch.setenv('XAI_MAX_TOKENS', '100')
+    assert completion_budget({'type': 'free-response'}) == 100
+    assert batch_completion_budget([{'type': 'free-response'}] * 5) == 100
+
+def test_disabled_budget_uses_max_tokens(monkeypatch):
+    monkeypatch.setenv('TOKEN_BUDGET', 'false')
+    assert completion_budget({'type': 'multiple-choice'}) == 4000
+    long_answer = 'word ' * 10000
+    assert compact_answer(long_answer, 10) == long_answer
+
+def test_short_answer_is_unchanged():
+    assert compact_answer('A short answer', 100) == 'A short answer'
+
+def test_repeated_lines_are_collapsed():
+    answer = 'Intro\n' + 'the same line again\n' * 200 + 'Conclusion'
+    compacted = compact_answer(answer, 100)
+    assert compacted.startswith('Intro\nthe same line again\n[... line above repeated')
+    assert compacted.endswith('Conclusion')
+    assert estimate_tokens(compacted) <= 100
+
+def test_long_log_runs_keep_head_and_tail():
+    logs = '\n'.join(f'2026-01-01 10:00:{second:02d} INFO step {second}' for second in range(60))
+    compacted = compact_answer(f'My analysis\n{logs}\nSo the bug is in step 59', 200)
+    assert 'log lines omitted' in compacted
+    assert 'step 0' in compacted and 'step 59' in compacted
+
+def test_overlong_answer_fits_limit_and_is_deterministic():
+    answer = ' '.join(f'word{index}' for index in range(5000))
+    compacted = compact_answer(answer, 300)
+    assert estimate_tokens(compacted) <= 300
+    assert compacted == compact_answer(answer, 300)
+    assert compacted.startswith('word0 ')
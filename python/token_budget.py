@@ -0,0 +1,213 @@
+# python/token_budget.py - Completion budgets per question type and deterministic compaction of long answers
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from metrics import metrics
+
+DEFAULT_MAX_TOKENS = 4000
+DEFAULT_ANSWER_TOKEN_LIMIT = 3000
+DEFAULT_HEADROOM = 1.5
+MIN_COMPLETION_TOKENS = 64
+
+# Expected grading result per question type: (feedback words, strengths/improvements each, words per item)
+RESULT_SHAPES = {
+    'multiple-choice': (40, 1, 12),
+    'calculation': (120, 2, 15),
+    'behavioral': (200, 3, 15),
+    'free-response': (200, 3, 15)
+}
+DEFAULT_RESULT_SHAPE = (200, 3, 15)
+# The "index" key and separators each batch entry adds to the array
+BATCH_ITEM_OVERHEAD = 8
+
+# Runs of repeated lines and log lines longer than this are compacted
+REPEAT_RUN_MIN = 3
+LOG_RUN_MIN = 20
+LOG_RUN_KEEP = 5
+# Paragraphs shorter than this are never dropped as duplicates
+DUPLICATE_BLOCK_MIN_CHARS = 120
+
+# Words, digit runs, indentation and single symbols each cost roughly one token
+_PIECE = re.compile(r"[^\W\d_]+|\d+|\s{2,}|[^\w\s]|_")
+_LOG_LINE = re.compile(
+    r"^\s*(?:"
+    r"\[?\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}"  # ISO timestamps
+    r"|\[?\d{2}:\d{2}:\d{2}"  # clock times
+    r"|\[?(?:TRACE|DEBUG|INFO|NOTICE|WARN|WARNING|ERROR|SEVERE|FATAL|CRITICAL)\b"  # level prefixes
+    r"|at \S+\(.*\)$"  # JVM / JS stack frames
+    r"|File \".*\", line \d+"  # Python stack frames
+    r"|Traceback \(most recent call last\)"
+    r")"
+)
+
+def token_budget_enabled() -> bool:
+    return os.getenv('TOKEN_BUDGET', 'true').lower() not in ('0', 'false', 'no')
+
+def max_completion_tokens() -> int:
+    """Upper bound on any completion budget (env: XAI_MAX_TOKENS)"""
+    return int(os.getenv('XAI_MAX_TOKENS', DEFAULT_MAX_TOKENS))
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate close to a BPE tokenizer's count
+
+    Common words are one token and long ones a few; digits go in groups of three;
+    each symbol and each run of indentation is one token. Errs slightly high, which
+    keeps rate limiting and budgets on the safe side.
+    """
+    tokens = 1
+    for piece in _PIECE.findall(text):
+        if piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif len(piece) > 10 and piece[0].isalpha():
+            tokens += (len(piece) + 5) // 6
+        else:
+            tokens += 1
+    return tokens
+
+@lru_cache(maxsize=64)
+def _expected_result_tokens(question_type: str) -> int:
+    feedback_words, items, item_words = RESULT_SHAPES.get(question_type, DEFAULT_RESULT_SHAPE)
+    sentence = ' '.join(['word'] * item_words)
+    result = {
+        'score': 10.5,
+        'maxScore': 10,
+        'feedback': ' '.join(['word'] * feedback_words),
+        'strengths': [sentence] * items,
+        'improvements': [sentence] * items
+    }
+    return estimate_tokens(json.dumps(result, indent=2))
+
+def completion_budget(question: Dict[str, Any]) -> int:
+    """
+    max_tokens for grading one answer: the expected JSON result for its question type
+    with headroom (env: TOKEN_BUDGET_HEADROOM), capped by XAI_MAX_TOKENS
+    """
+    if not token_budget_enabled():
+        return max_completion_tokens()
+    headroom = float(os.getenv('TOKEN_BUDGET_HEADROOM', DEFAULT_HEADROOM))
+    expected = _expected_result_tokens(str(question.get('type', '')))
+    return min(max_completion_tokens(), max(MIN_COMPLETION_TOKENS, int(expected * headroom)))
+
+def batch_completion_budget(questions: Iterable[Dict[str, Any]]) -> int:
+    """max_tokens for a batch: one result per question plus the array around them"""
+    if not token_budget_enabled():
+        return max_completion_tokens()
+    total = sum(completion_budget(question) + BATCH_ITEM_OVERHEAD for question in questions)
+    return min(max_completion_tokens(), total)
+
+def compact_answer(answer: str, token_limit: Optional[int] = None) -> str:
+    """
+    Shorten an overlong answer the same way every time
+
+    Answers within token_limit (env: ANSWER_TOKEN_LIMIT) are returned unchanged. Longer
+    ones have runs of repeated lines collapsed, repeated paragraphs (pasted boilerplate)
+    dropped and long runs of log or stack-trace lines cut to their first and last lines.
+    Anything still over the limit keeps its beginning and end. Every cut leaves a
+    bracketed note so the grader knows text was omitted.
+    """
+    if not token_budget_enabled():
+        return answer
+    limit = token_limit or int(os.getenv('ANSWER_TOKEN_LIMIT', DEFAULT_ANSWER_TOKEN_LIMIT))
+    # Every token covers at least one character, so short answers need no estimate
+    if len(answer) <= limit:
+        return answer
+    original = estimate_tokens(answer)
+    if original <= limit:
+        return answer
+
+    lines = _trim_log_runs(_drop_duplicate_blocks(_collapse_repeated_lines(answer.split('\n'))))
+    compacted = '\n'.join(lines)
+    tokens = estimate_tokens(compacted)
+    if tokens > limit:
+        compacted = _keep_head_and_tail(compacted, tokens, limit)
+        tokens = estimate_tokens(compacted)
+
+    metrics.inc('answer_compaction', exam_key='answersCompacted')
+    metrics.inc('answer_tokens_saved', original - tokens, exam_key='answerTokensSaved')
+    return compacted
+
+def _collapse_repeated_lines(lines: List[str]) -> List[str]:
+    compacted: List[str] = []
+    position = 0
+    while position < len(lines):
+        line = lines[position]
+        end = position + 1
+        while end < len(lines) and lines[end].strip() == line.strip():
+            end += 1
+        repeats = end - position - 1
+        if not line.strip():
+            compacted.append('')
+        elif repeats + 1 >= REPEAT_RUN_MIN:
+            compacted.extend([line, f"[... line above repeated {repeats} more times ...]"])
+        else:
+            compacted.extend(lines[position:end])
+        position = end
+    return compacted
+
+def _drop_duplicate_blocks(lines: List[str]) -> List[str]:
+    seen = set()
+    compacted: List[str] = []
+    for start, end in _paragraphs(lines):
+        block = lines[start:end]
+        normalized = ' '.join(' '.join(block).split())
+        if len(normalized) >= DUPLICATE_BLOCK_MIN_CHARS and normalized in seen:
+            compacted.append(f"[... repeated block of {len(block)} lines omitted ...]")
+        else:
+            seen.add(normalized)
+            compacted.extend(block)
+        if end < len(lines):
+            compacted.append(lines[end])
+    return compacted
+
+def _paragraphs(lines: List[str]) -> List[Tuple[int, int]]:
+    """(start, end) of each run of non-blank lines; lines[end] is the blank separator"""
+    spans = []
+    start = 0
+    for position, line in enumerate(lines):
+        if not line.strip():
+            spans.append((start, position))
+            start = position + 1
+    spans.append((start, len(lines)))
+    return spans
+
+def _trim_log_runs(lines: List[str]) -> List[str]:
+    compacted: List[str] = []
+    position = 0
+    while position < len(lines):
+        end = position
+        while end < len(lines) and _is_log_line(lines[end]):
+            end += 1
+        if end - position >= LOG_RUN_MIN:
+            omitted = end - position - 2 * LOG_RUN_KEEP
+            compacted.extend(lines[position:position + LOG_RUN_KEEP])
+            compacted.append(f"[... {omitted} log lines omitted ...]")
+            compacted.extend(lines[end - LOG_RUN_KEEP:end])
+            position = end
+        elif end > position:
+            compacted.extend(lines[position:end])
+            position = end
+        else:
+            compacted.append(lines[position])
+            position += 1
+    return compacted
+
+def _is_log_line(line: str) -> bool:
+    return bool(_LOG_LINE.match(line))
+
+def _keep_head_and_tail(text: str, tokens: int, limit: int) -> str:
+    # Characters to keep, scaled from the token ratio and leaving room for the note
+    keep = max(0, int(len(text) * (limit - 16) / tokens))
+    head_end = keep * 2 // 3
+    tail_start = len(text) - (keep - head_end)
+    # Cut at line breaks when one is reasonably close
+    newline = text.rfind('\n', 0, head_end)
+    if newline > head_end // 2:
+        head_end = newline
+    newline = text.find('\n', tail_start)
+    if newline != -1 and newline - tail_start < (len(text) - tail_start) // 2:
+        tail_start = newline + 1
+    return f"{text[:head_end]}\n[... {tail_start - head_end} characters omitted ...]\n{text[tail_start:]}"